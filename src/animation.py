@@ -0,0 +1,279 @@
+"""
+Animations of an artwork being drawn, a segment (or part of one) per frame.
+
+Every frame is made from the one before: the segment is added onto the 2x
+canvas in its box (just as render_composite does), and only that box of the
+frame is downsampled again. The frames are streamed to the encoder one at a
+time, and the GIF and APNG frames only store the box that changed, so the
+memory doesn't grow with the number of frames.
+"""
+
+import io
+import os
+import struct
+import threading
+from typing import Iterator, Tuple
+
+from PIL import Image
+
+from artwork import Artwork
+from generate_art import (
+    BG_COLOR,
+    Box,
+    composite_segments,
+    iterate_segments,
+    segment_box,
+)
+from output_writer import write_atomic
+from png_writer import ApngWriter
+
+# The animation formats, by file extension.
+ANIMATION_FORMATS = {".gif": "GIF", ".png": "PNG", ".apng": "PNG", ".webp": "WEBP"}
+
+# How far (in output pixels) a change in the 2x canvas can reach when it is
+# downsampled (the Lanczos kernel is 3 pixels either way, plus rounding).
+RESAMPLE_MARGIN = 4
+
+
+def iterate_animation_frames(
+    code: str, size: int = None, steps_per_segment: int = 1
+) -> Iterator[Tuple[Image.Image, Box]]:
+    """
+    The frames of the art being drawn, starting with the empty background and
+    ending with the finished art (the same image as generate_art_from_code).
+    Each segment is drawn over steps_per_segment frames.
+
+    The same image is updated and yielded for every frame, along with the box
+    that changed since the frame before, so copy it to keep a frame.
+    """
+    art = Artwork.deserialize(code)
+    size = size or art.size
+    canvas = Image.new("RGB", (2 * size, 2 * size), color=BG_COLOR)
+    frame = canvas.resize((size, size), resample=Image.ANTIALIAS)
+    yield frame, (0, 0, size, size)
+
+    # The steps of a segment only ever grow its box, so redoing the latest box
+    # also covers what the step before it drew (and that was taken back off).
+    for canvas_box in composite_segments(canvas, art, size, steps_per_segment):
+        box = _frame_box(canvas_box, size)
+        left, upper, right, lower = box
+        patch = canvas.resize(
+            (right - left, lower - upper),
+            resample=Image.ANTIALIAS,
+            box=(2 * left, 2 * upper, 2 * right, 2 * lower),
+        )
+        frame.paste(patch, box)
+        yield frame, box
+
+
+def count_animation_frames(
+    code: str, size: int = None, steps_per_segment: int = 1
+) -> int:
+    """How many frames iterate_animation_frames yields, without rendering them."""
+    art = Artwork.deserialize(code)
+    image_size_px = 2 * (size or art.size)
+    n_segments = 0
+    for start_xy, end_xy, _, thickness in iterate_segments(art, size):
+        box = segment_box(start_xy, end_xy, thickness, image_size_px)
+        # Segments entirely off the canvas aren't drawn.
+        if box[0] < box[2] and box[1] < box[3]:
+            n_segments += 1
+    return 1 + n_segments * steps_per_segment
+
+
+def write_animation(
+    code: str,
+    output_path: str,
+    size: int = None,
+    steps_per_segment: int = 1,
+    duration: int = 40,
+    hold: int = 1000,
+    loop: int = 0,
+) -> int:
+    """
+    Write the animation of the art being drawn, as a GIF, APNG or WebP (by the
+    extension of the output path), with each frame shown for duration ms and
+    the finished art for hold ms. Returns the number of frames.
+    """
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension not in ANIMATION_FORMATS:
+        raise ValueError(f"Unknown animation format: {extension}")
+    image_format = ANIMATION_FORMATS[extension]
+
+    size = size or Artwork.deserialize(code).size
+    n_frames = count_animation_frames(code, size, steps_per_segment)
+    durations = [duration] * (n_frames - 1) + [hold]
+    frames = iterate_animation_frames(code, size, steps_per_segment)
+
+    if image_format == "WEBP":
+        first_frame, _ = next(frames)
+        rest = _FrameSequence((frame for frame, _ in frames), n_frames - 1)
+        buffer = io.BytesIO()
+        first_frame.copy().save(
+            buffer,
+            format="WEBP",
+            save_all=True,
+            append_images=[rest],
+            duration=durations,
+            loop=loop,
+            lossless=True,
+        )
+        write_atomic(output_path, buffer.getvalue())
+        return n_frames
+
+    if image_format == "GIF":
+        writer = GifWriter(output_path, size, size, loop)
+    else:
+        writer = ApngWriter(output_path, size, size, n_frames, loop)
+    with writer:
+        for (frame, box), frame_duration in zip(frames, durations):
+            writer.write(frame, box, frame_duration)
+    return n_frames
+
+
+class GifWriter:
+    """
+    Writes an animated GIF one frame at a time. Each frame only stores the box
+    that changed (drawn over the frame before), quantized to its own palette.
+    The file is written under a temporary name and moved into place once done.
+    """
+
+    def __init__(self, path: str, width: int, height: int, loop: int = 0) -> None:
+        self.path = path
+        self.width = width
+        self.height = height
+
+        self.temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.file = open(self.temp_path, "wb")
+        # No global color table, since every frame has its own.
+        self.file.write(b"GIF89a" + struct.pack("<HHBBB", width, height, 0, 0, 0))
+        self.file.write(
+            b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00"
+        )
+
+    def write(self, frame: Image.Image, box: Box, duration_ms: int):
+        left, upper, right, lower = box
+        buffer = io.BytesIO()
+        region = frame.crop(box).quantize(256)
+        region.save(buffer, format="GIF", interlace=False)
+        table_size_bits, color_table, image_data = _split_gif(buffer.getvalue())
+
+        # Graphic control: leave the frame in place for the next one to draw over.
+        self.file.write(
+            b"!\xf9\x04"
+            + struct.pack("<BHBB", 1 << 2, round(duration_ms / 10), 0, 0)
+        )
+        self.file.write(
+            b","
+            + struct.pack(
+                "<HHHHB",
+                left,
+                upper,
+                right - left,
+                lower - upper,
+                0x80 | table_size_bits,
+            )
+            + color_table
+            + image_data
+        )
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.write(b";")
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def __enter__(self) -> "GifWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class _FrameSequence:
+    """
+    Frames from an iterator, looking enough like a multi-frame image for the
+    WebP encoder to take them one at a time (rather than as a list of images).
+    This relies on how Pillow's WebP _save_all reads the frames (seek, load,
+    tobytes and mode), which isn't documented: test_write_animation checks every
+    frame, so that a Pillow upgrade that breaks it shows up there.
+    """
+
+    mode = "RGB"
+
+    def __init__(self, frames: Iterator[Image.Image], n_frames: int) -> None:
+        self.frames = frames
+        self.n_frames = n_frames
+        self.frame: Image.Image = None
+
+    def seek(self, index: int):
+        self.frame = next(self.frames)
+
+    def load(self):
+        pass
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.frame.size
+
+    def tobytes(self, *args) -> bytes:
+        return self.frame.tobytes(*args)
+
+
+def _frame_box(canvas_box: Box, size: int) -> Box:
+    """The box of the frame that a change in the box of the 2x canvas reaches."""
+    left, upper, right, lower = canvas_box
+    return (
+        max(0, left // 2 - RESAMPLE_MARGIN),
+        max(0, upper // 2 - RESAMPLE_MARGIN),
+        min(size, (right + 1) // 2 + RESAMPLE_MARGIN),
+        min(size, (lower + 1) // 2 + RESAMPLE_MARGIN),
+    )
+
+
+def _split_gif(data: bytes) -> Tuple[int, bytes, bytes]:
+    """
+    The color table (and its size bits) and the image data (LZW code size and
+    sub-blocks) of a single frame GIF, to write as a frame of another GIF.
+    """
+    table_size_bits = data[10] & 0x07
+    color_table = b""
+    position = 13
+    if data[10] & 0x80:
+        table_length = 3 * 2 ** (table_size_bits + 1)
+        color_table = data[position : position + table_length]
+        position += table_length
+
+    while data[position] == 0x21:
+        # Skip the extensions (the label, then sub-blocks up to an empty one).
+        position += 2
+        while data[position]:
+            position += data[position] + 1
+        position += 1
+
+    if data[position] != 0x2C:
+        raise ValueError("No image in the GIF")
+    flags = data[position + 9]
+    if flags & 0x40:
+        raise ValueError("The GIF is interlaced")
+    position += 10
+    if flags & 0x80:
+        table_size_bits = flags & 0x07
+        table_length = 3 * 2 ** (table_size_bits + 1)
+        color_table = data[position : position + table_length]
+        position += table_length
+
+    start = position
+    position += 1
+    while data[position]:
+        position += data[position] + 1
+    return table_size_bits, color_table, data[start : position + 1]
@@ -0,0 +1,128 @@
+"""Parsing whole files of art codes at once, into flat NumPy arrays."""
+
+from typing import Iterable, List
+
+import numpy as np
+
+from art_node import ArtNode
+from artwork import Artwork
+
+
+class ArtCodeTable:
+    """
+    Many art codes held as arrays rather than as Artwork and ArtNode objects.
+    The nodes of code i are nodes[node_offsets[i] : node_offsets[i + 1]], with the
+    columns x, y and thickness.
+    """
+
+    def __init__(
+        self,
+        sizes: np.ndarray,
+        start_colors: np.ndarray,
+        end_colors: np.ndarray,
+        node_offsets: np.ndarray,
+        nodes: np.ndarray,
+    ) -> None:
+        self.sizes = sizes
+        self.start_colors = start_colors
+        self.end_colors = end_colors
+        self.node_offsets = node_offsets
+        self.nodes = nodes
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def artwork(self, i: int) -> Artwork:
+        art = Artwork()
+        art.size = int(self.sizes[i])
+        art.start_color = tuple(int(c) for c in self.start_colors[i])
+        art.end_color = tuple(int(c) for c in self.end_colors[i])
+        start, end = self.node_offsets[i], self.node_offsets[i + 1]
+        art.nodes = [
+            ArtNode(int(x), int(y), int(t)) for x, y, t in self.nodes[start:end]
+        ]
+        return art
+
+    def code(self, i: int) -> str:
+        return self.artwork(i).serialize()
+
+
+def parse_codes(codes: Iterable[str]) -> ArtCodeTable:
+    """
+    Parse "A:" codes (compact "B:" codes are decoded one by one) into a table.
+
+    Rather than converting every field of every code in Python, all the node
+    numbers are converted in a single NumPy call, and all the colors are decoded
+    from one hex string. A malformed code raises a ValueError naming its line.
+    """
+    headers = []
+    numbers = []
+    node_counts = []
+
+    for line_number, code in enumerate(codes, start=1):
+        code = code.strip()
+        if not code:
+            continue
+        if not code.startswith("A:"):
+            code = Artwork.deserialize(code).serialize()
+
+        fields = code.split(":", 4)
+        if len(fields) != 5 or len(fields[2]) != 6 or len(fields[3]) != 6:
+            raise ValueError(f"Malformed art code on line {line_number}: {code}")
+        _, size, start_hex, end_hex, nodes = fields
+
+        # Every node is "x.y.thickness" (and a code may have no nodes at all).
+        node_numbers = nodes.replace(":", " ").replace(".", " ").split()
+        n_nodes = nodes.count(":") + 1 if nodes else 0
+        if len(node_numbers) != 3 * n_nodes:
+            raise ValueError(f"Malformed art code on line {line_number}: {code}")
+
+        headers.append((size, start_hex, end_hex, line_number))
+        numbers.extend(node_numbers)
+        node_counts.append(n_nodes)
+
+    n_codes = len(headers)
+    try:
+        sizes = np.array([h[0] for h in headers], dtype=np.int64)
+        colors_hex = "".join(h[1] + h[2] for h in headers)
+        colors = np.frombuffer(bytes.fromhex(colors_hex), dtype=np.uint8)
+        nodes = np.array(numbers, dtype=np.int64).reshape(-1, 3)
+    except ValueError:
+        raise ValueError(_find_malformed_code(headers, numbers, node_counts))
+    colors = colors.reshape(n_codes, 2, 3)
+
+    node_offsets = np.zeros(n_codes + 1, dtype=np.int64)
+    np.cumsum(node_counts, out=node_offsets[1:])
+
+    return ArtCodeTable(
+        sizes, colors[:, 0].copy(), colors[:, 1].copy(), node_offsets, nodes
+    )
+
+
+def _find_malformed_code(headers, numbers: List[str], node_counts: List[int]) -> str:
+    """The error message of the first code with a field that isn't a number."""
+    offset = 0
+    for (size, start_hex, end_hex, line_number), n_nodes in zip(headers, node_counts):
+        code_numbers = numbers[offset : offset + 3 * n_nodes]
+        offset += 3 * n_nodes
+        try:
+            int(size)
+            bytes.fromhex(start_hex + end_hex)
+            [int(n) for n in code_numbers]
+        except ValueError as e:
+            return f"Malformed art code on line {line_number}: {e}"
+    return "Malformed art codes"
+
+
+def read_codes(path: str) -> ArtCodeTable:
+    """Parse a file with one art code per line."""
+    with open(path, "r") as f:
+        return parse_codes(f)
+
+
+def write_compact_codes(codes: Iterable[str], path: str) -> List[str]:
+    """Write the codes to a file, one compact "B:" code per line."""
+    compact = [Artwork.deserialize(code.strip()).serialize_compact() for code in codes]
+    with open(path, "w") as f:
+        f.write("\n".join(compact) + "\n")
+    return compact
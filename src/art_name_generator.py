@@ -1,5 +1,25 @@
-import openai
+import asyncio
+import random
 import os
+import sys
+from typing import List, Optional, Sequence, Tuple
+from title_cache import TitleCache
+import instrumentation
+
+
+COMPLETION_ARGS = {
+    "engine": "curie",
+    "max_tokens": 24,
+    "stop": ["#"],
+    "temperature": 0.9,
+    "presence_penalty": 0.7,
+    "frequency_penalty": 0.7,
+    "n": 2,
+}
+
+
+class RateLimitError(Exception):
+    """Raised by a completion backend when the API asks us to slow down."""
 
 
 def _new_example(c1: str, c2: str, name: str):
@@ -7,24 +27,45 @@ def _new_example(c1: str, c2: str, name: str):
 
 
 def generate_name_with_retry(
-    start_color: str, end_color: str, name_set: set = None, max_retry: int = 3
+    start_color: str,
+    end_color: str,
+    name_set: set = None,
+    max_retry: int = 3,
+    cache: TitleCache = None,
 ):
     for _ in range(max_retry):
-        name = generate_name(start_color, end_color, name_set=name_set)
+        name = generate_name(start_color, end_color, name_set=name_set, cache=cache)
         if name is not None:
             return name
+        instrumentation.add_to_stage("retries")
 
     raise Exception(f"Unable to find name after {max_retry} retries")
 
 
-def generate_name(start_color: str, end_color: str, name_set: set = None):
+def generate_name(
+    start_color: str, end_color: str, name_set: set = None, cache: TitleCache = None
+):
+
+    if not _has_api_key():
+        return "Untitled"
+
+    if cache is not None:
+        title = cache.take(start_color, end_color, name_set)
+        if title is not None:
+            return title
+
+    response = _get_openai().Completion.create(
+        prompt=build_prompt(start_color, end_color), **COMPLETION_ARGS
+    )
+
+    titles = _parse_titles(response)
+    instrumentation.emit("title_candidates", titles=titles)
+    title = _pick_title(titles, name_set)
+    _cache_unused(cache, start_color, end_color, titles, title)
+    return title
 
-    if openai.api_key is None:
-        if "OPENAI_API_KEY" not in os.environ:
-            return "Untitled"
-        else:
-            openai.api_key = os.getenv("OPENAI_API_KEY")
 
+def build_prompt(start_color: str, end_color: str) -> str:
     examples = [
         _new_example("Black", "Red Ochre", "Give love a chance"),
         _new_example("Ocean Blue", "Emerald", "Patterns of thought"),
@@ -40,22 +81,46 @@ def generate_name(start_color: str, end_color: str, name_set: set = None):
         + "\n".join(examples)
         + f"\n[{start_color}, {end_color}]:"
     )
+    return prompt
 
-    response = openai.Completion.create(
-        engine="curie",
-        prompt=prompt,
-        max_tokens=24,
-        stop=["#"],
-        temperature=0.9,
-        presence_penalty=0.7,
-        frequency_penalty=0.7,
-        n=2,
-    )
 
+def _cache_unused(
+    cache: TitleCache, start_color: str, end_color: str, titles: List[str], title
+):
+    if cache is not None:
+        unused = [t for t in titles if t != title]
+        cache.add(start_color, end_color, unused)
+
+
+def _get_openai():
+    """
+    openai (and aiohttp) take longer to import than everything else, so it's
+    only imported once a title is actually requested.
+    """
+    import openai
+
+    return openai
+
+
+def _has_api_key() -> bool:
+    # Without a key there is no need to import openai at all, unless the key has
+    # been set on an already imported openai.
+    openai = sys.modules.get("openai")
+    if openai is not None and openai.api_key is not None:
+        return True
+    if "OPENAI_API_KEY" not in os.environ:
+        return False
+    _get_openai().api_key = os.getenv("OPENAI_API_KEY")
+    return True
+
+
+def _parse_titles(response) -> List[str]:
     titles = [r["text"].strip("\n").strip(" ") for r in response["choices"]]
     titles.sort(key=lambda x: len(x))
-    print(f"Possible Names: {titles}")
+    return titles
+
 
+def _pick_title(titles: List[str], name_set: set = None) -> Optional[str]:
     if name_set is not None:
         # Avoid naming collisions.
         for title in titles:
@@ -66,3 +131,127 @@ def generate_name(start_color: str, end_color: str, name_set: set = None):
     else:
         art_title = titles[0]
         return art_title
+
+
+class OpenAICompletionBackend:
+    """Completes title prompts with the OpenAI API."""
+
+    async def complete(self, prompt: str) -> List[str]:
+        openai = _get_openai()
+        try:
+            response = await openai.Completion.acreate(
+                prompt=prompt, **COMPLETION_ARGS
+            )
+        except openai.error.RateLimitError as e:
+            raise RateLimitError(str(e)) from e
+        return _parse_titles(response)
+
+
+class StubCompletionBackend:
+    """
+    An offline backend for testing the naming pipeline. It simulates the API's
+    latency, and optionally rate-limits every Nth request.
+    """
+
+    def __init__(self, latency: float = 0.05, rate_limit_every: int = 0) -> None:
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.n_requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def complete(self, prompt: str) -> List[str]:
+        self.n_requests += 1
+        request_number = self.n_requests
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.rate_limit_every and request_number % self.rate_limit_every == 0:
+                raise RateLimitError("Stub rate limit")
+
+            # Name it after the last line of the prompt, e.g. "[Red, Blue]:".
+            colors = prompt.rsplit("\n", 1)[-1].strip("[]:")
+            return [colors, f"{colors} {request_number}"]
+        finally:
+            self.in_flight -= 1
+
+
+def get_default_backend():
+    """The OpenAI backend, or None if no API key is set up."""
+    if not _has_api_key():
+        return None
+    return OpenAICompletionBackend()
+
+
+async def generate_names_async(
+    color_pairs: Sequence[Tuple[str, str]],
+    backend=None,
+    name_set: set = None,
+    max_concurrency: int = 4,
+    max_retry: int = 3,
+    max_rate_limit_retry: int = 5,
+    backoff: float = 1.0,
+    cache: TitleCache = None,
+    return_exceptions: bool = False,
+) -> List[str]:
+    """
+    Name every (start_color, end_color) pair, with at most max_concurrency
+    requests in flight at once. The titles are returned in the order of the pairs.
+
+    Rate-limited requests are retried with exponential backoff (and don't count
+    towards max_retry). Since the collision check and the add to name_set happen
+    without awaiting in between, concurrent requests can't claim the same title.
+
+    If a cache is given, its unused titles are served before going to the backend,
+    and the unused candidates of every completion are added to it.
+
+    With return_exceptions, a pair that can't be named gets its exception in
+    place of its title (as asyncio.gather does), instead of failing them all.
+    """
+    if backend is None:
+        backend = get_default_backend()
+    if backend is None:
+        return ["Untitled" for _ in color_pairs]
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def complete(prompt: str) -> List[str]:
+        for attempt in range(max_rate_limit_retry + 1):
+            async with semaphore:
+                try:
+                    return await backend.complete(prompt)
+                except RateLimitError:
+                    instrumentation.emit("rate_limited", attempt=attempt)
+                    if attempt == max_rate_limit_retry:
+                        raise
+
+            # Back off outside of the semaphore, so other requests can go ahead.
+            delay = backoff * (2 ** attempt)
+            await asyncio.sleep(delay + random.uniform(0, delay))
+
+    async def name(start_color: str, end_color: str) -> str:
+        if cache is not None:
+            title = cache.take(start_color, end_color, name_set)
+            if title is not None:
+                return title
+
+        prompt = build_prompt(start_color, end_color)
+        for _ in range(max_retry):
+            titles = await complete(prompt)
+            title = _pick_title(titles, name_set)
+            _cache_unused(cache, start_color, end_color, titles, title)
+            if title is not None:
+                return title
+
+        raise Exception(f"Unable to find name after {max_retry} retries")
+
+    return await asyncio.gather(
+        *(name(c1, c2) for c1, c2 in color_pairs),
+        return_exceptions=return_exceptions,
+    )
+
+
+def generate_names(color_pairs: Sequence[Tuple[str, str]], **kwargs) -> List[str]:
+    """Blocking version of generate_names_async."""
+    return asyncio.run(generate_names_async(color_pairs, **kwargs))
@@ -2,6 +2,9 @@
 
 
 class ArtNode:
+    # Codes are often kept by the million (e.g. for search), so skip the __dict__.
+    __slots__ = ("x", "y", "thickness")
+
     def __init__(self, x: int, y: int, thickness: int) -> None:
         self.x = x
         self.y = y
@@ -0,0 +1,165 @@
+"""
+Generate art codes in bulk and keep only the ones that meet some criteria.
+
+Candidates are scored from their nodes and colors alone (no rasterizing), so
+thousands can be screened for the cost of rendering a handful. Optionally, the
+survivors can go through a second filter on a small proxy render, before only
+the final few are rendered at full size.
+"""
+
+import math
+import os
+from typing import Dict, List, Tuple
+
+from artwork import Artwork
+from color_name import ColorNameMapper
+from generate_art import BG_COLOR, generate_art_from_code, generate_seeded_art_code
+from generate_collection import get_item_seed
+
+# Score name -> (min, max). Either bound can be None.
+Criteria = Dict[str, Tuple[float, float]]
+
+# Scores that need a proxy render, rather than just the art code.
+PROXY_SCORES = ["proxy_coverage", "proxy_brightness"]
+
+
+class ArtCandidate:
+    def __init__(self, index: int, seed: int, code: str) -> None:
+        self.index = index
+        self.seed = seed
+        self.code = code
+        self.art = Artwork.deserialize(code)
+        self.scores: Dict[str, float] = {}
+
+
+def search_art_codes(
+    n: int,
+    criteria: Criteria,
+    seed: int = 0,
+    color_name_mapper: ColorNameMapper = None,
+    proxy_size: int = 64,
+) -> List[ArtCandidate]:
+    """
+    Generate n candidates (candidate i has the same seed, and so the same code, as
+    item i of a collection with this seed) and return the ones whose scores are
+    all within the criteria.
+
+    The color name score needs a color_name_mapper, and the proxy scores are only
+    computed (on a proxy_size render) for the candidates that pass the rest.
+    """
+    candidates = []
+    for i in range(1, n + 1):
+        item_seed = get_item_seed(seed, i)
+        code = generate_seeded_art_code(item_seed)
+        candidates.append(ArtCandidate(i, item_seed, code))
+
+    for candidate in candidates:
+        candidate.scores.update(score_geometry(candidate.art))
+        candidate.scores["color_contrast"] = color_contrast(candidate.art)
+
+    if color_name_mapper is not None:
+        score_color_names(candidates, color_name_mapper)
+
+    code_criteria = {k: v for k, v in criteria.items() if k not in PROXY_SCORES}
+    candidates = [c for c in candidates if meets_criteria(c.scores, code_criteria)]
+
+    proxy_criteria = {k: v for k, v in criteria.items() if k in PROXY_SCORES}
+    if proxy_criteria:
+        for candidate in candidates:
+            candidate.scores.update(score_proxy(candidate.code, proxy_size))
+        candidates = [
+            c for c in candidates if meets_criteria(c.scores, proxy_criteria)
+        ]
+
+    return candidates
+
+
+def meets_criteria(scores: Dict[str, float], criteria: Criteria) -> bool:
+    for name, (min_value, max_value) in criteria.items():
+        if name not in scores:
+            raise ValueError(f"Unknown score: {name}")
+        if min_value is not None and scores[name] < min_value:
+            return False
+        if max_value is not None and scores[name] > max_value:
+            return False
+    return True
+
+
+def score_geometry(art: Artwork) -> Dict[str, float]:
+    """
+    Scores of the shape, all relative to the size of the art:
+    node_spread (mean distance of the nodes from their centroid), bbox_fill (the
+    share of the canvas covered by the bounding box of the nodes), path_length
+    (the length of the whole line) and mean_thickness.
+    """
+    xs = [node.x for node in art.nodes]
+    ys = [node.y for node in art.nodes]
+    n_nodes = len(art.nodes)
+
+    cx = sum(xs) / n_nodes
+    cy = sum(ys) / n_nodes
+    spread = sum(math.hypot(x - cx, y - cy) for x, y in zip(xs, ys)) / n_nodes
+
+    bbox_area = (max(xs) - min(xs)) * (max(ys) - min(ys))
+
+    path_length = 0
+    for i in range(n_nodes):
+        j = (i + 1) % n_nodes
+        path_length += math.hypot(xs[j] - xs[i], ys[j] - ys[i])
+
+    # Thickness is in the 2x supersampled pixels.
+    mean_thickness = sum(node.thickness for node in art.nodes) / n_nodes / 2
+
+    return {
+        "node_spread": spread / art.size,
+        "bbox_fill": bbox_area / (art.size * art.size),
+        "path_length": path_length / art.size,
+        "mean_thickness": mean_thickness / art.size,
+    }
+
+
+def color_contrast(art: Artwork) -> float:
+    """The RGB distance between the start and end colors, from 0 to 1."""
+    delta = math.dist(art.start_color, art.end_color)
+    return delta / math.dist((0, 0, 0), (255, 255, 255))
+
+
+def score_color_names(candidates: List[ArtCandidate], mapper: ColorNameMapper):
+    """
+    Name the colors of every candidate in one batch, and score
+    distinct_color_names (1 if the start and end colors have different names).
+    """
+    colors = []
+    for candidate in candidates:
+        colors.extend([candidate.art.start_color, candidate.art.end_color])
+
+    names = [c.name for c in mapper.get_many(colors)]
+    for i, candidate in enumerate(candidates):
+        start_name, end_name = names[2 * i], names[2 * i + 1]
+        candidate.scores["distinct_color_names"] = float(start_name != end_name)
+
+
+def score_proxy(code: str, proxy_size: int) -> Dict[str, float]:
+    """
+    Scores of a small render: proxy_coverage (the share of pixels lit above the
+    background) and proxy_brightness (the mean brightness, from 0 to 1).
+    """
+    image = generate_art_from_code(code, size=proxy_size).convert("L")
+    background = sum(BG_COLOR) / 3
+    histogram = image.histogram()
+
+    n_pixels = proxy_size * proxy_size
+    lit = sum(histogram[int(background) + 8 :])
+    brightness = sum(level * count for level, count in enumerate(histogram))
+    return {
+        "proxy_coverage": lit / n_pixels,
+        "proxy_brightness": brightness / n_pixels / 255,
+    }
+
+
+def render_candidates(candidates: List[ArtCandidate], output_path: str):
+    """Render the survivors at full size, named after their index and seed."""
+    os.makedirs(output_path, exist_ok=True)
+    for candidate in candidates:
+        file_name = f"{str(candidate.index).zfill(3)}_{candidate.seed}.png"
+        generate_art_from_code(candidate.code, os.path.join(output_path, file_name))
@@ -14,3 +14,13 @@ class ArtworkMetadata:
             "end_color_name": self.end_color_name,
             "code": self.code,
         }
+
+    @staticmethod
+    def deserialize(data: dict) -> "ArtworkMetadata":
+        metadata = ArtworkMetadata()
+        metadata.item_id = data["item_id"]
+        metadata.title = data["title"]
+        metadata.start_color_name = data["start_color_name"]
+        metadata.end_color_name = data["end_color_name"]
+        metadata.code = data["code"]
+        return metadata
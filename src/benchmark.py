@@ -0,0 +1,271 @@
+"""Throughput benchmarks of each stage of the art generation."""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List
+
+from PIL import Image
+
+import instrumentation
+from artwork import Artwork
+from artwork_metadata import ArtworkMetadata
+from generate_art import (
+    generate_art_code,
+    generate_art_from_code,
+    generate_end_color,
+    generate_starting_color,
+)
+from generate_collection import (
+    generate_collection,
+    generate_preview_image,
+    get_color_name_mapper,
+)
+
+SRC_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# Name -> the command line (after the interpreter) of each startup benchmark.
+STARTUP_COMMANDS = {
+    "startup_cmd_generate_help": [
+        os.path.join(SRC_PATH, "cmd_generate.py"),
+        "--help",
+    ],
+    "startup_import_generate_collection": ["-c", "import generate_collection"],
+    "startup_color_name_mapper": [
+        "-c",
+        "import generate_collection; generate_collection.get_color_name_mapper()",
+    ],
+}
+
+
+def run_benchmarks(
+    n: int = 50, collection_n: int = 10, seed: int = 0, startup_repeats: int = 0
+) -> dict:
+    """
+    Time every stage on the same seeded inputs, and return the results as a
+    JSON-able dict (items/sec and the peak RSS during each stage). If
+    startup_repeats is set, the startup benchmarks are run too.
+    """
+    color_name_mapper = get_color_name_mapper()
+    random.seed(seed)
+    colors = []
+    for _ in range(n):
+        start_color = generate_starting_color()
+        colors.append((start_color, generate_end_color(start_color)))
+
+    codes = []
+    stages = [
+        benchmark_stage(
+            "generate_art_code",
+            lambda i: codes.append(generate_art_code(*colors[i])),
+            n,
+            seed,
+        ),
+        benchmark_stage(
+            "generate_art_from_code",
+            lambda i: generate_art_from_code(codes[i]),
+            n,
+            seed,
+        ),
+        benchmark_stage(
+            "color_name_get",
+            lambda i: [color_name_mapper.get(c) for c in colors[i]],
+            n,
+            seed,
+        ),
+        benchmark_stage(
+            "color_name_get_many",
+            lambda _: color_name_mapper.get_many(c for pair in colors for c in pair),
+            1,
+            seed,
+            items_per_call=2 * n,
+        ),
+        benchmark_stage(
+            "artwork_serialize",
+            lambda i: Artwork.deserialize(codes[i]).serialize(),
+            n,
+            seed,
+        ),
+    ]
+
+    image = Image.new("RGB", (512, 512))
+    metadata = ArtworkMetadata()
+    metadata.item_id = "001"
+    metadata.title = "VANISHED DREAMS"
+    metadata.start_color_name = "Rangitoto"
+    metadata.end_color_name = "Bright Turquoise"
+
+    def preview(i: int):
+        metadata.code = codes[i]
+        generate_preview_image(image, metadata)
+
+    stages.append(benchmark_stage("generate_preview_image", preview, n, seed))
+
+    folder_path = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        stages.append(
+            benchmark_stage(
+                "generate_collection",
+                lambda _: generate_collection(
+                    "bench", folder_path, collection_n, use_ai=False, seed=seed
+                ),
+                1,
+                seed,
+                items_per_call=collection_n,
+            )
+        )
+    finally:
+        shutil.rmtree(folder_path)
+
+    for name, args in STARTUP_COMMANDS.items():
+        if startup_repeats > 0:
+            stages.append(benchmark_startup(name, args, startup_repeats))
+
+    return {
+        "time": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "n": n,
+        "collection_n": collection_n,
+        "seed": seed,
+        "stages": stages,
+    }
+
+
+def benchmark_stage(
+    name: str, fn: Callable[[int], object], n: int, seed: int, items_per_call: int = 1
+) -> dict:
+    """Time n calls of fn(i), with the random module seeded and prints muted."""
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()), RssSampler() as rss:
+        start = time.perf_counter()
+        for i in range(n):
+            fn(i)
+        duration = time.perf_counter() - start
+
+    n_items = n * items_per_call
+    return {
+        "name": name,
+        "items": n_items,
+        "seconds": duration,
+        "items_per_sec": n_items / duration if duration > 0 else None,
+        "peak_rss_mb": rss.peak / 2 ** 20,
+    }
+
+
+def benchmark_startup(name: str, args: List[str], repeats: int = 5) -> dict:
+    """
+    Time a fresh interpreter running args (from the src folder), as the median of
+    the repeats. Its throughput is in runs/sec, so it compares like the others,
+    and its peak RSS is the largest of the interpreters'.
+    """
+    env = dict(os.environ, PYTHONPATH=SRC_PATH)
+    durations = []
+    peak_rss = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, *args], env=env, stdout=subprocess.DEVNULL
+        )
+        # wait4 gives the usage of this child alone (RUSAGE_CHILDREN is the
+        # largest of every child so far).
+        _, status, usage = os.wait4(process.pid, 0)
+        durations.append(time.perf_counter() - start)
+        if os.waitstatus_to_exitcode(status) != 0:
+            raise subprocess.CalledProcessError(status, process.args)
+        peak_rss = max(peak_rss, _max_rss_to_bytes(usage.ru_maxrss))
+
+    duration = statistics.median(durations)
+    return {
+        "name": name,
+        "items": 1,
+        "seconds": duration,
+        "items_per_sec": 1 / duration,
+        "peak_rss_mb": peak_rss / 2 ** 20,
+    }
+
+
+class RssSampler:
+    """
+    Samples the RSS of this process (every interval seconds, on a thread) while
+    in the with block, keeping its peak in bytes. The process's own peak
+    (ru_maxrss) never goes down, so it can't tell the stages apart.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "RssSampler":
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        self.peak = max(self.peak, instrumentation.current_rss())
+
+
+def _max_rss_to_bytes(max_rss: int) -> int:
+    # ru_maxrss is in bytes on macOS, and in kilobytes elsewhere.
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def compare_results(old: dict, new: dict, tolerance: float = 0.2) -> List[str]:
+    """
+    Compare two benchmark runs, returning a line per stage, flagged as a
+    REGRESSION if its throughput dropped by more than the tolerance.
+    """
+    old_stages = {stage["name"]: stage for stage in old["stages"]}
+    lines = []
+    for stage in new["stages"]:
+        old_stage = old_stages.get(stage["name"])
+        if old_stage is None or not old_stage["items_per_sec"]:
+            lines.append(f"{stage['name']}: new")
+            continue
+
+        ratio = stage["items_per_sec"] / old_stage["items_per_sec"]
+        flag = "REGRESSION " if ratio < 1 - tolerance else ""
+        lines.append(f"{flag}{stage['name']}: {ratio:.2f}x")
+    return lines
+
+
+def format_results(results: dict) -> str:
+    lines = [f"{'stage':<36}{'items/sec':>12}{'seconds':>10}{'peak RSS (MB)':>16}"]
+    for stage in results["stages"]:
+        lines.append(
+            f"{stage['name']:<36}{stage['items_per_sec'] or 0:>12.1f}"
+            f"{stage['seconds']:>10.3f}{stage['peak_rss_mb']:>16.1f}"
+        )
+    return "\n".join(lines)
+
+
+def save_results(results: dict, output_path: str):
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(results, f, indent=4)
+
+
+def load_results(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
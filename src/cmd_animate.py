@@ -0,0 +1,43 @@
+import argparse
+import time
+
+
+def main():
+    """
+    Write an animation (GIF, APNG or WebP) of an artwork being drawn.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--code", type=str, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--size", type=int, default=None)
+    parser.add_argument("--steps", type=int, default=1)
+    parser.add_argument("--duration", type=int, default=40)
+    parser.add_argument("--hold", type=int, default=1000)
+    parser.add_argument("--output", type=str, default="animation.gif")
+    args = parser.parse_args()
+    if (args.code is None) == (args.seed is None):
+        parser.error("Give either --code or --seed")
+
+    # Imported here so that --help doesn't pay for PIL and the rest.
+    from animation import write_animation
+    from generate_art import generate_seeded_art_code
+
+    code = args.code
+    if code is None:
+        code = generate_seeded_art_code(args.seed)
+
+    start = time.perf_counter()
+    n_frames = write_animation(
+        code,
+        args.output,
+        size=args.size,
+        steps_per_segment=args.steps,
+        duration=args.duration,
+        hold=args.hold,
+    )
+    duration = time.perf_counter() - start
+    print(f"Wrote {n_frames} frames to {args.output} in {duration:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+from benchmark import (
+    compare_results,
+    format_results,
+    load_results,
+    run_benchmarks,
+    save_results,
+)
+
+
+def main():
+    """
+    Benchmark the throughput of each stage, and compare it to a previous run.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=50)
+    parser.add_argument("--collection-n", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default="benchmark_output/latest.json")
+    parser.add_argument("--compare", type=str, default=None)
+    parser.add_argument("--startup-repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        n=args.n,
+        collection_n=args.collection_n,
+        seed=args.seed,
+        startup_repeats=args.startup_repeats,
+    )
+    print(format_results(results))
+    save_results(results, args.output)
+    print(f"Saved results to {args.output}")
+
+    if args.compare is not None:
+        print(f"Compared to {args.compare}:")
+        for line in compare_results(load_results(args.compare), results):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
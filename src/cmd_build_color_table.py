@@ -0,0 +1,34 @@
+import argparse
+import time
+import numpy as np
+from color_name import (
+    DEFAULT_COLOR_MAP,
+    DEFAULT_TABLE_PATH,
+    TABLE_MISSING,
+    ColorNameMapper,
+    build_color_table,
+    save_color_table,
+)
+
+
+def main():
+    """
+    Build the lookup table of the closest named color of every 8-bit RGB color,
+    which the color naming then memory-maps instead of searching the palette.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--colors", type=str, default=DEFAULT_COLOR_MAP)
+    parser.add_argument("--output", type=str, default=DEFAULT_TABLE_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = build_color_table(ColorNameMapper(args.colors))
+    save_color_table(table, args.output)
+
+    n_missing = int(np.count_nonzero(table == TABLE_MISSING))
+    duration = time.perf_counter() - start
+    print(f"Built {args.output} in {duration:.1f}s ({n_missing} colors without a name)")
+
+
+if __name__ == "__main__":
+    main()
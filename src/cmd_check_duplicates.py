@@ -1,32 +1,33 @@
 import argparse
 import os
-import json
+from duplicates import ImageHashIndex, find_near_duplicates, group_duplicates
+from metadata_store import read_collection_metadata
 
 
 def main():
     """
-    Check for duplicate names in the collection.
+    Check for duplicate names in the collection (and, optionally, for artworks
+    that look nearly the same).
     """
 
     # Get the collection argument.
     parser = argparse.ArgumentParser()
     parser.add_argument("--collection", type=str)
+    parser.add_argument("--images", action="store_true")
+    parser.add_argument("--max-distance", type=int, default=4)
     args = parser.parse_args()
     collection = args.collection
-    meta_folder = f"collection_output/{collection}/meta/"
-    files = os.listdir(meta_folder)
+    collection_path = f"collection_output/{collection}"
 
     # Keep a record.
     registry = {}
+    titles = {}
 
-    for file_name in files:
-        file_path = os.path.join(meta_folder, file_name)
-
-        with open(file_path, "r") as f:
-            data = json.load(f)
-
-        item_id = data["item_id"]
-        title = data["title"]
+    # From the meta/ files, or the streamed metadata.jsonl.
+    for metadata in read_collection_metadata(collection_path):
+        item_id = metadata.item_id
+        title = metadata.title
+        titles[item_id] = title
 
         if title not in registry:
             registry[title] = []
@@ -38,6 +39,23 @@ def main():
         if len(v) > 1:
             print(f"Duplicate: {k, v}")
 
+    # And the titles that only differ by case or punctuation.
+    for k, v in group_duplicates(titles).items():
+        if len(set(titles[item_id] for item_id in v)) > 1:
+            print(f"Near duplicate title: {k, v}")
+
+    if args.images:
+        art_folder = f"{collection_path}/art/"
+        art_files = sorted(f for f in os.listdir(art_folder) if f.endswith(".png"))
+
+        index = ImageHashIndex(collection_path)
+        n_hashed = index.update(os.path.join(art_folder, f) for f in art_files)
+        print(f"Hashed {n_hashed} new or changed artworks")
+
+        hashes = index.hashes(art_files)
+        for a, b, distance in find_near_duplicates(hashes, args.max_distance):
+            print(f"Similar artwork: {a, b} ({distance} bits apart)")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,39 @@
+import argparse
+import os
+import sys
+import time
+
+
+def main():
+    """
+    Render the golden corpus and check that every render is pixel for pixel
+    the same as before, or record it again with --update.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", type=str, default="golden_output")
+    parser.add_argument("--update", action="store_true")
+    args = parser.parse_args()
+
+    # Imported here so that --help doesn't pay for PIL and the rest.
+    from golden_corpus import DEFAULT_CORPUS_PATH, check_corpus, update_corpus
+
+    corpus_path = args.corpus or DEFAULT_CORPUS_PATH
+    if args.update:
+        changed = update_corpus(corpus_path)
+        print(f"Recorded {len(changed)} changed renders: {changed}")
+        return
+
+    start = time.perf_counter()
+    n_checked, mismatches = check_corpus(corpus_path, args.output, args.workers)
+    duration = time.perf_counter() - start
+    for mismatch in mismatches:
+        print(mismatch)
+    print(f"{len(mismatches)} of {n_checked} renders changed ({duration:.1f}s)")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
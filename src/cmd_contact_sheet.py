@@ -0,0 +1,41 @@
+import argparse
+import os
+import time
+
+
+def main():
+    """
+    Tile the art and meta-data of a collection into contact sheets.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--collection", type=str)
+    parser.add_argument("--columns", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=8)
+    parser.add_argument("--tile-size", type=int, default=256)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    # Imported here so that --help doesn't pay for PIL and the rest.
+    from contact_sheet import art_file_loader, generate_contact_sheets
+    from metadata_store import read_collection_metadata
+
+    collection = args.collection
+    collection_path = os.path.join("collection_output", collection)
+    output_path = args.output or os.path.join(collection_path, "sheets")
+
+    start = time.perf_counter()
+    sheet_paths = generate_contact_sheets(
+        read_collection_metadata(collection_path),
+        output_path,
+        collection,
+        columns=args.columns,
+        rows=args.rows,
+        tile_size=args.tile_size,
+        load_art=art_file_loader(os.path.join(collection_path, "art"), collection),
+    )
+    duration = time.perf_counter() - start
+    print(f"Wrote {len(sheet_paths)} sheets to {output_path} in {duration:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import argparse
+import os
+from metadata_store import export_erc721, read_collection_metadata
+
+
+def main():
+    """
+    Write the ERC-721 token meta-data of every item in a collection, from its
+    metadata.jsonl if it has one, or else from its meta/ files.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--collection", type=str)
+    parser.add_argument("--image-base-url", type=str)
+    parser.add_argument("--description", type=str, default="")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    collection = args.collection
+    collection_path = os.path.join("collection_output", collection)
+    output_path = args.output or os.path.join(collection_path, "erc721")
+
+    metadata_items = read_collection_metadata(collection_path)
+    n_written = export_erc721(
+        metadata_items, collection, output_path, args.image_base_url, args.description
+    )
+    print(f"Wrote {n_written} token meta-data files to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import argparse
-from generate_collection import generate_collection
+import instrumentation
 
 
 def main():
@@ -10,14 +10,67 @@ def main():
     parser.add_argument("--collection", type=str)
     parser.add_argument("-n", type=int)
     parser.add_argument("-i", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--title-cache", type=str, default=None)
+    parser.add_argument(
+        "--no-resume", dest="resume", action="store_false", default=True
+    )
+    parser.add_argument("--event-log", type=str, default=None)
+    parser.add_argument(
+        "--metadata", choices=["files", "stream", "both"], default="files"
+    )
+    parser.add_argument("--render-cache", type=str, default=None)
+    parser.add_argument("--write-threads", type=int, default=2)
+    parser.add_argument("--png-compress-level", type=int, default=None)
+    parser.add_argument("--png-optimize", action="store_true")
+    parser.add_argument("--pipeline", action="store_true")
+    parser.add_argument("--render-threads", type=int, default=2)
+    parser.add_argument("--memory-budget", type=int, default=None, help="MB")
     args = parser.parse_args()
+    if args.pipeline and args.workers > 1:
+        parser.error("--pipeline runs in one process, use --render-threads")
+
+    # Imported here so that --help doesn't pay for PIL and the rest.
+    from generate_collection import generate_collection
+
+    # Record structured events of every item, and summarize them at the end.
+    if args.event_log is not None:
+        event_log = instrumentation.JsonlSink(args.event_log)
+        summary = instrumentation.SummarySink()
+        instrumentation.add_sink(event_log)
+        instrumentation.add_sink(summary)
 
     collection = args.collection
     n = args.n
     i = args.i
 
     collection_path = f"collection_output"
-    generate_collection(collection, collection_path, n, start_index=i)
+    memory_budget = None
+    if args.memory_budget is not None:
+        memory_budget = args.memory_budget * 2 ** 20
+    generate_collection(
+        collection,
+        collection_path,
+        n,
+        start_index=i,
+        workers=args.workers,
+        seed=args.seed,
+        title_cache_path=args.title_cache,
+        resume=args.resume,
+        metadata_mode=args.metadata,
+        render_cache_path=args.render_cache,
+        write_threads=args.write_threads,
+        png_compress_level=args.png_compress_level,
+        png_optimize=args.png_optimize,
+        pipeline=args.pipeline,
+        render_threads=args.render_threads,
+        memory_budget=memory_budget,
+    )
+
+    if args.event_log is not None:
+        event_log.close()
+        print(summary.summary())
 
 
 if __name__ == "__main__":
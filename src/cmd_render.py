@@ -0,0 +1,42 @@
+import argparse
+import os
+
+
+def main():
+    """
+    Re-render an existing collection from the art codes in its meta-data.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--collection", type=str)
+    parser.add_argument("--size", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--no-art", dest="art", action="store_false", default=True)
+    parser.add_argument(
+        "--no-preview", dest="preview", action="store_false", default=True
+    )
+    args = parser.parse_args()
+
+    # Imported here so that --help doesn't pay for PIL and the rest.
+    from render_collection import render_collection
+
+    collection = args.collection
+    collection_path = f"collection_output"
+    output_path = args.output
+    if output_path is None:
+        size_name = args.size or "original"
+        output_path = os.path.join(collection_path, collection, f"render_{size_name}")
+
+    render_collection(
+        collection,
+        collection_path,
+        output_path,
+        size=args.size,
+        art=args.art,
+        preview=args.preview,
+        workers=args.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
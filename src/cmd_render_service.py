@@ -0,0 +1,44 @@
+import argparse
+import sys
+
+
+def main():
+    """
+    Run a resident render worker, taking JSONL jobs from stdin (or a Unix socket)
+    and writing JSONL results to stdout (or back to the socket).
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-pending", type=int, default=None)
+    parser.add_argument("--socket", type=str, default=None)
+    parser.add_argument("--max-size", type=int, default=None)
+    parser.add_argument("--max-nodes", type=int, default=None)
+    args = parser.parse_args()
+
+    # Imported here so that --help doesn't pay for PIL and the rest.
+    from render_service import DEFAULT_MAX_NODES, DEFAULT_MAX_SIZE, RenderService
+
+    with RenderService(
+        args.workers,
+        args.max_pending,
+        args.max_size or DEFAULT_MAX_SIZE,
+        args.max_nodes or DEFAULT_MAX_NODES,
+    ) as service:
+        if args.socket is None:
+            service.serve(sys.stdin, _write_stdout)
+        else:
+            with service.serve_socket(args.socket) as server:
+                print(f"Serving render jobs on {args.socket}", file=sys.stderr)
+                try:
+                    server.serve_forever()
+                except KeyboardInterrupt:
+                    pass
+
+
+def _write_stdout(text: str):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
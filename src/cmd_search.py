@@ -0,0 +1,46 @@
+import argparse
+
+
+def parse_criterion(text: str):
+    """A criterion like "node_spread:0.2:" (name:min:max, either bound optional)."""
+    name, min_value, max_value = text.split(":")
+    min_value = float(min_value) if min_value else None
+    max_value = float(max_value) if max_value else None
+    return name, (min_value, max_value)
+
+
+def main():
+    """
+    Search many art codes for the ones that meet the criteria.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--criterion", type=parse_criterion, action="append")
+    parser.add_argument("--proxy-size", type=int, default=64)
+    parser.add_argument("--render", type=str, default=None)
+    args = parser.parse_args()
+
+    # Imported here so that --help doesn't pay for PIL and the rest.
+    from art_search import render_candidates, search_art_codes
+    from generate_collection import get_color_name_mapper
+
+    criteria = dict(args.criterion or [])
+    candidates = search_art_codes(
+        args.n,
+        criteria,
+        seed=args.seed,
+        color_name_mapper=get_color_name_mapper(),
+        proxy_size=args.proxy_size,
+    )
+
+    print(f"{len(candidates)} of {args.n} candidates meet the criteria")
+    for candidate in candidates:
+        print(f"{candidate.index} {candidate.seed} {candidate.code}")
+
+    if args.render is not None:
+        render_candidates(candidates, args.render)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""A record of every generated item, so a collection can be rebuilt incrementally."""
+
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+MANIFEST_FILE_NAME = "manifest.jsonl"
+
+# What needs to be done for an item.
+SKIP = "skip"
+PREVIEW = "preview"
+FULL = "full"
+
+
+class CollectionManifest:
+    """
+    An append-only JSONL file in the collection folder. The first kind of line
+    records the collection seed, the other records an item (its seed, art code,
+    preview version and the hashes of its output files). The last line for an item
+    wins, so a run that dies part way through loses nothing that was written.
+    """
+
+    def __init__(self, collection_path: str) -> None:
+        self.path = os.path.join(collection_path, MANIFEST_FILE_NAME)
+        self.seed: Optional[int] = None
+        self.items: Dict[int, dict] = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash.
+                        continue
+                    self._apply(record)
+
+    def set_seed(self, seed: int):
+        if seed != self.seed:
+            self._append({"collection_seed": seed})
+
+    def add_item(self, item_record: dict):
+        self._append(item_record)
+
+    def get_action(
+        self, item_id: int, seed: int, paths: Dict[str, str], preview_version: int
+    ) -> str:
+        """
+        Whether an item can be skipped, only needs its preview redone, or needs to
+        be fully generated (missing, changed or generated with another seed).
+        """
+        record = self.items.get(item_id)
+        if record is None or record["seed"] != seed:
+            return FULL
+
+        files = record["files"]
+        for kind in ["art", "meta"]:
+            if kind in paths and not _is_valid(paths[kind], files.get(kind)):
+                return FULL
+
+        if record["preview_version"] != preview_version:
+            return PREVIEW
+        if not _is_valid(paths["preview"], files["preview"]):
+            return PREVIEW
+
+        return SKIP
+
+    def _append(self, record: dict):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self._apply(record)
+
+    def _apply(self, record: dict):
+        if "collection_seed" in record:
+            self.seed = record["collection_seed"]
+        else:
+            self.items[record["item_id"]] = record
+
+
+def new_item_record(
+    item_id: int,
+    seed: int,
+    code: str,
+    file_hashes: Dict[str, str],
+    preview_version: int,
+) -> dict:
+    """A record of an item, with the hash_file of each of its files by kind."""
+    return {
+        "item_id": item_id,
+        "seed": seed,
+        "code": code,
+        "preview_version": preview_version,
+        "files": file_hashes,
+    }
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _is_valid(path: str, expected_hash: Optional[str]) -> bool:
+    if expected_hash is None or not os.path.exists(path):
+        return False
+    return hash_file(path) == expected_hash
@@ -1,36 +1,282 @@
 import colorsys
+import itertools
 import json
-from typing import List, Tuple
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
 from color import Color
+import instrumentation
+
+# How many colors get_many compares against the whole palette at once.
+BATCH_SIZE = 1024
+
+# Resolved relative to the package, so it doesn't matter where we're run from.
+DEFAULT_COLOR_MAP = os.path.join(os.path.dirname(__file__), "color_names.json")
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), "color_names.npz")
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(__file__), "color_names_table.npy")
+
+# The lookup table has the palette index of the closest named color of every
+# 8-bit RGB color (at r << 16 | g << 8 | b), or this if it has none.
+TABLE_MISSING = 0xFFFF
+TABLE_CELL_SIZE = 8
 
 
 class ColorNameMapper:
-    def __init__(self, hex_color_map: str) -> None:
-        self.color_names: List[Color] = []
+    def __init__(
+        self,
+        hex_color_map: str = DEFAULT_COLOR_MAP,
+        cache_path: str = None,
+        table_path: str = None,
+    ) -> None:
+        """
+        Load the named colors from a JSON list of [hex, name]. If a cache_path is
+        given, the parsed table is loaded from that binary cache instead (as long
+        as it is newer than the JSON), or written there for next time.
+
+        If a table_path is given, the lookup table (see build_color_table) there
+        is memory-mapped, so every process using it shares the same pages.
+        """
+        if cache_path is not None and is_fresh(cache_path, hex_color_map):
+            with np.load(cache_path) as cache:
+                self.hexes = cache["hexes"].tolist()
+                self.names = cache["names"].tolist()
+                self.rgb_array = cache["rgb"]
+                self.hls_array = cache["hls"]
+        else:
+            with open(hex_color_map, "r") as f:
+                color_names_raw = json.load(f)
+            self.hexes = [c[0] for c in color_names_raw]
+            self.names = [c[1] for c in color_names_raw]
+
+            # The palette as contiguous arrays, so a lookup is one vectorized pass.
+            rgb = [Color.hex_to_rgb(h) for h in self.hexes]
+            self.rgb_array = np.array(rgb, dtype=np.int64)
+            self.hls_array = np.array(
+                [colorsys.rgb_to_hls(*c) for c in rgb], dtype=np.float64
+            )
+            if cache_path is not None:
+                self.save_cache(cache_path)
+
+        # Colors are only built when they are first returned.
+        self._colors: Dict[int, Color] = {}
+
+        self.table: Optional[np.ndarray] = None
+        if table_path is not None:
+            if not is_fresh(table_path, hex_color_map):
+                raise ValueError(f"{table_path} is older than {hex_color_map}")
+            self.table = np.load(table_path, mmap_mode="r")
 
-        with open(hex_color_map, "r") as f:
-            color_names_raw = json.load(f)
-            self.color_names = [Color(c[0], c[1]) for c in color_names_raw]
+    def save_cache(self, cache_path: str):
+        """
+        Write the parsed table, to skip parsing the JSON next time. It's written
+        atomically, so a crash (or another process) can't leave a truncated
+        cache that is newer than the JSON.
+        """
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                np.savez(
+                    f,
+                    hexes=np.array(self.hexes),
+                    names=np.array(self.names),
+                    rgb=self.rgb_array,
+                    hls=self.hls_array,
+                )
+            os.replace(temp_path, cache_path)
+        except OSError:
+            # The cache is only an optimization (e.g. the package is read-only).
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
 
     def get(self, rgb_color: Tuple[int]):
+        index = self._table_index(rgb_color)
+        if index is not None:
+            best_color = self._color(index)
+        else:
+            best_color = self.get_many([rgb_color])[0]
+        instrumentation.emit("color_name", rgb=rgb_color, name=best_color.name)
+        return best_color
 
-        hls_color = colorsys.rgb_to_hls(*rgb_color)
-        best_distance = None
-        best_color = None
+    def get_many(self, rgb_colors: Iterable[Tuple[int]]) -> List[Color]:
+        """
+        Find the closest named color of each of the given colors.
 
-        for color_name in self.color_names:
+        The metric is the same as color_dist (RGB distance + 2 * HLS distance),
+        summed in the same order so that the result (and tie-breaking towards the
+        first color in the palette) is exactly the same as comparing one by one.
+        With a lookup table, most colors are just an index into it.
+        """
+        rgb_colors = [tuple(c) for c in rgb_colors]
+        best_indices = np.full(len(rgb_colors), -1, dtype=np.int64)
 
-            color_dist_rgb = self.color_dist(rgb_color, color_name.rgb)
-            color_dist_hls = self.color_dist(hls_color, color_name.hls)
-            combined_delta = color_dist_rgb + color_dist_hls * 2
+        if self.table is not None and rgb_colors:
+            rgb = np.array(rgb_colors).reshape(-1, 3)
+            if rgb.dtype.kind in "iu" and rgb.min() >= 0 and rgb.max() <= 255:
+                keys = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+                found = self.table[keys].astype(np.int64)
+                found[found == TABLE_MISSING] = -1
+                best_indices = found
 
-            if best_distance is None or combined_delta < best_distance:
-                best_distance = combined_delta
-                best_color = color_name
+        todo = np.flatnonzero(best_indices < 0)
+        for i in range(0, len(todo), BATCH_SIZE):
+            batch_indices = todo[i : i + BATCH_SIZE]
+            batch = [rgb_colors[j] for j in batch_indices]
+            best_indices[batch_indices] = self._closest_indices(batch)
 
-        print(f"Best match is: {best_color.name}")
-        return best_color
+        return [self._color(j) for j in best_indices]
+
+    def _table_index(self, rgb_color: Tuple[int]) -> Optional[int]:
+        if self.table is None or len(rgb_color) != 3:
+            return None
+        if not all(isinstance(v, int) and 0 <= v <= 255 for v in rgb_color):
+            return None
+        r, g, b = rgb_color
+        index = int(self.table[(r << 16) | (g << 8) | b])
+        return index if index != TABLE_MISSING else None
+
+    def _closest_indices(self, rgb_colors: List[Tuple[int]]) -> np.ndarray:
+        rgb = np.array(rgb_colors, dtype=np.int64).reshape(-1, 3)
+        hls = np.array([colorsys.rgb_to_hls(*c) for c in rgb_colors], dtype=np.float64)
+        hls = hls.reshape(-1, 3)
+
+        color_dist_rgb = self._array_dist(rgb, self.rgb_array)
+        color_dist_hls = self._array_dist(hls, self.hls_array)
+        combined_delta = color_dist_rgb + color_dist_hls * 2
+        return np.argmin(combined_delta, axis=1)
+
+    def _color(self, index: int) -> Color:
+        color = self._colors.get(index)
+        if color is None:
+            color = Color(self.hexes[index], self.names[index])
+            self._colors[index] = color
+        return color
 
     def color_dist(self, c1: Tuple[int], c2: Tuple[int]):
         delta = sum([pow(c1[i] - c2[i], 2) for i in range(3)])
         return delta
+
+    @staticmethod
+    def _array_dist(colors: np.ndarray, palette: np.ndarray) -> np.ndarray:
+        """
+        color_dist between each of the colors (rows) and each palette entry
+        (columns).
+        """
+        delta = colors[:, None, :] - palette[None, :, :]
+        squared = delta * delta
+        return squared[:, :, 0] + squared[:, :, 1] + squared[:, :, 2]
+
+
+def build_color_table(
+    mapper: ColorNameMapper, cell_size: int = TABLE_CELL_SIZE
+) -> np.ndarray:
+    """
+    The palette index of the closest named color of every 8-bit RGB color, the
+    same as get_many would find (TABLE_MISSING for the few colors that
+    colorsys can't convert, which get_many raises for).
+
+    Comparing 16.7M colors with the whole palette would take the best part of an
+    hour, so the colors are taken in cubes of cell_size (a power of 2). For each
+    cube, a lower bound of the distance to each palette color over the whole
+    cube rules out every palette color that can't be the closest to any color
+    in it, and only the rest are compared exactly.
+    """
+    if len(mapper.names) >= TABLE_MISSING:
+        raise ValueError(f"The palette has more than {TABLE_MISSING - 1} colors")
+
+    table = np.full(1 << 24, TABLE_MISSING, dtype=np.uint16)
+    corners = range(0, 256, cell_size)
+    for low in itertools.product(corners, corners, corners):
+        _fill_table_cell(table, mapper, low, cell_size)
+    return table
+
+
+def _fill_table_cell(
+    table: np.ndarray, mapper: ColorNameMapper, low: Tuple[int], cell_size: int
+):
+    """Fill in the closest named colors of a cube of colors from its low corner."""
+    palette_rgb = mapper.rgb_array
+    palette_hls = mapper.hls_array
+    palette_l = palette_hls[:, 1]
+
+    steps = np.arange(cell_size)
+    cell = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1)
+    low = np.array(low)
+    high = low + cell_size - 1
+    rgb = cell.reshape(-1, 3) + low
+    hls = _rgb_to_hls_array(rgb)
+    valid = np.isfinite(hls).all(axis=1)
+    rgb, hls = rgb[valid], hls[valid]
+
+    # The RGB part of the distance, at the nearest and farthest cube corner.
+    below = np.clip(low - palette_rgb, 0, None)
+    above = np.clip(palette_rgb - high, 0, None)
+    rgb_low = ((below + above) ** 2).sum(axis=1)
+    rgb_high = (np.maximum(palette_rgb - low, high - palette_rgb) ** 2).sum(axis=1)
+
+    # The HLS part: the lightness range is known, hue is within 0 and 1.
+    l_min, l_max = hls[:, 1].min(), hls[:, 1].max()
+    l_low = np.clip(l_min - palette_l, 0, None)
+    l_low += np.clip(palette_l - l_max, 0, None)
+    l_high = np.maximum(np.abs(palette_l - l_min), np.abs(palette_l - l_max))
+    s_high = np.abs(hls[:, 2]).max() + np.abs(palette_hls[:, 2])
+
+    lower_bound = rgb_low + 2 * l_low**2
+    upper_bound = rgb_high + 2 * (1 + l_high**2 + s_high**2)
+    limit = upper_bound.min()
+    candidates = np.flatnonzero(lower_bound <= limit + 1e-6 * (1 + limit))
+
+    color_dist_rgb = ColorNameMapper._array_dist(rgb, palette_rgb[candidates])
+    color_dist_hls = ColorNameMapper._array_dist(hls, palette_hls[candidates])
+    combined_delta = color_dist_rgb + color_dist_hls * 2
+    best = candidates[np.argmin(combined_delta, axis=1)]
+
+    keys = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    table[keys] = best
+
+
+def save_color_table(table: np.ndarray, table_path: str):
+    """Save the table (as a .npy, so it can be memory-mapped) atomically."""
+    temp_path = f"{table_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        np.save(f, table)
+    os.replace(temp_path, table_path)
+
+
+def _rgb_to_hls_array(rgb: np.ndarray) -> np.ndarray:
+    """
+    colorsys.rgb_to_hls of each row of 8-bit colors, with the same float
+    operations in the same order (so the same results), and NaN where colorsys
+    divides by zero.
+    """
+    r, g, b = (rgb[:, i].astype(np.float64) for i in range(3))
+    max_c = np.maximum(np.maximum(r, g), b)
+    min_c = np.minimum(np.minimum(r, g), b)
+    sum_c = max_c + min_c
+    range_c = max_c - min_c
+    l = sum_c / 2.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.where(l <= 0.5, range_c / sum_c, range_c / ((2.0 - max_c) - min_c))
+        rc = (max_c - r) / range_c
+        gc = (max_c - g) / range_c
+        bc = (max_c - b) / range_c
+        h = np.where(
+            r == max_c,
+            bc - gc,
+            np.where(g == max_c, (2.0 + rc) - bc, (4.0 + gc) - rc),
+        )
+        h = np.remainder(h / 6.0, 1.0)
+
+    gray = min_c == max_c
+    h[gray] = 0.0
+    s[gray] = 0.0
+    s[~gray & ~np.isfinite(s)] = np.nan
+    return np.stack([h, l, s], axis=1)
+
+
+def is_fresh(cache_path: str, source_path: str) -> bool:
+    if not os.path.exists(cache_path):
+        return False
+    return os.path.getmtime(cache_path) >= os.path.getmtime(source_path)
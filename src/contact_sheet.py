@@ -0,0 +1,187 @@
+"""
+Contact sheets: the art and meta-data of many items tiled into large grid
+images, a row of tiles at a time, so a sheet of any size never has to be held
+in memory (or a preview opened per item).
+"""
+
+import itertools
+import os
+from typing import Callable, Iterable, List
+
+from PIL import Image, ImageDraw
+
+from artwork_metadata import ArtworkMetadata
+from generate_collection import FONT_PATH, get_char_size, get_font, wrap_code
+from png_writer import PngStripWriter
+from render_cache import RAW, decode, get_render_cache
+
+BACKGROUND_COLOR = (255, 255, 255)
+TEXT_ID_COLOR = (150, 150, 180)
+TEXT_TITLE_COLOR = (10, 10, 15)
+TEXT_META_DATA_COLOR = (120, 120, 140)
+TEXT_CODE_COLOR = (190, 190, 210)
+
+FONT_NAME = os.path.join(FONT_PATH, "RobotoMono-Regular.ttf")
+FONT_BOLD_NAME = os.path.join(FONT_PATH, "RobotoMono-Bold.ttf")
+
+# Loads the art of an item, at the given size.
+ArtLoader = Callable[[ArtworkMetadata, int], Image.Image]
+
+
+class SheetLayout:
+    """
+    Where everything of a tile goes, worked out once per sheet from the glyph
+    metrics of its (monospaced) fonts, so text is fitted by counting characters
+    rather than measuring it for every tile.
+    """
+
+    def __init__(
+        self, columns: int, tile_size: int, padding: int = 16, code_lines: int = 2
+    ) -> None:
+        self.columns = columns
+        self.tile_size = tile_size
+        self.padding = padding
+        self.code_lines = code_lines
+
+        self.title_font = get_font(FONT_NAME, 14)
+        self.color_font = get_font(FONT_NAME, 12)
+        self.code_font = get_font(FONT_BOLD_NAME, 10)
+        title_char_w, title_char_h = get_char_size(FONT_NAME, 14)
+        color_char_w, color_char_h = get_char_size(FONT_NAME, 12)
+        code_char_w, code_char_h = get_char_size(FONT_BOLD_NAME, 10)
+
+        self.title_char_w = title_char_w
+        self.max_title_chars = tile_size // title_char_w
+        self.max_color_chars = tile_size // color_char_w
+        self.max_code_chars = tile_size // code_char_w
+
+        self.title_y = padding + tile_size + 6
+        self.color_y = self.title_y + title_char_h + 4
+        self.code_y = self.color_y + color_char_h + 4
+        self.code_line_height = code_char_h
+
+        self.width = padding + columns * (tile_size + padding)
+        self.strip_height = self.code_y + code_lines * code_char_h
+
+    def sheet_height(self, rows: int) -> int:
+        # A row of tiles per strip, and the bottom padding.
+        return rows * self.strip_height + self.padding
+
+    def draw_tile(
+        self,
+        strip: Image.Image,
+        draw: ImageDraw.ImageDraw,
+        column: int,
+        image: Image.Image,
+        metadata: ArtworkMetadata,
+    ):
+        x = self.padding + column * (self.tile_size + self.padding)
+        strip.paste(image, (x, self.padding))
+
+        item_id = metadata.item_id
+        title_font = self.title_font
+        draw.text((x, self.title_y), item_id, fill=TEXT_ID_COLOR, font=title_font)
+        title_x = x + (len(item_id) + 1) * self.title_char_w
+        title = _fit(metadata.title, self.max_title_chars - len(item_id) - 1)
+        draw.text(
+            (title_x, self.title_y), title, fill=TEXT_TITLE_COLOR, font=title_font
+        )
+
+        color_set = set([metadata.start_color_name, metadata.end_color_name])
+        color_text = _fit(", ".join(color_set), self.max_color_chars)
+        color_font = self.color_font
+        draw.text(
+            (x, self.color_y), color_text, fill=TEXT_META_DATA_COLOR, font=color_font
+        )
+
+        code_lines = wrap_code(metadata.code, self.max_code_chars)
+        code_lines = [line for line in code_lines if line]
+        if len(code_lines) > self.code_lines:
+            code_lines = code_lines[: self.code_lines]
+            code_lines[-1] = _fit(code_lines[-1] + "...", self.max_code_chars)
+        for i, line in enumerate(code_lines):
+            y = self.code_y + i * self.code_line_height
+            draw.text((x, y), line, fill=TEXT_CODE_COLOR, font=self.code_font)
+
+
+def generate_contact_sheets(
+    metadata_items: Iterable[ArtworkMetadata],
+    output_path: str,
+    name: str,
+    columns: int = 8,
+    rows: int = 8,
+    tile_size: int = 256,
+    load_art: ArtLoader = None,
+) -> List[str]:
+    """
+    Tile the art and meta-data of the items, in order, into sheets of (at most)
+    rows x columns, named {name}_sheet_001.png and so on. Returns the paths of
+    the sheets written.
+
+    Only one sheet's worth of meta-data and one row of tiles are held at once.
+    The art comes from load_art, or else is rendered (through the process's
+    render cache) from the item's code.
+    """
+    load_art = load_art or render_art
+    layout = SheetLayout(columns, tile_size)
+    os.makedirs(output_path, exist_ok=True)
+
+    # One strip image, cleared and drawn again for every row of tiles.
+    strip = Image.new("RGB", (layout.width, layout.strip_height), BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(strip)
+    bottom_padding = Image.new("RGB", (layout.width, layout.padding), BACKGROUND_COLOR)
+
+    metadata_items = iter(metadata_items)
+    sheet_paths = []
+    while True:
+        sheet_items = list(itertools.islice(metadata_items, rows * columns))
+        if not sheet_items:
+            break
+
+        sheet_rows = (len(sheet_items) + columns - 1) // columns
+        sheet_path = os.path.join(
+            output_path, f"{name}_sheet_{str(len(sheet_paths) + 1).zfill(3)}.png"
+        )
+        height = layout.sheet_height(sheet_rows)
+        with PngStripWriter(sheet_path, layout.width, height) as writer:
+            for row in range(sheet_rows):
+                strip.paste(BACKGROUND_COLOR, (0, 0) + strip.size)
+                row_items = sheet_items[row * columns : (row + 1) * columns]
+                for column, metadata in enumerate(row_items):
+                    image = load_art(metadata, tile_size)
+                    layout.draw_tile(strip, draw, column, image, metadata)
+                writer.write(strip)
+            writer.write(bottom_padding)
+        sheet_paths.append(sheet_path)
+
+    return sheet_paths
+
+
+def render_art(metadata: ArtworkMetadata, size: int) -> Image.Image:
+    data = get_render_cache().render(metadata.code, [(size, RAW)])[(size, RAW)]
+    return decode(data, size, RAW)
+
+
+def art_file_loader(art_path: str, collection_id: str) -> ArtLoader:
+    """
+    Loads the art of an item from a collection's art/ folder (resized to the
+    tile), or renders it if the file isn't there.
+    """
+
+    def load_art(metadata: ArtworkMetadata, size: int) -> Image.Image:
+        path = os.path.join(art_path, f"{collection_id}_{metadata.item_id}.png")
+        if not os.path.exists(path):
+            return render_art(metadata, size)
+        with Image.open(path) as image:
+            image = image.convert("RGB")
+            if image.size != (size, size):
+                image = image.resize((size, size), resample=Image.ANTIALIAS)
+            return image
+
+    return load_art
+
+
+def _fit(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[: max(max_chars - 3, 0)] + "..."
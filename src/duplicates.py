@@ -0,0 +1,198 @@
+"""Finding duplicate (and nearly duplicate) titles and artworks in a collection."""
+
+import itertools
+import json
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from PIL import Image
+
+INDEX_FILE_NAME = "phash_index.jsonl"
+HASH_BITS = 64
+# Bigger buckets of near duplicate candidates are split again (up to MAX_SPLITS
+# times beyond the first split).
+MAX_BUCKET_SIZE = 32
+MAX_SPLITS = 2
+
+
+def normalize_title(title: str) -> str:
+    """Titles that only differ by case, punctuation or spacing are the same."""
+    title = re.sub(r"[^\w\s]", "", title.lower())
+    return " ".join(title.split())
+
+
+def group_duplicates(titles: Dict[str, str]) -> Dict[str, List[str]]:
+    """Group item ids (keys) by their normalized title, keeping the duplicates."""
+    registry = {}
+    for item_id, title in titles.items():
+        registry.setdefault(normalize_title(title), []).append(item_id)
+    return {k: sorted(v) for k, v in registry.items() if len(v) > 1}
+
+
+def image_hash(image: Image.Image) -> int:
+    """
+    A 64 bit difference hash: whether each pixel of a 9x8 grayscale thumbnail is
+    brighter than its right neighbour. Similar images have hashes that differ in
+    only a few bits.
+    """
+    small = image.convert("L").resize((9, 8), resample=Image.ANTIALIAS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def find_near_duplicates(
+    hashes: Dict[str, int], max_distance: int, max_bucket_size: int = MAX_BUCKET_SIZE
+) -> List[Tuple[str, str, int]]:
+    """
+    All the pairs of items whose hashes are within max_distance bits.
+
+    The hashes are split into max_distance + 1 chunks: if two hashes differ in at
+    most max_distance bits, at least one of their chunks must be identical. So
+    only the hashes sharing a chunk bucket are compared, rather than every pair.
+
+    The art is mostly dark, so many hashes share chunks (of zeros). Items with
+    the same hash are compared once, as one hash, and a bucket of more than
+    max_bucket_size hashes is split again the same way (on the bits they don't
+    all share). A bucket that splitting doesn't make smaller is compared whole,
+    so the worst case, hashes that are all within a few bits of each other, is
+    still every pair of distinct hashes.
+
+    The buckets are cheap to build, so they are built on every run from the
+    hashes (which are what the ImageHashIndex keeps).
+    """
+    items: Dict[int, List[str]] = {}
+    for item_id, value in hashes.items():
+        items.setdefault(value, []).append(item_id)
+
+    distances = {}
+    all_bits = (1 << HASH_BITS) - 1
+    for bucket in _buckets(list(items), all_bits, max_distance, max_bucket_size):
+        for i, a in enumerate(bucket):
+            for b in bucket[i + 1 :]:
+                pair = (a, b) if a < b else (b, a)
+                if pair not in distances:
+                    distances[pair] = hamming_distance(a, b)
+
+    pairs = []
+    for item_ids in items.values():
+        pairs.extend((a, b, 0) for a, b in itertools.combinations(sorted(item_ids), 2))
+    for (a, b), distance in distances.items():
+        if distance <= max_distance:
+            pairs.extend(
+                (min(x, y), max(x, y), distance) for x in items[a] for y in items[b]
+            )
+    return sorted(pairs)
+
+
+def _buckets(
+    values: List[int],
+    mask: int,
+    max_distance: int,
+    max_bucket_size: int,
+    depth: int = 0,
+) -> Iterator[List[int]]:
+    """
+    The groups of (distinct) hashes to compare, out of hashes that can only
+    differ on the bits of mask. Every split puts each hash in max_distance + 1
+    buckets, so a bucket is only split up to MAX_SPLITS times after the first.
+    """
+    # The bits that all the hashes share can't make them differ, so they're
+    # left out (which also means that every chunk splits the hashes).
+    varying = 0
+    for value in values:
+        varying |= value ^ values[0]
+    bits = [bit for bit in range(HASH_BITS) if (mask & varying) >> bit & 1]
+
+    n_chunks = max_distance + 1
+    if len(values) <= max_bucket_size or len(bits) < n_chunks or depth > MAX_SPLITS:
+        yield values
+        return
+
+    chunks = []
+    for chunk in range(n_chunks):
+        start, end = len(bits) * chunk // n_chunks, len(bits) * (chunk + 1) // n_chunks
+        chunk_mask = sum(1 << bit for bit in bits[start:end])
+        buckets: Dict[int, List[int]] = {}
+        for value in values:
+            buckets.setdefault(value & chunk_mask, []).append(value)
+        chunks.append((chunk_mask, [b for b in buckets.values() if len(b) > 1]))
+
+    # If the hashes are too close for the split to save comparisons, they're
+    # all compared.
+    n_split_pairs = sum(len(b) ** 2 for _, buckets in chunks for b in buckets)
+    if n_split_pairs >= len(values) ** 2:
+        yield values
+        return
+
+    for chunk_mask, buckets in chunks:
+        for bucket in buckets:
+            yield from _buckets(
+                bucket, mask & ~chunk_mask, max_distance, max_bucket_size, depth + 1
+            )
+
+
+class ImageHashIndex:
+    """
+    A sidecar file of the image hash of every art file in a collection. It is
+    append-only, and each file is only hashed again if its size or mtime changed,
+    so updating the index after adding items only hashes the new ones.
+    """
+
+    def __init__(self, collection_path: str) -> None:
+        self.path = os.path.join(collection_path, INDEX_FILE_NAME)
+        self.entries: Dict[str, dict] = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.entries[entry["file"]] = entry
+
+    def update(self, file_paths: Iterable[str]) -> int:
+        """Hash the new or changed files, returning how many were hashed."""
+        n_hashed = 0
+        with open(self.path, "a") as f:
+            for file_path in file_paths:
+                file_name = os.path.basename(file_path)
+                stat = os.stat(file_path)
+                entry = self.entries.get(file_name)
+                if (
+                    entry is not None
+                    and entry["size"] == stat.st_size
+                    and entry["mtime"] == stat.st_mtime
+                ):
+                    continue
+
+                with Image.open(file_path) as image:
+                    value = image_hash(image)
+
+                entry = {
+                    "file": file_name,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "hash": f"{value:016x}",
+                }
+                f.write(json.dumps(entry) + "\n")
+                self.entries[file_name] = entry
+                n_hashed += 1
+        return n_hashed
+
+    def hashes(self, file_names: Iterable[str] = None) -> Dict[str, int]:
+        """The hash of each (or only the given) indexed file, by file name."""
+        if file_names is None:
+            file_names = self.entries.keys()
+        return {name: int(self.entries[name]["hash"], 16) for name in file_names}
@@ -1,51 +1,102 @@
-from typing import Tuple
+import io
+import threading
+from typing import Dict, Iterator, List, Tuple, Union
 from PIL import Image, ImageDraw, ImageChops
+import math
 import random
 import colorsys
 from color import Color
 from art_node import ArtNode
 from artwork import Artwork
+import instrumentation
 
+BG_COLOR = (12, 16, 36)
+BLACK = (0, 0, 0)
 
-def generate_starting_color():
+# A (left, upper, right, lower) region of an image.
+Box = Tuple[int, int, int, int]
+
+
+def get_rng(rng: Union[random.Random, int] = None):
+    """
+    The source of randomness for the generators: a random.Random as is, a new
+    random.Random for a seed, or the global random module if there is neither.
+    """
+    if rng is None or rng is random:
+        return random
+    if isinstance(rng, random.Random):
+        return rng
+    return random.Random(rng)
+
+
+def generate_starting_color(rng: Union[random.Random, int] = None):
+    rng = get_rng(rng)
 
     # Choose starting HSV values.
-    h = random.random()
-    s = random.choice([0.3, 0.5, 1, 1])  # Favor saturated colors.
-    v = random.choice([0.2, 0.8])  # Either dark or bright.
+    h = rng.random()
+    s = rng.choice([0.3, 0.5, 1, 1])  # Favor saturated colors.
+    v = rng.choice([0.2, 0.8])  # Either dark or bright.
 
     return Color.hsv_float_to_rgb_int((h, s, v))
 
 
-def generate_end_color(start_color):
+def generate_end_color(start_color, rng: Union[random.Random, int] = None):
+    rng = get_rng(rng)
     h, s, v = colorsys.rgb_to_hsv(*map(lambda x: x / 255, start_color))
 
-    h += random.random() * 0.3  # Don't offset hue by too much.
+    h += rng.random() * 0.3  # Don't offset hue by too much.
     v = 1  # Set value to max.
-    s = min(1, s + random.choice([0.2, 0.5, 1.0]))  # Saturation will only increase.
+    s = min(1, s + rng.choice([0.2, 0.5, 1.0]))  # Saturation will only increase.
 
     return Color.hsv_float_to_rgb_int((h, s, v))
 
 
-def generate_art(output_path: str):
-    start_color = generate_starting_color()
-    end_color = generate_end_color(start_color)
-    generate_art_from_color(start_color, end_color, output_path)
+def generate_art(output_path: str, rng: Union[random.Random, int] = None):
+    rng = get_rng(rng)
+    start_color = generate_starting_color(rng)
+    end_color = generate_end_color(start_color, rng)
+    generate_art_from_color(start_color, end_color, output_path, rng)
 
 
-def generate_art_from_color(start_color, end_color, output_path: str):
-    print(f"Generating art with colors: {start_color}, {end_color} to {output_path}")
-    code = generate_art_code(start_color, end_color)
+def generate_art_from_color(
+    start_color, end_color, output_path: str, rng: Union[random.Random, int] = None
+):
+    instrumentation.emit(
+        "generate_art",
+        start_color=start_color,
+        end_color=end_color,
+        output_path=output_path,
+    )
+    code = generate_art_code(start_color, end_color, rng)
     image = generate_art_from_code(code, output_path=output_path)
     return image
 
 
-def generate_art_code(start_color: Tuple[int], end_color: Tuple[int]):
+def generate_seeded_art_code(seed: int) -> str:
+    """
+    The art code (colors included) for a seed. The same seed always gives the
+    same code, so the seed can stand in for the code (e.g. as a cache key).
+    """
+    rng = random.Random(seed)
+    start_color = generate_starting_color(rng)
+    end_color = generate_end_color(start_color, rng)
+    return generate_art_code(start_color, end_color, rng)
+
+
+def generate_art_code(
+    start_color: Tuple[int],
+    end_color: Tuple[int],
+    rng: Union[random.Random, int] = None,
+):
     """
     This is the algorithm to generate the artwork.
     We will aim to generate at terminal_size_px resolution, but will double
     it so we can anti-alias it back down.
+
+    The randomness comes from rng (see get_rng), so passing a seeded
+    random.Random makes the code reproducible.
     """
+    rng = get_rng(rng)
 
     # Image size.
     terminal_size_px = 512
@@ -58,14 +109,14 @@ def generate_art_code(start_color: Tuple[int], end_color: Tuple[int]):
     padding_px = 32 * scale_factor
 
     # How many nodes to generate (not included inserted nodes)
-    iterations = random.choice([7, 8, 9])
+    iterations = rng.choice([7, 8, 9])
 
     # Line thickness and delta.
     max_thickness = 10 * scale_factor
     min_thickness = 3 * scale_factor
     thickness_delta = 1 * scale_factor
 
-    shape_close_off = random.choice(
+    shape_close_off = rng.choice(
         [4, 7]
     )  # Every X nodes, insert another node to close off the shape.
 
@@ -74,7 +125,7 @@ def generate_art_code(start_color: Tuple[int], end_color: Tuple[int]):
     max_p = image_size_px - padding_px
     art_nodes = []
     thickness = min_thickness
-    thickness_mod = random.choice([thickness_delta])
+    thickness_mod = rng.choice([thickness_delta])
 
     for i in range(iterations):
 
@@ -83,8 +134,8 @@ def generate_art_code(start_color: Tuple[int], end_color: Tuple[int]):
             art_nodes.append(art_nodes[-shape_close_off].clone())
 
         # Put it in a random spot.
-        x = random.randint(min_p, max_p)
-        y = random.randint(min_p, max_p)
+        x = rng.randint(min_p, max_p)
+        y = rng.randint(min_p, max_p)
 
         # Create the node.
         node = ArtNode(x=x, y=y, thickness=thickness)
@@ -123,22 +174,84 @@ def generate_art_code(start_color: Tuple[int], end_color: Tuple[int]):
     art.nodes = art_nodes
     art.start_color = start_color
     art.end_color = end_color
-    print(f"Serialized art: {art.serialize()}")
-    return art.serialize()
+    code = art.serialize()
+    instrumentation.emit("art_code", code=code)
+    return code
+
 
+def generate_art_from_code(
+    code: str, output_path: str = None, renderer: str = "composite", size: int = None
+):
+    """
+    Render the art code into an image of size x size pixels (by default, the
+    art's own size), and save it to output_path if there is one.
+    """
+    size = size or Artwork.deserialize(code).size
+    image = generate_art_images(code, [size], renderer=renderer)[size]
+    if output_path is not None:
+        image.save(output_path)
+    return image
 
-def generate_art_from_code(code: str, output_path: str):
+
+def generate_art_images(
+    code: str,
+    sizes: List[int],
+    renderer: str = "composite",
+    buffers: "RenderBuffers" = None,
+) -> Dict[int, Image.Image]:
+    """
+    Render the art code once, at 2x the largest of the sizes, and downsample it
+    into an image of each size. The sizes are cascaded (each is resized from the
+    next larger one), so every output only costs one resize of a small image.
+
+    The composite renderer draws on the buffers, if given, rather than on new
+    images (only the resized images are returned, so they don't share them).
+    """
 
     # Deserialize the art from the code.
     art = Artwork.deserialize(code)
+    sizes = sorted(set(sizes), reverse=True)
 
-    # Generate the background.
-    image_size_px = art.size * 2
-    BG_COLOR = (12, 16, 36)
-    BLACK = (0, 0, 0)
-    image = Image.new("RGB", (image_size_px, image_size_px), color=BG_COLOR)
+    if renderer == "composite":
+        image = render_composite(art, sizes[0], buffers)
+    elif renderer == "reference":
+        image = render_reference(art, sizes[0])
+    else:
+        raise ValueError(f"Unknown renderer: {renderer}")
+
+    # Anti-alias the image.
+    images = {}
+    for size in sizes:
+        image = image.resize((size, size), resample=Image.ANTIALIAS)
+        images[size] = image
+    return images
+
+
+def encode_images(
+    images: Dict[int, Image.Image], image_formats: List[str], **params
+) -> Dict[Tuple[int, str], bytes]:
+    """
+    Encode each image in each format (e.g. "PNG", "WEBP", "JPEG"), without
+    writing anything to disk. Returns the bytes by (size, format).
+    """
+    encoded = {}
+    for size, image in images.items():
+        for image_format in image_formats:
+            buffer = io.BytesIO()
+            image.save(buffer, format=image_format, **params)
+            encoded[(size, image_format)] = buffer.getvalue()
+    return encoded
+
+
+def iterate_segments(art: Artwork, size: int = None):
+    """
+    Yields the (start_xy, end_xy, color, thickness) of each line in the artwork,
+    in draw order and at the 2x supersampled resolution of the given size.
+    """
+    factor = 2 * (size or art.size) / art.size
+    if factor == int(factor):
+        factor = int(factor)
 
-    # Start drawing the artwork by connecting the nodes and changing the colors.
     n_points = len(art.nodes)
     for i in range(n_points):
 
@@ -152,19 +265,146 @@ def generate_art_from_code(code: str, output_path: str):
         color_factor = abs(((i * 2) / n_points) - 1)
         line_color = Color.interpolate(art.end_color, art.start_color, color_factor)
 
+        thickness = max(1, round(node.thickness * factor / 2))
+        yield node.xy(factor), next_node.xy(factor), line_color, thickness
+
+
+def segment_box(start_xy, end_xy, thickness: int, image_size_px: int):
+    """
+    The box (left, upper, right, lower) that contains every pixel a line
+    segment can touch, clamped to the canvas.
+    """
+    margin = thickness + 2
+    left = max(0, math.floor(min(start_xy[0], end_xy[0])) - margin)
+    upper = max(0, math.floor(min(start_xy[1], end_xy[1])) - margin)
+    right = min(image_size_px, math.ceil(max(start_xy[0], end_xy[0])) + margin + 1)
+    lower = min(image_size_px, math.ceil(max(start_xy[1], end_xy[1])) + margin + 1)
+    return (left, upper, right, lower)
+
+
+def render_composite(art: Artwork, size: int = None, buffers: "RenderBuffers" = None):
+    """
+    Render the artwork at 2x resolution, adding each segment's 'light' onto the
+    canvas only within its bounding box (see composite_segments).
+
+    With buffers, the canvas and overlay are theirs, so the returned image is
+    only good until the next render with the same buffers.
+    """
+    image_size_px = (size or art.size) * 2
+    if buffers is not None:
+        image, overlay = buffers.get(image_size_px)
+    else:
+        image = Image.new("RGB", (image_size_px, image_size_px), color=BG_COLOR)
+        overlay = None
+    for _ in composite_segments(image, art, size, overlay=overlay):
+        pass
+    return image
+
+
+class RenderBuffers:
+    """
+    The 2x canvas and the scratch overlay of the composite renderer, kept to be
+    reused by the next render of the same size rather than allocated again (a
+    pair of 3MB images for 512px art). One render at a time can use them, so
+    there is a set per thread (see get_render_buffers). They are kept as long
+    as the thread is, at the largest size it rendered, so they are only meant
+    for threads that render many items of the same size.
+    """
+
+    def __init__(self) -> None:
+        self.canvas: Image.Image = None
+        self.overlay: Image.Image = None
+
+    def get(self, image_size_px: int) -> Tuple[Image.Image, Image.Image]:
+        """The canvas (cleared to the background) and overlay (cleared to black)."""
+        image_size = (image_size_px, image_size_px)
+        if self.canvas is None or self.canvas.size != image_size:
+            self.canvas = Image.new("RGB", image_size, color=BG_COLOR)
+            self.overlay = Image.new("RGB", image_size, color=BLACK)
+        else:
+            self.canvas.paste(BG_COLOR, (0, 0) + image_size)
+            # Rendering wipes the overlay as it goes, unless it stopped part way.
+            self.overlay.paste(BLACK, (0, 0) + image_size)
+        return self.canvas, self.overlay
+
+
+_thread_buffers = threading.local()
+
+
+def get_render_buffers() -> RenderBuffers:
+    """The render buffers of this thread."""
+    buffers = getattr(_thread_buffers, "buffers", None)
+    if buffers is None:
+        buffers = RenderBuffers()
+        _thread_buffers.buffers = buffers
+    return buffers
+
+
+def composite_segments(
+    image: Image.Image,
+    art: Artwork,
+    size: int = None,
+    steps_per_segment: int = 1,
+    overlay: Image.Image = None,
+) -> Iterator[Box]:
+    """
+    Add the segments of the artwork onto the (2x resolution) image one at a time,
+    yielding the box that changed after each step, e.g. to show each step as a
+    frame of an animation.
+
+    A single black scratch overlay is reused for every segment: the line is drawn
+    at its real coordinates (so the rasterization is identical to the reference
+    renderer), only its box is added onto the canvas, and then the box is wiped.
+
+    With more than one step per segment, the earlier steps draw the segment up to
+    part of its length. Those are taken back off the image once the next step is
+    asked for (so the light of a segment is only added once), and the last step
+    draws the whole segment, so the final image is the same for any steps.
+    """
+    image_size_px = image.size[0]
+    if overlay is None:
+        overlay = Image.new("RGB", image.size, color=BLACK)
+    overlay_draw = ImageDraw.Draw(overlay)
+
+    for start_xy, end_xy, line_color, thickness in iterate_segments(art, size):
+        box = segment_box(start_xy, end_xy, thickness, image_size_px)
+        if box[0] >= box[2] or box[1] >= box[3]:
+            continue
+
+        for step in range(1, steps_per_segment + 1):
+            if step < steps_per_segment:
+                t = step / steps_per_segment
+                step_end_xy = tuple(a + (b - a) * t for a, b in zip(start_xy, end_xy))
+                step_box = segment_box(start_xy, step_end_xy, thickness, image_size_px)
+            else:
+                step_end_xy = end_xy
+                step_box = box
+
+            overlay_draw.line([start_xy, step_end_xy], fill=line_color, width=thickness)
+            unlit = image.crop(step_box)
+            image.paste(ImageChops.add(unlit, overlay.crop(step_box)), step_box)
+            overlay.paste(BLACK, step_box)
+            yield step_box
+
+            if step < steps_per_segment:
+                image.paste(unlit, step_box)
+
+
+def render_reference(art: Artwork, size: int = None):
+    """
+    The original renderer: a full canvas overlay per segment. This is slow, but it
+    is kept as the reference to compare the other renderers against.
+    """
+    image_size_px = (size or art.size) * 2
+    image = Image.new("RGB", (image_size_px, image_size_px), color=BG_COLOR)
+
+    # Start drawing the artwork by connecting the nodes and changing the colors.
+    for start_xy, end_xy, line_color, thickness in iterate_segments(art, size):
+
         # Overlay the image so it looks like 'light'.
         overlay = Image.new("RGB", (image_size_px, image_size_px), color=BLACK)
         overlay_draw = ImageDraw.Draw(overlay)
-        overlay_draw.line(
-            [node.xy(2), next_node.xy(2)],
-            fill=line_color,
-            width=node.thickness,
-        )
+        overlay_draw.line([start_xy, end_xy], fill=line_color, width=thickness)
         image = ImageChops.add(image, overlay)
 
-    # Anti-alias the image.
-    image = image.resize(
-        (image_size_px // 2, image_size_px // 2), resample=Image.ANTIALIAS
-    )
-    image.save(output_path)
     return image
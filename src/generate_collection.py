@@ -1,20 +1,99 @@
 import os
 import json
+import random
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 from PIL import Image, ImageFont, ImageDraw
 
-from art_name_generator import generate_name_with_retry
+from art_name_generator import (
+    generate_name_with_retry,
+    generate_names,
+    get_default_backend,
+)
+from title_cache import get_title_cache
+import instrumentation
+from artwork import Artwork
 from artwork_metadata import ArtworkMetadata
-
-from color_name import ColorNameMapper
+from collection_manifest import (
+    FULL,
+    PREVIEW,
+    SKIP,
+    CollectionManifest,
+    hash_file,
+    new_item_record,
+)
+from item_results import future_result, look_ahead, report_items
+from metadata_store import METADATA_FILES, METADATA_STREAM, MetadataStore
+from output_writer import OutputWriter, get_output_writer
+from pipeline import MemoryBudget, Pipeline, Stage
+from render_cache import RAW, RenderCache, decode, get_render_cache
 from generate_art import (
+    RenderBuffers,
     generate_art_code,
-    generate_art_from_code,
     generate_end_color,
     generate_starting_color,
+    get_render_buffers,
 )
 
-COLOR_NAME_MAPPER = ColorNameMapper("src/color_names.json")
+FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "font")
+
+
+# Bump this whenever the layout of generate_preview_image changes, so that
+# incremental builds know to redo the previews.
+PREVIEW_VERSION = 1
+
+# The size of the artwork in the preview.
+PREVIEW_IMAGE_SIZE = 256
+
+# How many new items are named at once (with concurrent requests), when the
+# titles come from the API.
+NAME_BATCH_SIZE = 16
+
+# The canvas and overlay a render thread keeps (see RenderBuffers), for 512px art.
+RENDER_BUFFER_BYTES = 2 * 3 * (2 * 512) ** 2
+
+
+class CollectionOptions:
+    """The settings shared by every item of a collection run."""
+
+    def __init__(
+        self,
+        collection_id: str,
+        collection_path: str,
+        use_ai: bool = True,
+        title_cache_path: str = None,
+        metadata_mode: str = METADATA_FILES,
+        render_cache_path: str = None,
+        write_threads: int = 2,
+        png_compress_level: int = None,
+        png_optimize: bool = False,
+    ) -> None:
+        self.collection_id = collection_id
+        self.collection_path = collection_path
+        self.use_ai = use_ai
+        self.title_cache_path = title_cache_path
+        self.metadata_mode = metadata_mode
+        self.render_cache_path = render_cache_path
+        self.write_threads = write_threads
+        self.png_compress_level = png_compress_level
+        self.png_optimize = png_optimize
+        self.instrument = instrumentation.is_enabled()
+
+    def output_writer(self) -> OutputWriter:
+        return get_output_writer(
+            self.write_threads, self.png_compress_level, self.png_optimize
+        )
+
+    def item_paths(self, item_id: int) -> dict:
+        """The paths of the files an item has (no meta file when streaming)."""
+        paths = get_item_paths(self.collection_id, self.collection_path, item_id)
+        if self.metadata_mode == METADATA_STREAM:
+            del paths["meta"]
+        return paths
 
 
 def generate_collection(
@@ -23,66 +102,739 @@ def generate_collection(
     n: int,
     start_index: int = 1,
     use_ai: bool = True,
+    workers: int = 1,
+    seed: int = None,
+    title_cache_path: str = None,
+    resume: bool = True,
+    metadata_mode: str = METADATA_FILES,
+    render_cache_path: str = None,
+    write_threads: int = 2,
+    png_compress_level: int = None,
+    png_optimize: bool = False,
+    pipeline: bool = False,
+    render_threads: int = 2,
+    memory_budget: int = None,
 ):
-    collection_path = os.path.join(folder_path, collection_id)
-    os.makedirs(collection_path, exist_ok=True)
+    """
+    Generate n items of the collection, optionally spread across a pool of
+    worker processes. Every item is generated from its own seed (derived from the
+    collection seed), so the output doesn't depend on the scheduling.
 
-    for i in range(start_index, start_index + n):
-        generate_single_artwork(collection_id, collection_path, i, use_ai)
+    Each generated item is recorded in the collection's manifest. With resume, a
+    rerun skips the items whose outputs are all still there and unchanged, only
+    redoes the previews if PREVIEW_VERSION changed, and fully regenerates the rest.
+    Without a seed, a rerun uses the seed recorded in the manifest.
 
+    If title_cache_path is set, unused AI title candidates are kept in a
+    TitleCache there and served before asking for new ones. Its hits and misses
+    are printed at the end of the run.
 
-def generate_single_artwork(
-    collection_id: str, collection_path: str, item_id: int, use_ai: bool = True
-):
+    The meta-data is written as one JSON file per item (METADATA_FILES), to the
+    collection's MetadataStore (METADATA_STREAM), or both (METADATA_BOTH).
+
+    Renders go through each process's RenderCache, which also keeps them on disk
+    (shared by every worker and run) if render_cache_path is set.
+
+    The files are encoded and written by write_threads background threads (per
+    process), while the next item is generated. The PNG compression can be
+    traded for speed with png_compress_level (0-9) and png_optimize.
 
-    art_path = os.path.join(collection_path, "art")
-    os.makedirs(art_path, exist_ok=True)
+    With pipeline, the items go through a pipeline of stages in this process
+    instead (codes, render on render_threads threads, names, then files), so
+    that the stages overlap. If memory_budget (in bytes) is set, fewer render
+    threads are used and items wait to be rendered, to keep the memory of the
+    renders and the items in flight within it.
 
-    meta_path = os.path.join(collection_path, "meta")
-    os.makedirs(meta_path, exist_ok=True)
+    If instrumentation is enabled, the events of each item (including those from
+    worker processes) are sent to its sinks in item order.
 
-    preview_path = os.path.join(collection_path, "preview")
-    os.makedirs(preview_path, exist_ok=True)
+    Returns the ids of the items that failed to generate.
+    """
+    if pipeline and workers > 1:
+        raise ValueError("The pipeline runs in one process, use render_threads")
 
+    collection_path = os.path.join(folder_path, collection_id)
+    os.makedirs(collection_path, exist_ok=True)
+    options = CollectionOptions(
+        collection_id,
+        collection_path,
+        use_ai=use_ai,
+        title_cache_path=title_cache_path,
+        metadata_mode=metadata_mode,
+        render_cache_path=render_cache_path,
+        write_threads=write_threads,
+        png_compress_level=png_compress_level,
+        png_optimize=png_optimize,
+    )
+    store = None
+    if metadata_mode != METADATA_FILES:
+        store = MetadataStore(collection_path)
+        # Shared with the previews redone in this process (and forked workers).
+        _metadata_stores[collection_path] = store
+
+    manifest = CollectionManifest(collection_path)
+    if seed is None:
+        seed = manifest.seed if manifest.seed is not None else random.randrange(2 ** 32)
+    manifest.set_seed(seed)
+    print(f"Generating {n} items of {collection_id} with seed {seed}")
+
+    jobs = []
+    for i in range(start_index, start_index + n):
+        item_seed = get_item_seed(seed, i)
+        action = FULL
+        if resume:
+            paths = options.item_paths(i)
+            action = manifest.get_action(i, item_seed, paths, PREVIEW_VERSION)
+            if store is not None and str(i).zfill(3) not in store:
+                action = FULL
+        if action != SKIP:
+            jobs.append((options, i, item_seed, action))
+
+    print(f"Skipping {n - len(jobs)} items that are already up to date")
+    item_ids = [job[1] for job in jobs]
+    title_cache = None
+    if use_ai and title_cache_path is not None:
+        title_cache = get_title_cache(title_cache_path)
+        title_stats = title_cache.stats()
+    # The titles of the new items are added to their jobs as they are needed.
+    jobs = _name_jobs(options, jobs)
+
+    if pipeline:
+        collection_pipeline = _CollectionPipeline(
+            render_threads, write_threads, memory_budget
+        )
+        results = collection_pipeline.run(jobs)
+        failed_ids = _report_items(item_ids, results, manifest, store)
+        print(collection_pipeline.report())
+    elif workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = (executor.submit(_generate_item, *job) for job in jobs)
+            # A couple of items per worker are submitted ahead (while the next
+            # titles are named), and each item is reported (and recorded) as
+            # soon as it is done.
+            futures = look_ahead(futures, 2 * workers)
+            results = (future_result(future, _worker_died) for future in futures)
+            failed_ids = _report_items(item_ids, results, manifest, store)
+    else:
+        # The files of an item are only waited for (and the item recorded) once
+        # the next item has been generated, so the two overlap.
+        results = (_generate_item(*job, wait=False) for job in jobs)
+        failed_ids = _report_items(item_ids, look_ahead(results), manifest, store)
+
+    if title_cache is not None:
+        # The cache is the process's, so only count what this run did.
+        stats = title_cache.stats()
+        for key in ["hits", "misses", "evictions"]:
+            stats[key] -= title_stats[key]
+        print(
+            f"Title cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['evictions']} evictions, {stats['titles']} titles kept"
+        )
+    if failed_ids:
+        print(f"Failed to generate {len(failed_ids)} of {n} items: {failed_ids}")
+    return failed_ids
+
+
+def get_item_seed(collection_seed: int, item_id: int) -> int:
+    """
+    The seed of a single item. It only depends on the collection seed and the
+    item id (and not on PYTHONHASHSEED), so it is stable across runs.
+    """
+    return random.Random(f"{collection_seed}:{item_id}").getrandbits(32)
+
+
+def get_item_paths(collection_id: str, collection_path: str, item_id: int) -> dict:
+    """The art, meta and preview file paths of an item."""
     item_id_str = str(item_id).zfill(3)
     item_name = f"{collection_id}_{item_id_str}"
-    item_art_path = os.path.join(art_path, f"{item_name}.png")
+    return {
+        "art": os.path.join(collection_path, "art", f"{item_name}.png"),
+        "meta": os.path.join(collection_path, "meta", f"{item_id_str}.json"),
+        "preview": os.path.join(
+            collection_path, "preview", f"{item_name}_preview.png"
+        ),
+    }
+
+
+def _name_jobs(options: CollectionOptions, jobs: List[tuple], batch_size: int = None):
+    """
+    Yield the jobs with the titles of their new items added, named a batch at a
+    time through generate_names (so that several requests are in flight, with
+    backoff when rate-limited) rather than with one blocking request per item.
+    If the titles don't come from the API, they are None, and every item names
+    itself.
+
+    The titles of the run are kept unique (through one name_set). An item that
+    can't be named gets a _NamingError as its title, so that it fails alone.
+    """
+    backend = get_default_backend() if options.use_ai else None
+    if backend is None:
+        for job in jobs:
+            yield (*job, None)
+        return
+
+    batch_size = batch_size or NAME_BATCH_SIZE
+    cache = None
+    if options.title_cache_path is not None:
+        cache = get_title_cache(options.title_cache_path)
+    name_set = set()
+    for start in range(0, len(jobs), batch_size):
+        batch = jobs[start : start + batch_size]
+        color_names = {
+            item_id: _get_item_color_names(seed)
+            for _, item_id, seed, action in batch
+            if action == FULL
+        }
+        with instrumentation.stage("title_batch", instrumentation.API):
+            titles = generate_names(
+                list(color_names.values()),
+                backend=backend,
+                name_set=name_set,
+                cache=cache,
+                return_exceptions=True,
+            )
+        item_titles = {}
+        for item_id, title in zip(color_names, titles):
+            if isinstance(title, Exception):
+                # Only the message goes along (it may be sent to a worker).
+                lines = traceback.format_exception(
+                    type(title), title, title.__traceback__
+                )
+                title = _NamingError("".join(lines))
+            item_titles[item_id] = title
+        for job in batch:
+            yield (*job, item_titles.get(job[1]))
+
+
+class _NamingError(Exception):
+    """The title of an item couldn't be generated (raised by the item)."""
+
+
+def _check_title(title: Optional[str]):
+    if isinstance(title, _NamingError):
+        raise title
+
+
+def _get_item_color_names(seed: int) -> Tuple[str, str]:
+    """The names of the colors of a new item (as _new_art_code picks them)."""
+    rng = random.Random(seed)
+    start_color = generate_starting_color(rng)
+    end_color = generate_end_color(start_color, rng)
+    color_name_mapper = get_color_name_mapper()
+    return (
+        color_name_mapper.get(start_color).name,
+        color_name_mapper.get(end_color).name,
+    )
 
-    # Generate the actual artwork.
-    start_color = generate_starting_color()
-    end_color = generate_end_color(start_color)
-    code = generate_art_code(start_color, end_color)
-    image = generate_art_from_code(code, item_art_path)
 
-    # Generate the meta-data.
+def _generate_item(
+    options: CollectionOptions,
+    item_id: int,
+    seed: int,
+    action: str,
+    title: str = None,
+    wait=True,
+):
+    """
+    Generate one item (or just its preview), returning its manifest record, its
+    new meta-data (if any) and instrumentation events. If it fails, the traceback
+    is returned (rather than raised) so that a single bad item doesn't stop the
+    rest of the batch.
+
+    Without wait, the record is a _PendingRecord of files still being written.
+    """
+    if not options.instrument:
+        result = _generate_item_outputs(options, item_id, seed, action, title, wait)
+        return (*result, [])
+
+    with instrumentation.capture() as events:
+        with instrumentation.item(item_id):
+            result = _generate_item_outputs(
+                options, item_id, seed, action, title, wait
+            )
+    return (*result, events)
+
+
+def _generate_item_outputs(
+    options: CollectionOptions,
+    item_id: int,
+    seed: int,
+    action: str,
+    title: str,
+    wait: bool,
+):
+    try:
+        _check_title(title)
+        new_metadata = None
+        render_cache = get_render_cache(options.render_cache_path)
+        writer = options.output_writer()
+        if action == PREVIEW:
+            metadata = regenerate_preview(
+                options.collection_id,
+                options.collection_path,
+                item_id,
+                options.metadata_mode,
+                render_cache,
+                writer,
+                _get_metadata_store(options),
+            )
+        else:
+            metadata = generate_single_artwork(
+                options.collection_id,
+                options.collection_path,
+                item_id,
+                options.use_ai,
+                seed,
+                options.title_cache_path,
+                options.metadata_mode,
+                render_cache,
+                writer,
+                title,
+            )
+            new_metadata = metadata
+
+        paths = options.item_paths(item_id)
+        writes = {kind: writer.take(path) for kind, path in paths.items()}
+        record = _PendingRecord(item_id, seed, metadata.code, paths, writes)
+        if wait:
+            record = record.wait()
+        return record, new_metadata, None
+    except Exception:
+        return None, None, traceback.format_exc()
+
+
+_metadata_stores: Dict[str, MetadataStore] = {}
+
+
+def _get_metadata_store(options: CollectionOptions) -> Optional[MetadataStore]:
+    """
+    The collection's MetadataStore (if it has one), read once per process rather
+    than for every item whose preview is redone.
+    """
+    if options.metadata_mode == METADATA_FILES:
+        return None
+    store = _metadata_stores.get(options.collection_path)
+    if store is None:
+        store = MetadataStore(options.collection_path)
+        _metadata_stores[options.collection_path] = store
+    return store
+
+
+class _PendingRecord:
+    """The manifest record of an item whose files may still be being written."""
+
+    def __init__(self, item_id: int, seed: int, code: str, paths: dict, writes: dict):
+        self.item_id = item_id
+        self.seed = seed
+        self.code = code
+        self.paths = paths
+        self.writes = writes
+
+    def wait(self) -> dict:
+        """
+        Wait for the files to be written (raising if any failed), emitting a
+        stage event for each, and return the record.
+        """
+        file_hashes = {}
+        for kind, path in self.paths.items():
+            future = self.writes.get(kind)
+            if future is None:
+                # Not rewritten (e.g. the art when only the preview is redone).
+                file_hashes[kind] = hash_file(path)
+                continue
+
+            file_hash, n_bytes, duration = future.result()
+            instrumentation.emit(
+                "stage",
+                stage=f"write_{kind}",
+                kind=instrumentation.IO,
+                duration=duration,
+                bytes=n_bytes,
+            )
+            file_hashes[kind] = file_hash
+
+        return new_item_record(
+            self.item_id, self.seed, self.code, file_hashes, PREVIEW_VERSION
+        )
+
+
+def _record_items(
+    item_ids, results, manifest: CollectionManifest, store: MetadataStore = None
+):
+    """
+    Record each finished item in the manifest (and the metadata store), and
+    yield its (item_id, error).
+    """
+    for item_id, (record, metadata, error, events) in zip(item_ids, results):
+        for event in events:
+            instrumentation.dispatch(event)
+
+        if isinstance(record, _PendingRecord):
+            try:
+                with instrumentation.item(item_id):
+                    record = record.wait()
+            except Exception:
+                record, error = None, traceback.format_exc()
+
+        if error is None:
+            # The store has a single writer (this process), so it's written here
+            # rather than in the workers.
+            if store is not None and metadata is not None:
+                store.append(metadata)
+            manifest.add_item(record)
+            instrumentation.emit("item_done", item_id=item_id)
+        else:
+            instrumentation.emit("item_failed", item_id=item_id, error=error)
+        yield item_id, error
+
+
+def _report_items(
+    item_ids, results, manifest: CollectionManifest, store: MetadataStore = None
+) -> List[int]:
+    records = _record_items(item_ids, results, manifest, store)
+    return report_items(records, "Generated", total=len(item_ids))
+
+
+def _worker_died(e: Exception):
+    return None, None, repr(e), []
+
+
+class _PipelineItem:
+    """An item on its way through the stages of the pipeline."""
+
+    def __init__(
+        self,
+        options: CollectionOptions,
+        item_id: int,
+        seed: int,
+        action: str,
+        title: str = None,
+    ) -> None:
+        self.options = options
+        self.item_id = item_id
+        self.seed = seed
+        self.action = action
+        self.title = title
+        self.paths = options.item_paths(item_id)
+        self.events = []
+        self.n_bytes = 0
+
+        self.colors = None
+        self.code = None
+        self.rendered = None
+        self.metadata = None
+        self.new_metadata = None
+        self.record = None
+
+
+class _CollectionPipeline:
+    """
+    The items of a collection run through a Pipeline of stages: the art code,
+    the render (on render_threads threads), the name, then the files.
+    """
+
+    def __init__(
+        self, render_threads: int, write_threads: int, memory_budget: int = None
+    ) -> None:
+        self.budget = None
+        if memory_budget is not None:
+            # Each render thread needs its buffers, and room for a couple of items.
+            per_thread = RENDER_BUFFER_BYTES + 2 * _estimate_item_bytes(512)
+            render_threads = max(1, min(render_threads, memory_budget // per_thread))
+            item_bytes = memory_budget - render_threads * RENDER_BUFFER_BYTES
+            self.budget = MemoryBudget(max(0, item_bytes))
+
+        stages = [
+            Stage("codes", self.new_code),
+            Stage("render", self.render, threads=render_threads),
+            Stage("name", self.name),
+            Stage("write", self.write, threads=max(1, write_threads)),
+        ]
+        self.pipeline = Pipeline(stages, on_exit=self.on_exit)
+
+    def run(self, jobs):
+        """Yield the results of the jobs (as _generate_item does), in order."""
+        items = (_PipelineItem(*job) for job in jobs)
+        for item, error in self.pipeline.run(items):
+            yield item.record, item.new_metadata, error, item.events
+
+    def report(self) -> str:
+        lines = ["Pipeline stages:", self.pipeline.report()]
+        if self.budget is not None:
+            lines.append(
+                f"  memory budget: peak {self.budget.peak / 2 ** 20:.0f}MB of "
+                f"{self.budget.max_bytes / 2 ** 20:.0f}MB for items"
+            )
+        return "\n".join(lines)
+
+    def new_code(self, item: _PipelineItem) -> _PipelineItem:
+        _check_title(item.title)
+        if item.action == FULL:
+            with _in_item(item):
+                rng = random.Random(item.seed)
+                start_color, end_color, item.code = _new_art_code(rng)
+                item.colors = (start_color, end_color)
+        return item
+
+    def render(self, item: _PipelineItem) -> _PipelineItem:
+        if item.action == FULL:
+            if self.budget is not None:
+                n_bytes = _estimate_item_bytes(Artwork.deserialize(item.code).size)
+                self.budget.acquire(n_bytes)
+                item.n_bytes = n_bytes
+            with _in_item(item):
+                render_cache = get_render_cache(item.options.render_cache_path)
+                writer = item.options.output_writer()
+                # The render threads reuse their canvas for every item.
+                item.rendered = _render_art(
+                    item.code,
+                    render_cache,
+                    writer,
+                    item.paths,
+                    buffers=get_render_buffers(),
+                )
+        return item
+
+    def name(self, item: _PipelineItem) -> _PipelineItem:
+        if item.action == FULL:
+            with _in_item(item):
+                item.metadata = _name_art(
+                    item.item_id,
+                    item.code,
+                    *item.colors,
+                    item.options.use_ai,
+                    item.options.title_cache_path,
+                    item.title,
+                )
+        return item
+
+    def write(self, item: _PipelineItem) -> _PipelineItem:
+        options = item.options
+        writer = options.output_writer()
+        with _in_item(item):
+            if item.action == PREVIEW:
+                item.metadata = regenerate_preview(
+                    options.collection_id,
+                    options.collection_path,
+                    item.item_id,
+                    options.metadata_mode,
+                    get_render_cache(options.render_cache_path),
+                    writer,
+                    _get_metadata_store(options),
+                )
+            else:
+                _write_item_meta(item.metadata, item.rendered, writer, item.paths)
+                item.new_metadata = item.metadata
+
+            writes = {kind: writer.take(path) for kind, path in item.paths.items()}
+            record = _PendingRecord(
+                item.item_id, item.seed, item.metadata.code, item.paths, writes
+            )
+            item.record = record.wait()
+        return item
+
+    def on_exit(self, item: _PipelineItem):
+        # The item is done with its renders (or failed), so its memory is free.
+        item.rendered = None
+        if self.budget is not None and item.n_bytes:
+            self.budget.release(item.n_bytes)
+
+
+@contextmanager
+def _in_item(item: _PipelineItem):
+    """Run a stage of an item, capturing its events (if instrumented)."""
+    if not item.options.instrument:
+        yield
+        return
+
+    with instrumentation.capture() as events:
+        with instrumentation.item(item.item_id):
+            try:
+                yield
+            finally:
+                item.events.extend(events)
+
+
+def _estimate_item_bytes(art_size: int) -> int:
+    """
+    Roughly the memory an item holds from its render until its files are
+    written: the raw renders, the decoded art and the preview card (which is
+    about 6 times the size of the art in it).
+    """
+    return 3 * (2 * art_size ** 2 + 7 * PREVIEW_IMAGE_SIZE ** 2)
+
+
+def generate_single_artwork(
+    collection_id: str,
+    collection_path: str,
+    item_id: int,
+    use_ai: bool = True,
+    seed: int = None,
+    title_cache_path: str = None,
+    metadata_mode: str = METADATA_FILES,
+    render_cache: RenderCache = None,
+    writer: OutputWriter = None,
+    title: str = None,
+) -> ArtworkMetadata:
+    """
+    Generate the art, meta-data and preview of an item. The meta-data is only
+    written to a file if metadata_mode asks for files; it is up to the caller to
+    add the returned meta-data to the collection's MetadataStore.
+
+    If the title (e.g. from a batch, see _name_jobs) is given, it is used rather
+    than asking for one.
+
+    The art is rendered through the render_cache (by default, the process's).
+    The files are written by the writer, if there is one, in which case they may
+    still be being written when this returns (see OutputWriter.take).
+    """
+    render_cache = render_cache or get_render_cache()
+    writer = writer or OutputWriter(threads=0)
+
+    rng = random.Random(seed) if seed is not None else None
+
+    paths = get_item_paths(collection_id, collection_path, item_id)
+    if metadata_mode == METADATA_STREAM:
+        del paths["meta"]
+
+    start_color, end_color, code = _new_art_code(rng)
+    rendered = _render_art(code, render_cache, writer, paths)
+    metadata = _name_art(
+        item_id, code, start_color, end_color, use_ai, title_cache_path, title
+    )
+    _write_item_meta(metadata, rendered, writer, paths)
+    return metadata
+
+
+def _new_art_code(rng: random.Random = None):
+    """The colors and art code of a new item."""
+    with instrumentation.stage("art_code", instrumentation.CPU):
+        start_color = generate_starting_color(rng)
+        end_color = generate_end_color(start_color, rng)
+        code = generate_art_code(start_color, end_color, rng)
+    return start_color, end_color, code
+
+
+def _render_art(
+    code: str,
+    render_cache: RenderCache,
+    writer: OutputWriter,
+    paths: dict,
+    buffers: RenderBuffers = None,
+) -> dict:
+    """
+    Render the art (and its preview size), and start writing the art file.
+    Returns the renders, as render_cache.render does.
+
+    A new code is only rendered once, so its renders are kept out of the
+    (process wide) memory cache, where they would only evict the ones that
+    get used again and hold the memory for nothing.
+    """
+    with instrumentation.stage("render", instrumentation.CPU):
+        art_size = Artwork.deserialize(code).size
+        outputs = [(art_size, RAW), (PREVIEW_IMAGE_SIZE, RAW)]
+        rendered = render_cache.render(
+            code, outputs, keep_in_memory=False, buffers=buffers
+        )
+    writer.write_image(decode(rendered[(art_size, RAW)], art_size, RAW), paths["art"])
+    return rendered
+
+
+def _name_art(
+    item_id: int,
+    code: str,
+    start_color,
+    end_color,
+    use_ai: bool,
+    title_cache_path: str = None,
+    title: str = None,
+) -> ArtworkMetadata:
+    """The meta-data of an item: its color names and title (unless given)."""
     metadata = ArtworkMetadata()
-    metadata.start_color_name = COLOR_NAME_MAPPER.get(start_color).name
-    metadata.end_color_name = COLOR_NAME_MAPPER.get(end_color).name
+    with instrumentation.stage("color_name", instrumentation.CPU):
+        color_name_mapper = get_color_name_mapper()
+        metadata.start_color_name = color_name_mapper.get(start_color).name
+        metadata.end_color_name = color_name_mapper.get(end_color).name
     metadata.title = "Untitled 404"
-    metadata.item_id = item_id_str
+    metadata.item_id = str(item_id).zfill(3)
     metadata.code = code
 
-    # Generate the name
-    if use_ai:
-        title = generate_name_with_retry(
-            metadata.start_color_name, metadata.end_color_name
-        )
-    else:
-        title = "Untitled"
+    # Generate the name (unless it was named in a batch).
+    if title is None:
+        with instrumentation.stage("title", instrumentation.API):
+            if use_ai and title_cache_path is not None:
+                title = generate_name_with_retry(
+                    metadata.start_color_name,
+                    metadata.end_color_name,
+                    cache=get_title_cache(title_cache_path),
+                )
+            elif use_ai:
+                title = generate_name_with_retry(
+                    metadata.start_color_name, metadata.end_color_name
+                )
+            else:
+                title = "Untitled"
     metadata.title = title.upper()
+    return metadata
 
-    # Save the meta-data.
-    metadata_file_path = os.path.join(meta_path, f"{item_id_str}.json")
-    with open(metadata_file_path, "w") as f:
-        json.dump(metadata.serialize(), f, indent=4)
+
+def _write_item_meta(
+    metadata: ArtworkMetadata, rendered: dict, writer: OutputWriter, paths: dict
+):
+    """Write the meta-data (if it has a file) and the preview of an item."""
+    if "meta" in paths:
+        meta_json = json.dumps(metadata.serialize(), indent=4)
+        writer.write_bytes(meta_json.encode("utf-8"), paths["meta"])
 
     # Save meta-data preview as well.
-    preview = generate_preview_image(image, metadata)
-    item_preview_path = os.path.join(preview_path, f"{item_name}_preview.png")
-    preview.save(item_preview_path)
+    with instrumentation.stage("preview", instrumentation.CPU):
+        image = decode(rendered[(PREVIEW_IMAGE_SIZE, RAW)], PREVIEW_IMAGE_SIZE, RAW)
+        preview = generate_preview_image(image, metadata)
+    writer.write_image(preview, paths["preview"])
+
+
+def regenerate_preview(
+    collection_id: str,
+    collection_path: str,
+    item_id: int,
+    metadata_mode: str = METADATA_FILES,
+    render_cache: RenderCache = None,
+    writer: OutputWriter = None,
+    store: MetadataStore = None,
+) -> ArtworkMetadata:
+    """
+    Redo the preview of an item from its saved art and meta-data (read from the
+    collection's store, if given, when the meta-data isn't in files).
+    """
+    writer = writer or OutputWriter(threads=0)
+    paths = get_item_paths(collection_id, collection_path, item_id)
+
+    if metadata_mode == METADATA_FILES:
+        with open(paths["meta"], "r") as f:
+            metadata = ArtworkMetadata.deserialize(json.load(f))
+    else:
+        store = store or MetadataStore(collection_path)
+        metadata = store.get(str(item_id).zfill(3))
+
+    with instrumentation.stage("preview", instrumentation.CPU):
+        with Image.open(paths["art"]) as image:
+            preview = generate_preview_image(
+                image.convert("RGB"), metadata, render_cache
+            )
+    writer.write_image(preview, paths["preview"])
+    return metadata
 
 
-def generate_preview_image(image: Image, metadata: ArtworkMetadata):
+def generate_preview_image(
+    image: Image, metadata: ArtworkMetadata, render_cache: RenderCache = None
+):
+    """
+    The preview card of an item, with its art (the image, which must be the art
+    of metadata.code) and meta-data. If the image isn't at the preview size, a
+    preview size render of the code along with the image's size (which is the
+    same as resizing the image) is taken from the render_cache (by default, the
+    process's), if one is cached.
+    """
 
     card_width = 512
     card_padding = 64
@@ -90,23 +842,29 @@ def generate_preview_image(image: Image, metadata: ArtworkMetadata):
     text_id_color = (150, 150, 180)
     text_meta_data_color = (120, 120, 140)
     text_code_color = (190, 190, 210)
-    font_name = "font/RobotoMono-Regular.ttf"
-    font_bold_name = "font/RobotoMono-Bold.ttf"
+    font_name = os.path.join(FONT_PATH, "RobotoMono-Regular.ttf")
+    font_bold_name = os.path.join(FONT_PATH, "RobotoMono-Bold.ttf")
 
-    im_size = 256
+    im_size = PREVIEW_IMAGE_SIZE
 
     preview_width = 3 * card_padding + card_width + im_size
     preview_height = 2 * card_padding + im_size
     preview = Image.new("RGB", (preview_width, preview_height), color=preview_color)
 
-    # Add the original image.
-    image_resized = image.resize((im_size, im_size), resample=Image.ANTIALIAS)
-    preview.paste(image_resized, (card_padding, card_padding))
+    # Add the original image (unless it was already rendered at the preview size).
+    if image.size != (im_size, im_size):
+        render_cache = render_cache or get_render_cache()
+        cached = render_cache.get(metadata.code, im_size, RAW, image.size[0])
+        if cached is not None:
+            image = decode(cached, im_size, RAW)
+        else:
+            image = image.resize((im_size, im_size), resample=Image.ANTIALIAS)
+    preview.paste(image, (card_padding, card_padding))
 
     # Draw meta-data.
-    font = ImageFont.truetype(font_name, 24)
-    color_font = ImageFont.truetype(font_name, 16)
-    code_font = ImageFont.truetype(font_bold_name, 14)
+    font = get_font(font_name, 24)
+    color_font = get_font(font_name, 16)
+    code_font = get_font(font_bold_name, 14)
     draw = ImageDraw.Draw(preview)
 
     tx = 2 * card_padding + im_size
@@ -121,7 +879,7 @@ def generate_preview_image(image: Image, metadata: ArtworkMetadata):
     title_font_size = get_best_font_size(
         font_name, metadata.title, card_width, max_size=24
     )
-    title_font = ImageFont.truetype(font_name, title_font_size)
+    title_font = get_font(font_name, title_font_size)
     _, title_height = title_font.getsize(metadata.title)
     draw.text((tx, ty), metadata.title, fill=(10, 10, 15), font=title_font)
     ty += title_height + 8
@@ -133,18 +891,8 @@ def generate_preview_image(image: Image, metadata: ArtworkMetadata):
     draw.text((tx, ty), color_text, fill=text_meta_data_color, font=color_font)
 
     # Art Code
-    code_char_w, code_char_h = code_font.getsize("A")
-    max_code_chars = card_width // code_char_w
-    code_text_arr = []
-    code_pointer = max_code_chars
-    previous_pointer = 0
-
-    for _ in range(1 + len(metadata.code) // code_pointer):
-        code_part = metadata.code[previous_pointer:code_pointer]
-        code_text_arr.append(code_part)
-        previous_pointer = code_pointer
-        code_pointer += max_code_chars
-
+    code_char_w, code_char_h = get_char_size(font_bold_name, 14)
+    code_text_arr = wrap_code(metadata.code, card_width // code_char_w)
     code_text = "\n".join(code_text_arr)
     code_height = code_char_h * (len(code_text_arr) + 1)
     ty = preview_height - card_padding - code_height
@@ -153,6 +901,48 @@ def generate_preview_image(image: Image, metadata: ArtworkMetadata):
     return preview
 
 
+@lru_cache(maxsize=None)
+def get_color_name_mapper():
+    """
+    The color table is loaded (and numpy imported) on first use rather than on
+    import, from its binary cache if it has one. If the lookup table has been
+    built (see cmd_build_color_table), it is memory-mapped too.
+    """
+    from color_name import (
+        DEFAULT_CACHE_PATH,
+        DEFAULT_COLOR_MAP,
+        DEFAULT_TABLE_PATH,
+        ColorNameMapper,
+        is_fresh,
+    )
+
+    table_path = None
+    if is_fresh(DEFAULT_TABLE_PATH, DEFAULT_COLOR_MAP):
+        table_path = DEFAULT_TABLE_PATH
+    return ColorNameMapper(cache_path=DEFAULT_CACHE_PATH, table_path=table_path)
+
+
+@lru_cache(maxsize=None)
+def get_font(font_name: str, size: int) -> ImageFont.FreeTypeFont:
+    """Fonts are loaded once per process and (path, size)."""
+    return ImageFont.truetype(font_name, size)
+
+
+@lru_cache(maxsize=None)
+def get_char_size(font_name: str, size: int) -> Tuple[int, int]:
+    """The size of a character of a (monospaced) font, measured once."""
+    return get_font(font_name, size).getsize("A")
+
+
+def wrap_code(code: str, max_chars: int) -> List[str]:
+    """An art code cut into lines of max_chars (the code has no spaces to wrap at)."""
+    return [
+        code[start : start + max_chars]
+        for start in range(0, max_chars * (1 + len(code) // max_chars), max_chars)
+    ]
+
+
+@lru_cache(maxsize=4096)
 def get_best_font_size(font, word: str, screen_width: int, max_size: int) -> int:
 
     # Pick the one that minimizes the delta.
@@ -166,7 +956,7 @@ def get_best_font_size(font, word: str, screen_width: int, max_size: int) -> int
     while (upper - 1) > lower:
 
         mid = (lower + upper) // 2
-        test_font = ImageFont.truetype(font, mid)
+        test_font = get_font(font, mid)
         max_line_length, _ = test_font.getsize(word)
         delta = max_line_length - screen_width
 
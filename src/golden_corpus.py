@@ -0,0 +1,166 @@
+"""
+A golden corpus: a fixed set of art codes with the hashes of their renders, to
+check that a change to the renderer (or the colors, or the resizing) doesn't
+change a single pixel of art that's already out there.
+
+The corpus lives in golden/corpus.json, with a reference image of each render
+(in golden/ too), which a mismatched render is diffed against.
+"""
+
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, Tuple
+
+from PIL import Image, ImageChops
+
+from generate_art import generate_art_images
+from output_writer import write_atomic
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS_PATH = os.path.join(REPO_PATH, "golden", "corpus.json")
+
+
+class Mismatch:
+    """A render that isn't the same as its golden image, and by how much."""
+
+    def __init__(
+        self,
+        name: str,
+        size: int,
+        max_error: Tuple[int, ...] = None,
+        n_pixels: int = None,
+        diff_path: str = None,
+    ) -> None:
+        self.name = name
+        self.size = size
+        self.max_error = max_error
+        self.n_pixels = n_pixels
+        self.diff_path = diff_path
+
+    def __str__(self) -> str:
+        if self.max_error is None:
+            return f"{self.name} at {self.size}px: changed (no reference image)"
+        return (
+            f"{self.name} at {self.size}px: {self.n_pixels} pixels changed, "
+            f"max error (R, G, B) {self.max_error}, diff in {self.diff_path}"
+        )
+
+
+def load_corpus(corpus_path: str = DEFAULT_CORPUS_PATH) -> List[dict]:
+    """
+    The entries of the corpus: each has a name, an art code and its outputs,
+    a {"sha256": ..., "image": ...} per size (the image relative to the repo).
+    All the sizes of an entry are rendered together, as a collection does.
+    """
+    with open(corpus_path, "r") as f:
+        return json.load(f)["entries"]
+
+
+def check_corpus(
+    corpus_path: str = DEFAULT_CORPUS_PATH,
+    output_path: str = "golden_output",
+    workers: int = 1,
+) -> Tuple[int, List[Mismatch]]:
+    """
+    Render every entry of the corpus (on workers processes) and compare it with
+    its hashes. Returns how many renders were checked and the mismatches, whose
+    render and diff image are written to output_path.
+    """
+    entries = load_corpus(corpus_path)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(check_entry, entries, repeat(output_path)))
+    else:
+        results = [check_entry(entry, output_path) for entry in entries]
+
+    n_checked = sum(len(entry["outputs"]) for entry in entries)
+    mismatches = [mismatch for result in results for mismatch in result]
+    return n_checked, mismatches
+
+
+def check_entry(entry: dict, output_path: str) -> List[Mismatch]:
+    images = render_entry(entry)
+    mismatches = []
+    for size_str, output in entry["outputs"].items():
+        image = images[int(size_str)]
+        if hash_image(image) != output["sha256"]:
+            mismatches.append(_diff(entry["name"], image, output, output_path))
+    return mismatches
+
+
+def update_corpus(corpus_path: str = DEFAULT_CORPUS_PATH) -> List[str]:
+    """
+    Render the corpus again and record its hashes and reference images, after
+    a change that is meant to change the art. Returns the renders that changed.
+
+    The new reference images are written next to the corpus (never over other
+    images the corpus points at, such as the README's), each atomically.
+    """
+    with open(corpus_path, "r") as f:
+        corpus = json.load(f)
+    golden_path = os.path.dirname(os.path.abspath(corpus_path))
+
+    changed = []
+    for entry in corpus["entries"]:
+        images = render_entry(entry)
+        for size_str, output in entry["outputs"].items():
+            image = images[int(size_str)]
+            image_hash = hash_image(image)
+            if image_hash == output.get("sha256"):
+                continue
+
+            output["sha256"] = image_hash
+            changed.append(f"{entry['name']} at {size_str}px")
+            image_path = os.path.join(golden_path, f"{entry['name']}_{size_str}.png")
+            output["image"] = os.path.relpath(image_path, REPO_PATH)
+            if not _has_pixels(image_path, image_hash):
+                png = io.BytesIO()
+                image.save(png, format="PNG", optimize=True)
+                write_atomic(image_path, png.getvalue())
+
+    write_atomic(corpus_path, (json.dumps(corpus, indent=2) + "\n").encode("utf-8"))
+    return changed
+
+
+def render_entry(entry: dict) -> Dict[int, Image.Image]:
+    sizes = [int(size_str) for size_str in entry["outputs"]]
+    return generate_art_images(entry["code"], sizes)
+
+
+def hash_image(image: Image.Image) -> str:
+    """The hash of the pixels (rather than of an encoding of them)."""
+    return hashlib.sha256(image.convert("RGB").tobytes()).hexdigest()
+
+
+def _has_pixels(image_path: str, image_hash: str) -> bool:
+    if not os.path.isfile(image_path):
+        return False
+    with Image.open(image_path) as image:
+        return hash_image(image) == image_hash
+
+
+def _diff(name: str, image: Image.Image, output: dict, output_path: str) -> Mismatch:
+    size = image.size[0]
+    os.makedirs(output_path, exist_ok=True)
+    image.save(os.path.join(output_path, f"{name}_{size}_actual.png"))
+
+    reference_path = os.path.join(REPO_PATH, output.get("image", ""))
+    if not os.path.isfile(reference_path):
+        return Mismatch(name, size)
+
+    with Image.open(reference_path) as reference:
+        difference = ImageChops.difference(image, reference.convert("RGB"))
+    max_error = tuple(band_max for _, band_max in difference.getextrema())
+    red, green, blue = difference.split()
+    largest = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+    n_pixels = sum(largest.histogram()[1:])
+
+    # Scale the difference up so that the largest error is white.
+    scale = 255 / max(max(max_error), 1)
+    diff_path = os.path.join(output_path, f"{name}_{size}_diff.png")
+    difference.point(lambda v: min(255, round(v * scale))).save(diff_path)
+    return Mismatch(name, size, max_error, n_pixels, diff_path)
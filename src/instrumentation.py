@@ -0,0 +1,221 @@
+"""
+Structured events about what the generation is doing (and how long it takes).
+
+Nothing is recorded unless a sink has been added, so the hooks cost next to
+nothing when instrumentation is disabled.
+"""
+
+import contextlib
+import json
+import os
+import sys
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List
+
+# Where the time goes in each stage.
+CPU = "cpu"
+IO = "io"
+API = "api"
+
+Sink = Callable[[dict], None]
+
+_sinks: List[Sink] = []
+_current_item: ContextVar = ContextVar("current_item", default=None)
+_current_stage: ContextVar = ContextVar("current_stage", default=None)
+_captured: ContextVar = ContextVar("captured", default=None)
+
+
+def add_sink(sink: Sink):
+    _sinks.append(sink)
+
+
+def remove_sink(sink: Sink):
+    _sinks.remove(sink)
+
+
+def is_enabled() -> bool:
+    return len(_sinks) > 0 or _captured.get() is not None
+
+
+def emit(event: str, **fields):
+    """Send an event (tagged with the current item, if any) to every sink."""
+    if not is_enabled():
+        return
+
+    record = {"event": event, "time": time.time()}
+    item_id = _current_item.get()
+    if item_id is not None:
+        record["item_id"] = item_id
+    record.update(fields)
+
+    captured = _captured.get()
+    if captured is not None:
+        captured.append(record)
+    else:
+        dispatch(record)
+
+
+def dispatch(record: dict):
+    for sink in _sinks:
+        sink(record)
+
+
+@contextlib.contextmanager
+def item(item_id):
+    """Tag every event inside this block with the item id."""
+    token = _current_item.set(item_id)
+    try:
+        yield
+    finally:
+        _current_item.reset(token)
+
+
+@contextlib.contextmanager
+def stage(name: str, kind: str):
+    """
+    Time a stage of the current item, and emit it as a "stage" event along with
+    anything added to it (e.g. bytes written, retries) with add_to_stage, the
+    memory (RSS) of the process once it is done, and how much that grew during
+    the stage (which, if other threads are busy, includes what they allocate).
+    """
+    if not is_enabled():
+        yield
+        return
+
+    fields = {}
+    token = _current_stage.set(fields)
+    start_rss = current_rss()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        _current_stage.reset(token)
+        rss = current_rss()
+        emit(
+            "stage",
+            stage=name,
+            kind=kind,
+            duration=duration,
+            rss=rss,
+            rss_growth=max(0, rss - start_rss),
+            **fields,
+        )
+
+
+def add_to_stage(key: str, value: int = 1):
+    """Add to a counter of the stage that is running, if it's being recorded."""
+    fields = _current_stage.get()
+    if fields is not None:
+        fields[key] = fields.get(key, 0) + value
+
+
+@contextlib.contextmanager
+def capture():
+    """
+    Collect the events of this block (in this thread) into a list instead of
+    sending them to the sinks. This is how worker processes and threads send
+    their events back to the main thread, which dispatches them in item order.
+    """
+    events = []
+    token = _captured.set(events)
+    try:
+        yield events
+    finally:
+        _captured.reset(token)
+
+
+def current_rss() -> int:
+    """
+    The memory (resident set size) of this process in bytes, or its peak so far
+    where the current size can't be read (anywhere but Linux).
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # The peak is in bytes on macOS, and in kilobytes elsewhere.
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class JsonlSink:
+    """Appends every event as a line of JSON."""
+
+    def __init__(self, path: str) -> None:
+        self.file = open(path, "a")
+
+    def __call__(self, record: dict):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SummarySink:
+    """Adds up the stage events, for a summary at the end of the run."""
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, dict] = {}
+        self.n_items = 0
+        self.n_failed = 0
+        self.peak_rss = 0
+        self.start = time.time()
+
+    def __call__(self, record: dict):
+        if record["event"] == "stage":
+            totals = self.stages.setdefault(
+                record["stage"],
+                {"kind": record["kind"], "count": 0, "duration": 0.0},
+            )
+            totals["count"] += 1
+            totals["duration"] += record["duration"]
+            if "rss" in record:
+                self.peak_rss = max(self.peak_rss, record["rss"])
+            if "rss_growth" in record:
+                totals["max_rss_growth"] = max(
+                    totals.get("max_rss_growth", 0), record["rss_growth"]
+                )
+            for key in ["bytes", "retries"]:
+                if key in record:
+                    totals[key] = totals.get(key, 0) + record[key]
+        elif record["event"] == "item_done":
+            self.n_items += 1
+        elif record["event"] == "item_failed":
+            self.n_failed += 1
+
+    def summary(self) -> str:
+        elapsed = time.time() - self.start
+        lines = [f"{self.n_items} items ({self.n_failed} failed) in {elapsed:.1f}s"]
+
+        kind_durations = {}
+        for name, totals in self.stages.items():
+            kind = totals["kind"]
+            kind_durations[kind] = kind_durations.get(kind, 0) + totals["duration"]
+            extra = "".join(
+                f", {totals[key]} {key}"
+                for key in ["bytes", "retries"]
+                if key in totals
+            )
+            if "max_rss_growth" in totals:
+                growth_mb = totals["max_rss_growth"] / 2 ** 20
+                extra += f", RSS grew by up to {growth_mb:.0f}MB"
+            lines.append(
+                f"  {name} ({kind}): {totals['duration']:.2f}s "
+                f"over {totals['count']}{extra}"
+            )
+
+        total = sum(kind_durations.values())
+        if total > 0:
+            shares = ", ".join(
+                f"{kind} {100 * duration / total:.0f}%"
+                for kind, duration in sorted(kind_durations.items())
+            )
+            lines.append(f"Time spent: {shares}")
+        if self.peak_rss:
+            lines.append(f"Peak RSS of the process: {self.peak_rss / 2 ** 20:.0f}MB")
+        return "\n".join(lines)
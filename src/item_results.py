@@ -0,0 +1,54 @@
+"""
+Running the items of a collection (generating or re-rendering them) one after
+another or on worker processes, and reporting how each went.
+"""
+
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def look_ahead(results: Iterable[T], n: int = 1) -> Iterator[T]:
+    """
+    Yield each result only once the n results after it have been generated
+    (e.g. keep n more futures submitted than have been waited for).
+    """
+    pending = deque()
+    for result in results:
+        pending.append(result)
+        if len(pending) > n:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+
+def future_result(future: Future, on_error: Callable[[Exception], T]) -> T:
+    """
+    The result of an item's future. The items catch their own errors, so if it
+    raises, the worker process itself died (e.g. BrokenProcessPool), and the
+    result is on_error of that exception instead.
+    """
+    try:
+        return future.result()
+    except Exception as e:
+        return on_error(e)
+
+
+def report_items(
+    results: Iterable[Tuple[str, Optional[str]]], verb: str, total: int = None
+) -> List[str]:
+    """
+    Print how each (item_id, error) went, as it comes, and return the ids of
+    the items that failed.
+    """
+    failed_ids = []
+    for count, (item_id, error) in enumerate(results, start=1):
+        progress = f"[{count}/{total}]" if total is not None else f"[{count}]"
+        if error is None:
+            print(f"{progress} {verb} item {item_id}")
+        else:
+            print(f"{progress} Failed item {item_id}:\n{error}")
+            failed_ids.append(item_id)
+    return failed_ids
@@ -0,0 +1,146 @@
+"""
+The meta-data of a whole collection in a single JSONL file, rather than one
+small JSON file per item.
+"""
+
+import json
+import os
+from typing import Dict, Iterator
+
+from artwork_metadata import ArtworkMetadata
+
+STREAM_FILE_NAME = "metadata.jsonl"
+INDEX_FILE_NAME = "metadata.index"
+
+# How the meta-data of a collection is written.
+METADATA_FILES = "files"
+METADATA_STREAM = "stream"
+METADATA_BOTH = "both"
+
+
+class MetadataStore:
+    """
+    An append-only JSONL file of ArtworkMetadata, with an index of the byte
+    offset of each item's line so that any item can be read with one seek.
+    If an item is written again, the last line wins.
+
+    The index is appended to alongside the data, and is rebuilt by scanning the
+    data if it is missing or behind.
+    """
+
+    def __init__(self, collection_path: str) -> None:
+        self.path = os.path.join(collection_path, STREAM_FILE_NAME)
+        self.index_path = os.path.join(collection_path, INDEX_FILE_NAME)
+        self.offsets: Dict[str, int] = {}
+        self._load_index()
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def append(self, metadata: ArtworkMetadata):
+        line = json.dumps(metadata.serialize()) + "\n"
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(line.encode("utf-8"))
+        with open(self.index_path, "a") as f:
+            f.write(f"{metadata.item_id} {offset}\n")
+        self.offsets[metadata.item_id] = offset
+
+    def get(self, item_id: str) -> ArtworkMetadata:
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets[item_id])
+            return ArtworkMetadata.deserialize(json.loads(f.readline()))
+
+    def __iter__(self) -> Iterator[ArtworkMetadata]:
+        """Every item (its latest line), in item order, one at a time."""
+        with open(self.path, "rb") as f:
+            for item_id in sorted(self.offsets, key=lambda i: (len(i), i)):
+                f.seek(self.offsets[item_id])
+                yield ArtworkMetadata.deserialize(json.loads(f.readline()))
+
+    def _load_index(self):
+        if not os.path.exists(self.path):
+            return
+
+        indexed_end = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2:
+                        self.offsets[parts[0]] = int(parts[1])
+                        indexed_end = max(indexed_end, int(parts[1]))
+
+        # Index whatever was written after the last indexed line (e.g. if a run
+        # died between writing the data and the index).
+        with open(self.path, "rb") as f:
+            f.seek(indexed_end)
+            if self.offsets:
+                f.readline()
+            with open(self.index_path, "a") as index_file:
+                while True:
+                    offset = f.tell()
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    item_id = json.loads(line)["item_id"]
+                    self.offsets[item_id] = offset
+                    index_file.write(f"{item_id} {offset}\n")
+
+
+def read_collection_metadata(collection_path: str) -> Iterator[ArtworkMetadata]:
+    """
+    The meta-data of every item of a collection, in item order, from its
+    metadata.jsonl if it has one, or else from its meta/ files.
+    """
+    if os.path.exists(os.path.join(collection_path, STREAM_FILE_NAME)):
+        yield from MetadataStore(collection_path)
+        return
+
+    for path in iterate_meta_files(os.path.join(collection_path, "meta")):
+        with open(path, "r") as f:
+            yield ArtworkMetadata.deserialize(json.load(f))
+
+
+def iterate_meta_files(meta_path: str) -> Iterator[str]:
+    """The meta-data files of a collection, in item order."""
+    file_names = sorted(
+        entry.name for entry in os.scandir(meta_path) if entry.name.endswith(".json")
+    )
+    for file_name in file_names:
+        yield os.path.join(meta_path, file_name)
+
+
+def export_erc721(
+    metadata_items: Iterator[ArtworkMetadata],
+    collection_id: str,
+    output_path: str,
+    image_base_url: str,
+    description: str = "",
+) -> int:
+    """
+    Write the ERC-721 token meta-data JSON of every item (named by token id,
+    i.e. the item id as a number), returning how many were written.
+    """
+    os.makedirs(output_path, exist_ok=True)
+
+    n_written = 0
+    for metadata in metadata_items:
+        token_id = int(metadata.item_id)
+        token = {
+            "attributes": [
+                {"trait_type": "Start Color", "value": metadata.start_color_name},
+                {"trait_type": "End Color", "value": metadata.end_color_name},
+                {"trait_type": "Code", "value": metadata.code},
+            ],
+            "description": description,
+            "image": f"{image_base_url}/{collection_id}_{metadata.item_id}.png",
+            "name": metadata.title,
+        }
+        with open(os.path.join(output_path, f"{token_id}.json"), "w") as f:
+            json.dump(token, f, indent=2)
+        n_written += 1
+    return n_written
@@ -0,0 +1,136 @@
+"""
+Encoding and writing the output files on background threads, so that the next
+item can be rendered while the last one is still being compressed and written.
+"""
+
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from PIL import Image
+
+# The sha256 of the bytes written, how many there were and how long it took.
+WriteResult = Tuple[str, int, float]
+
+
+class OutputWriter:
+    """
+    Writes files on a pool of threads (or right away, if threads is 0). At most
+    max_queue writes are waiting at once, after which a new write blocks until
+    one is done, so a fast renderer can't fill the memory with images.
+
+    Every file is written to a temporary file and renamed into place, so a
+    partial file never appears. Each folder is only created once.
+    """
+
+    def __init__(
+        self,
+        threads: int = 2,
+        max_queue: int = 8,
+        png_compress_level: int = None,
+        png_optimize: bool = False,
+    ) -> None:
+        self.executor = ThreadPoolExecutor(threads) if threads > 0 else None
+        self.slots = threading.BoundedSemaphore(max_queue)
+        self.png_params = {}
+        if png_compress_level is not None:
+            self.png_params["compress_level"] = png_compress_level
+        if png_optimize:
+            self.png_params["optimize"] = True
+
+        self.pending: Dict[str, Future] = {}
+        self._made_dirs = set()
+        self._dirs_lock = threading.Lock()
+
+    def write_image(self, image: Image.Image, path: str) -> Future:
+        """Encode the image (in the format of the path's extension) and write it."""
+        return self._submit(path, lambda: self.encode_image(image, path))
+
+    def write_bytes(self, data: bytes, path: str) -> Future:
+        return self._submit(path, lambda: data)
+
+    def take(self, path: str) -> Optional[Future]:
+        """The write of this path (if there was one), to wait for its result."""
+        return self.pending.pop(path, None)
+
+    def encode_image(self, image: Image.Image, path: str) -> bytes:
+        image_format = Image.registered_extensions()[os.path.splitext(path)[1]]
+        params = self.png_params if image_format == "PNG" else {}
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, **params)
+        return buffer.getvalue()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _submit(self, path: str, encode: Callable[[], bytes]) -> Future:
+        if self.executor is None:
+            future = Future()
+            try:
+                future.set_result(self._write(path, encode))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            self.slots.acquire()
+            future = self.executor.submit(self._write, path, encode)
+            future.add_done_callback(lambda _: self.slots.release())
+
+        self.pending[path] = future
+        return future
+
+    def _write(self, path: str, encode: Callable[[], bytes]) -> WriteResult:
+        start = time.perf_counter()
+        data = encode()
+        self._make_dir(os.path.dirname(path))
+        write_atomic(path, data)
+        duration = time.perf_counter() - start
+        return hashlib.sha256(data).hexdigest(), len(data), duration
+
+    def _make_dir(self, folder: str):
+        with self._dirs_lock:
+            if folder not in self._made_dirs:
+                os.makedirs(folder, exist_ok=True)
+                self._made_dirs.add(folder)
+
+
+_writers: Dict[tuple, OutputWriter] = {}
+
+
+def get_output_writer(
+    threads: int = 2, png_compress_level: int = None, png_optimize: bool = False
+) -> OutputWriter:
+    """
+    The output writer of this process (one per settings). It's keyed by the
+    process id too, since a forked worker doesn't inherit its parent's threads.
+    """
+    key = (os.getpid(), threads, png_compress_level, png_optimize)
+    writer = _writers.get(key)
+    if writer is None:
+        max_queue = 4 * max(threads, 1)
+        writer = OutputWriter(threads, max_queue, png_compress_level, png_optimize)
+        _writers[key] = writer
+    return writer
+
+
+def write_atomic(path: str, data: bytes):
+    """Write to a temporary file and move it in place, so no one reads half."""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,194 @@
+"""
+A staged producer/consumer pipeline. Every item goes through the stages in
+turn, each stage is run by its own threads, and there is a bounded queue in
+front of every stage, so a slow stage makes the ones before it wait rather than
+letting items pile up in memory.
+"""
+
+import queue
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import instrumentation
+
+# Tells a stage thread that there are no more items.
+_DONE = object()
+
+
+class Stage:
+    """
+    A step of the pipeline: a function of an item (returning the item for the
+    next stage), run by threads threads, with at most queue_size items waiting.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        function: Callable[[Any], Any],
+        threads: int = 1,
+        queue_size: int = None,
+    ) -> None:
+        self.name = name
+        self.function = function
+        self.threads = threads
+        self.queue_size = queue_size or 2 * threads
+
+        self.count = 0
+        self.busy = 0.0
+        self.max_rss_growth = 0
+        self.peak_rss = 0
+        self._lock = threading.Lock()
+
+    def record(self, duration: float, start_rss: int, rss: int):
+        """
+        Count an item the stage is done with, and how much the memory (RSS) of
+        the process grew while it was. The threads share the memory, so that
+        includes whatever the other stages allocated in the meantime: it's only
+        an upper bound of what the stage itself needs per item.
+        """
+        with self._lock:
+            self.count += 1
+            self.busy += duration
+            self.max_rss_growth = max(self.max_rss_growth, rss - start_rss)
+            self.peak_rss = max(self.peak_rss, rss)
+
+
+class MemoryBudget:
+    """
+    A number of bytes shared by the items in flight. An item waits for its share
+    before it goes on, unless no other item holds any (so that an item bigger
+    than the whole budget still gets through, alone).
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.peak = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, n_bytes: int):
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.used == 0 or self.used + n_bytes <= self.max_bytes
+            )
+            self.used += n_bytes
+            self.peak = max(self.peak, self.used)
+
+    def release(self, n_bytes: int):
+        with self._condition:
+            self.used -= n_bytes
+            self._condition.notify_all()
+
+
+class Pipeline:
+    def __init__(
+        self, stages: List[Stage], on_exit: Callable[[Any], None] = None
+    ) -> None:
+        self.stages = stages
+        self.on_exit = on_exit
+
+    def run(self, items: Iterable) -> Iterator[Tuple[Any, Optional[str]]]:
+        """
+        Yield the (result, error) of every item, in the order of the items. If a
+        stage raises, the item skips the stages after it, and its error is the
+        traceback. on_exit is called with every item as it leaves the pipeline
+        (finished or failed), e.g. to give back what it holds.
+
+        If iterating the items raises, the items before it are still yielded,
+        and then the error is raised here.
+        """
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        results: Dict[int, Tuple[Any, Optional[str]]] = {}
+        condition = threading.Condition()
+        n_items = None
+        feed_error: Optional[BaseException] = None
+
+        def run_stage(i: int, stage: Stage):
+            while True:
+                work = queues[i].get()
+                if work is _DONE:
+                    return
+
+                index, value, error = work
+                if error is None:
+                    start_rss = instrumentation.current_rss()
+                    start = time.perf_counter()
+                    try:
+                        value = stage.function(value)
+                    except Exception:
+                        error = traceback.format_exc()
+                    duration = time.perf_counter() - start
+                    stage.record(duration, start_rss, instrumentation.current_rss())
+
+                if error is None and i + 1 < len(self.stages):
+                    queues[i + 1].put((index, value, None))
+                    continue
+
+                if self.on_exit is not None:
+                    self.on_exit(value)
+                with condition:
+                    results[index] = (value, error)
+                    condition.notify_all()
+
+        threads = [
+            [
+                threading.Thread(target=run_stage, args=(i, stage), daemon=True)
+                for _ in range(stage.threads)
+            ]
+            for i, stage in enumerate(self.stages)
+        ]
+        for stage_threads in threads:
+            for thread in stage_threads:
+                thread.start()
+
+        def feed():
+            nonlocal n_items, feed_error
+            count = 0
+            try:
+                for item in items:
+                    queues[0].put((count, item, None))
+                    count += 1
+            except BaseException as e:
+                # Raised in the thread running the pipeline, not lost with this one.
+                feed_error = e
+            finally:
+                # Stop the stages in order, once the ones before them are done.
+                for stage_queue, stage_threads in zip(queues, threads):
+                    for _ in stage_threads:
+                        stage_queue.put(_DONE)
+                    for thread in stage_threads:
+                        thread.join()
+                with condition:
+                    n_items = count
+                    condition.notify_all()
+
+        threading.Thread(target=feed, daemon=True).start()
+
+        next_index = 0
+        while True:
+            with condition:
+                condition.wait_for(
+                    lambda: next_index in results
+                    or (n_items is not None and next_index >= n_items)
+                )
+                if next_index not in results:
+                    if feed_error is not None:
+                        raise feed_error
+                    return
+                result = results.pop(next_index)
+            yield result
+            next_index += 1
+
+    def report(self) -> str:
+        lines = []
+        for stage in self.stages:
+            growth_mb = stage.max_rss_growth / 2 ** 20
+            lines.append(
+                f"  {stage.name} ({stage.threads} threads): {stage.count} items, "
+                f"{stage.busy:.2f}s busy, RSS grew by up to {growth_mb:.0f}MB"
+            )
+        peak_rss = max(stage.peak_rss for stage in self.stages)
+        lines.append(f"  peak RSS of the process: {peak_rss / 2 ** 20:.0f}MB")
+        return "\n".join(lines)
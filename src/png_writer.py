@@ -0,0 +1,171 @@
+"""
+PNG files written a piece at a time (rows of an image, or frames of an
+animation), compressing each piece as it comes, so the whole image (or every
+frame) never has to be held in memory.
+"""
+
+import os
+import struct
+import threading
+import zlib
+
+from PIL import Image
+
+from generate_art import Box
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class PngStreamWriter:
+    """
+    The chunks of an RGB PNG, written to a temporary file which is moved into
+    place once the PNG is complete (and removed if it never is).
+    """
+
+    def __init__(self, path: str, width: int, height: int) -> None:
+        self.path = path
+        self.width = width
+        self.height = height
+
+        self.temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.file = open(self.temp_path, "wb")
+        self.file.write(PNG_SIGNATURE)
+        # 8 bits per channel, RGB, no interlacing.
+        header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+        self.write_chunk(b"IHDR", header)
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            self.finish()
+            self.write_chunk(b"IEND", b"")
+            self.file.close()
+            os.replace(self.temp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def finish(self):
+        """Write whatever is left before the end (and check nothing's missing)."""
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write_chunk(self, chunk_type: bytes, data: bytes):
+        crc = zlib.crc32(chunk_type + data)
+        self.file.write(struct.pack(">I", len(data)) + chunk_type + data)
+        self.file.write(struct.pack(">I", crc))
+
+
+class PngStripWriter(PngStreamWriter):
+    """
+    Writes an RGB PNG of a known size a strip of rows at a time. All the strips
+    are one compressed stream, so only one strip is ever in memory.
+    """
+
+    def __init__(
+        self, path: str, width: int, height: int, compress_level: int = 6
+    ) -> None:
+        super().__init__(path, width, height)
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(compress_level)
+
+    def write(self, strip: Image.Image):
+        if strip.width != self.width:
+            raise ValueError(f"Strip is {strip.width} wide, not {self.width}")
+        if self.rows_written + strip.height > self.height:
+            raise ValueError(f"More than {self.height} rows written")
+
+        data = self.compressor.compress(filter_rows(strip))
+        if data:
+            self.write_chunk(b"IDAT", data)
+        self.rows_written += strip.height
+
+    def finish(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"Only {self.rows_written} of {self.height} rows written")
+        self.write_chunk(b"IDAT", self.compressor.flush())
+
+
+class ApngWriter(PngStreamWriter):
+    """
+    Writes an animated PNG of a known number of frames one frame at a time. Each
+    frame only stores the box that changed since the previous one, drawn over it
+    (the first frame has to be the whole image, and is what viewers without
+    APNG support show).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        width: int,
+        height: int,
+        n_frames: int,
+        loop: int = 0,
+        compress_level: int = 6,
+    ) -> None:
+        super().__init__(path, width, height)
+        self.n_frames = n_frames
+        self.compress_level = compress_level
+        self.frames_written = 0
+        self.sequence_number = 0
+        self.write_chunk(b"acTL", struct.pack(">II", n_frames, loop))
+
+    def write(self, frame: Image.Image, box: Box, duration_ms: int):
+        if self.frames_written == self.n_frames:
+            raise ValueError(f"More than {self.n_frames} frames written")
+        if self.frames_written == 0 and box != (0, 0, self.width, self.height):
+            raise ValueError("The first frame has to be the whole image")
+
+        left, upper, right, lower = box
+        frame_control = struct.pack(
+            ">IIIIIHHBB",
+            self._next_sequence_number(),
+            right - left,
+            lower - upper,
+            left,
+            upper,
+            duration_ms,
+            1000,
+            0,  # Don't dispose of the frame before the next one.
+            0,  # Replace (rather than blend with) what was there.
+        )
+        self.write_chunk(b"fcTL", frame_control)
+
+        data = zlib.compress(filter_rows(frame.crop(box)), self.compress_level)
+        if self.frames_written == 0:
+            self.write_chunk(b"IDAT", data)
+        else:
+            sequence = struct.pack(">I", self._next_sequence_number())
+            self.write_chunk(b"fdAT", sequence + data)
+        self.frames_written += 1
+
+    def finish(self):
+        if self.frames_written != self.n_frames:
+            raise ValueError(
+                f"Only {self.frames_written} of {self.n_frames} frames written"
+            )
+
+    def _next_sequence_number(self) -> int:
+        self.sequence_number += 1
+        return self.sequence_number - 1
+
+
+def filter_rows(image: Image.Image) -> bytes:
+    """The RGB rows of the image, each starting with its filter type (0, none)."""
+    raw = image.convert("RGB").tobytes()
+    row_size = 3 * image.width
+    rows = (raw[start : start + row_size] for start in range(0, len(raw), row_size))
+    return b"".join(b"\x00" + row for row in rows)
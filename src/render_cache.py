@@ -0,0 +1,190 @@
+"""
+A cache of rendered (and encoded) art, keyed by (code, size, format, source
+size), so the same code at the same size is only rendered once. The source size
+is the largest size rendered along with it: smaller sizes are cascaded down from
+the largest (see generate_art_images), so a 256px render on its own isn't the
+same, to the byte, as one rendered along with 512px.
+
+The memory tier is an LRU with a byte budget. The optional disk tier keeps
+every encoded entry (but not RAW ones, which are as big as the image) in a file
+named by the hash of its key, so it survives between runs and can be shared by
+worker processes.
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from generate_art import RenderBuffers, encode_images, generate_art_images
+from output_writer import write_atomic
+
+# The "format" of an uncompressed RGB image, for renders that are only used in
+# memory (e.g. the art in a preview), so they don't pay for PNG encoding.
+RAW = "RAW"
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+CacheKey = Tuple[str, int, str, int]
+
+
+class RenderCache:
+    def __init__(
+        self, max_bytes: int = DEFAULT_MAX_BYTES, disk_path: str = None
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.entries: "OrderedDict[CacheKey, bytes]" = OrderedDict()
+        self.n_bytes = 0
+        # The memory tier may be shared by render threads (see pipeline.py).
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(
+        self,
+        code: str,
+        size: int,
+        image_format: str,
+        source_size: int = None,
+        keep_in_memory: bool = True,
+    ) -> Optional[bytes]:
+        """
+        The cached bytes of the code at the size, rendered along with (and so
+        cascaded down from) source_size (by default, the size itself), if any.
+        """
+        key = (code, size, image_format, source_size or size)
+        with self._lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        if self._on_disk(key):
+            disk_file = self._disk_file(key)
+            if os.path.exists(disk_file):
+                with open(disk_file, "rb") as f:
+                    data = f.read()
+                self.disk_hits += 1
+                if keep_in_memory:
+                    self._add(key, data)
+                return data
+
+        self.misses += 1
+        return None
+
+    def put(
+        self,
+        code: str,
+        size: int,
+        image_format: str,
+        data: bytes,
+        source_size: int = None,
+        keep_in_memory: bool = True,
+    ):
+        key = (code, size, image_format, source_size or size)
+        if keep_in_memory:
+            self._add(key, data)
+
+        if self._on_disk(key):
+            disk_file = self._disk_file(key)
+            if not os.path.exists(disk_file):
+                os.makedirs(os.path.dirname(disk_file), exist_ok=True)
+                write_atomic(disk_file, data)
+
+    def render(
+        self,
+        code: str,
+        outputs: List[Tuple[int, str]],
+        keep_in_memory: bool = True,
+        buffers: RenderBuffers = None,
+    ) -> Dict[Tuple[int, str], bytes]:
+        """
+        The bytes of the code rendered at each (size, format). Unless they are
+        all cached, they are all rendered together (just as generate_art_images
+        would), and they are cached by the largest of the sizes, so a cached
+        render is always the same as an uncached one.
+
+        Without keep_in_memory, the renders only go to the disk tier (if any),
+        e.g. for new codes that won't be rendered again in this process. The
+        buffers, if any, are passed on to generate_art_images.
+        """
+        source_size = max(size for size, _ in outputs)
+        cached = {
+            (size, fmt): self.get(code, size, fmt, source_size, keep_in_memory)
+            for size, fmt in outputs
+        }
+        if all(data is not None for data in cached.values()):
+            return cached
+
+        sizes = [size for size, _ in outputs]
+        images = generate_art_images(code, sizes, buffers=buffers)
+        rendered = {}
+        for size, image_format in outputs:
+            data = encode(images[size], image_format)
+            self.put(code, size, image_format, data, source_size, keep_in_memory)
+            rendered[(size, image_format)] = data
+        return rendered
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.n_bytes,
+        }
+
+    def _add(self, key: CacheKey, data: bytes):
+        with self._lock:
+            old_data = self.entries.pop(key, None)
+            if old_data is not None:
+                self.n_bytes -= len(old_data)
+
+            self.entries[key] = data
+            self.n_bytes += len(data)
+            while self.n_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.n_bytes -= len(evicted)
+                self.evictions += 1
+
+    def _on_disk(self, key: CacheKey) -> bool:
+        return self.disk_path is not None and key[2] != RAW
+
+    def _disk_file(self, key: CacheKey) -> str:
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_path, digest[:2], f"{digest}.{key[2].lower()}")
+
+
+_caches: Dict[Optional[str], RenderCache] = {}
+
+
+def get_render_cache(disk_path: str = None) -> RenderCache:
+    """The render cache of this process (one per disk tier)."""
+    cache = _caches.get(disk_path)
+    if cache is None:
+        cache = RenderCache(disk_path=disk_path)
+        _caches[disk_path] = cache
+    return cache
+
+
+def encode(image: Image.Image, image_format: str) -> bytes:
+    if image_format == RAW:
+        return image.convert("RGB").tobytes()
+    return encode_images({0: image}, [image_format])[(0, image_format)]
+
+
+def decode(data: bytes, size: int, image_format: str) -> Image.Image:
+    if image_format == RAW:
+        return Image.frombytes("RGB", (size, size), data)
+    return Image.open(io.BytesIO(data))
+
@@ -0,0 +1,89 @@
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from artwork import Artwork
+from artwork_metadata import ArtworkMetadata
+from generate_art import generate_art_images
+from generate_collection import (
+    PREVIEW_IMAGE_SIZE,
+    generate_preview_image,
+    get_item_paths,
+)
+from item_results import future_result, look_ahead, report_items
+from metadata_store import read_collection_metadata
+
+
+def render_collection(
+    collection_id: str,
+    folder_path: str,
+    output_path: str,
+    size: int = None,
+    art: bool = True,
+    preview: bool = True,
+    workers: int = 1,
+):
+    """
+    Re-render an existing collection from the art codes in its meta-data, into
+    output_path (with the same art/ and preview/ layout), optionally at another
+    resolution.
+
+    The meta-data (from meta/ files or the streamed metadata.jsonl) is read as
+    it goes and at most a couple of items per worker are in flight at any time,
+    so the memory stays flat no matter the collection size.
+
+    Returns the ids of the items that failed to render.
+    """
+    collection_path = os.path.join(folder_path, collection_id)
+
+    for folder, enabled in [("art", art), ("preview", preview)]:
+        if enabled:
+            os.makedirs(os.path.join(output_path, folder), exist_ok=True)
+
+    jobs = (
+        (collection_id, metadata, output_path, size, art, preview)
+        for metadata in read_collection_metadata(collection_path)
+    )
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = ((executor.submit(_render_item, *job), job) for job in jobs)
+            # A couple of items per worker are submitted ahead of the one waited for.
+            results = (
+                future_result(future, lambda e: (job[1].item_id, repr(e)))
+                for future, job in look_ahead(futures, 2 * workers)
+            )
+            failed = report_items(results, "Rendered")
+    else:
+        failed = report_items((_render_item(*job) for job in jobs), "Rendered")
+
+    if failed:
+        print(f"Failed to render {len(failed)} items: {failed}")
+    return failed
+
+
+def render_item(
+    collection_id: str,
+    metadata: ArtworkMetadata,
+    output_path: str,
+    size: int = None,
+    art: bool = True,
+    preview: bool = True,
+):
+    paths = get_item_paths(collection_id, output_path, int(metadata.item_id))
+    size = size or Artwork.deserialize(metadata.code).size
+    images = generate_art_images(metadata.code, [size, PREVIEW_IMAGE_SIZE])
+
+    if art:
+        images[size].save(paths["art"])
+    if preview:
+        preview_image = generate_preview_image(images[PREVIEW_IMAGE_SIZE], metadata)
+        preview_image.save(paths["preview"])
+
+
+def _render_item(collection_id, metadata, output_path, size, art, preview):
+    try:
+        render_item(collection_id, metadata, output_path, size, art, preview)
+        return metadata.item_id, None
+    except Exception:
+        return metadata.item_id, traceback.format_exc()
@@ -0,0 +1,213 @@
+"""
+A resident render worker: it keeps the color table, fonts and PIL loaded, and
+renders art and previews of any art code (or seed) as jobs come in, over stdin
+or a local socket, one JSON object per line.
+
+A job looks like {"id": 1, "type": "art", "code": "A:512:...", "size": 256} or
+{"id": 2, "type": "preview", "seed": 42, "title": "VANISHED DREAMS"}, and its
+result like {"id": 1, "code": "A:512:...", "format": "PNG", "data": "<base64>"},
+or {"id": 1, "error": "..."} if it failed. Results are written as soon as they
+are done, so they can come back in another order than the jobs.
+
+A job that would render bigger than max_size, or a code of more than max_nodes
+nodes, fails rather than taking the memory (or the time) of a worker.
+"""
+
+import base64
+import json
+import os
+import socketserver
+import threading
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from PIL import Image
+
+from artwork import Artwork
+from artwork_metadata import ArtworkMetadata
+from generate_art import generate_seeded_art_code
+from generate_collection import (
+    PREVIEW_IMAGE_SIZE,
+    generate_preview_image,
+    get_color_name_mapper,
+)
+from render_cache import RAW, decode, encode, get_render_cache
+
+# What a job can ask for.
+JOB_ART = "art"
+JOB_PREVIEW = "preview"
+
+# The largest render (its canvas is twice the size) and code a job can ask for.
+DEFAULT_MAX_SIZE = 2048
+DEFAULT_MAX_NODES = 1000
+
+
+class RenderService:
+    """
+    A pool of warmed up workers (processes, or a thread if workers is 1) that
+    jobs from any number of streams are spread across. At most max_pending jobs
+    of a stream are queued at once, and a job can't render bigger than max_size
+    or a code of more than max_nodes, so a client can't run it out of memory.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        max_pending: int = None,
+        max_size: int = DEFAULT_MAX_SIZE,
+        max_nodes: int = DEFAULT_MAX_NODES,
+    ) -> None:
+        self.max_pending = max_pending or 4 * workers
+        self.max_size = max_size
+        self.max_nodes = max_nodes
+        self.executor: Executor
+        if workers > 1:
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers, initializer=warm_up
+            )
+        else:
+            warm_up()
+            self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def serve(self, lines: Iterable[str], write: Callable[[str], None]):
+        """
+        Run the job on each line, and write each result as a line of JSON once
+        it is done. Returns once every job has its result written.
+        """
+        condition = threading.Condition()
+        n_pending = 0
+
+        def write_result(result: dict):
+            nonlocal n_pending
+            with condition:
+                try:
+                    write(json.dumps(result) + "\n")
+                finally:
+                    # Even if the client is gone, the job is no longer pending.
+                    n_pending -= 1
+                    condition.notify_all()
+
+        for line in lines:
+            if not line.strip():
+                continue
+
+            with condition:
+                condition.wait_for(lambda: n_pending < self.max_pending)
+                n_pending += 1
+
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                write_result({"id": None, "error": f"Invalid job: {e}"})
+                continue
+            if not isinstance(job, dict):
+                write_result({"id": None, "error": "Invalid job: not an object"})
+                continue
+
+            future = self.executor.submit(run_job, job, self.max_size, self.max_nodes)
+            future.add_done_callback(
+                lambda f, job=job: write_result(_get_result(f, job))
+            )
+
+        with condition:
+            condition.wait_for(lambda: n_pending == 0)
+
+    def serve_socket(self, socket_path: str) -> socketserver.BaseServer:
+        """
+        A server of the jobs sent to a Unix socket, one connection per client
+        (all sharing the same workers). Call serve_forever() on it to run it.
+        """
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                lines = (line.decode("utf-8") for line in self.rfile)
+                service.serve(lines, self._write)
+
+            def _write(self, text: str):
+                self.wfile.write(text.encode("utf-8"))
+                self.wfile.flush()
+
+        return socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self) -> "RenderService":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def warm_up():
+    """Load the color table and fonts, so that the first job isn't slower."""
+    metadata = ArtworkMetadata()
+    metadata.code = "A:512:000000:ffffff:0.0.1"
+    image = Image.new("RGB", (PREVIEW_IMAGE_SIZE, PREVIEW_IMAGE_SIZE))
+    generate_preview_image(image, metadata)
+    get_color_name_mapper()
+
+
+def run_job(
+    job: dict, max_size: int = DEFAULT_MAX_SIZE, max_nodes: int = DEFAULT_MAX_NODES
+) -> dict:
+    """
+    Render a job, returning its result (with the image bytes in base64). Renders
+    go through the worker's render cache, so popular codes are only rendered once.
+    """
+    code = job.get("code")
+    if code is None:
+        code = generate_seeded_art_code(int(job["seed"]))
+    art = Artwork.deserialize(code)
+    if len(art.nodes) > max_nodes:
+        raise ValueError(f"The code has {len(art.nodes)} nodes, over {max_nodes}")
+    image_format = job.get("format", "PNG").upper()
+
+    job_type = job.get("type", JOB_ART)
+    if job_type == JOB_ART:
+        size = int(job.get("size") or art.size)
+        outputs = [(size, image_format)]
+        _check_sizes(outputs, max_size)
+        data = get_render_cache().render(code, outputs)[(size, image_format)]
+    elif job_type == JOB_PREVIEW:
+        # Rendered along with the art size, as a collection's previews are, so
+        # that it is the same to the pixel.
+        outputs = [(art.size, RAW), (PREVIEW_IMAGE_SIZE, RAW)]
+        _check_sizes(outputs, max_size)
+        rendered = get_render_cache().render(code, outputs)
+        image = decode(rendered[(PREVIEW_IMAGE_SIZE, RAW)], PREVIEW_IMAGE_SIZE, RAW)
+        metadata = ArtworkMetadata()
+        metadata.item_id = str(job.get("item_id", ""))
+        metadata.title = job.get("title", "Untitled")
+        color_name_mapper = get_color_name_mapper()
+        metadata.start_color_name = color_name_mapper.get(art.start_color).name
+        metadata.end_color_name = color_name_mapper.get(art.end_color).name
+        metadata.code = code
+        data = encode(generate_preview_image(image, metadata), image_format)
+    else:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    return {
+        "id": job.get("id"),
+        "code": code,
+        "format": image_format,
+        "data": base64.b64encode(data).decode("ascii"),
+    }
+
+
+def _check_sizes(outputs, max_size: int):
+    for size, _ in outputs:
+        if not 0 < size <= max_size:
+            raise ValueError(f"Size {size} is not between 1 and {max_size}")
+
+
+def _get_result(future, job: dict) -> dict:
+    try:
+        return future.result()
+    except Exception:
+        return {"id": job.get("id"), "error": traceback.format_exc()}
@@ -0,0 +1,146 @@
+"""A persistent cache of unused title candidates, keyed by color pair."""
+
+import os
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class TitleCache:
+    """
+    Every completion returns several candidate titles, but only one of them is
+    used. The rest are kept here (in SQLite) so that the next artwork with the
+    same color pair can be named without going to the network.
+
+    When there are more than max_pairs color pairs in the cache, the least
+    recently used pairs are evicted.
+    """
+
+    def __init__(self, path: str, max_pairs: int = 10000) -> None:
+        self.path = path
+        self.max_pairs = max_pairs
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # It may be opened by one thread and used by another (one at a time),
+        # e.g. by the feeder of a pipeline.
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS pairs ("
+                "start_color TEXT, end_color TEXT, last_used INTEGER, "
+                "PRIMARY KEY (start_color, end_color))"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS titles ("
+                "start_color TEXT, end_color TEXT, title TEXT, "
+                "PRIMARY KEY (start_color, end_color, title))"
+            )
+
+    def take(
+        self, start_color: str, end_color: str, name_set: set = None
+    ) -> Optional[str]:
+        """
+        Remove and return an unused title for this color pair (skipping the ones
+        already in name_set), or None if there isn't one.
+        """
+        rows = self.connection.execute(
+            "SELECT title FROM titles WHERE start_color = ? AND end_color = ? "
+            "ORDER BY length(title)",
+            (start_color, end_color),
+        ).fetchall()
+
+        for (title,) in rows:
+            if name_set is not None and title in name_set:
+                continue
+
+            with self.connection:
+                deleted = self.connection.execute(
+                    "DELETE FROM titles "
+                    "WHERE start_color = ? AND end_color = ? AND title = ?",
+                    (start_color, end_color, title),
+                ).rowcount
+                self._touch(start_color, end_color)
+
+            if deleted == 0:
+                # Another process took it first.
+                continue
+
+            if name_set is not None:
+                name_set.add(title)
+            self.hits += 1
+            return title
+
+        self.misses += 1
+        return None
+
+    def add(self, start_color: str, end_color: str, titles: Iterable[str]):
+        """Store unused title candidates for this color pair."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO titles VALUES (?, ?, ?)",
+                [(start_color, end_color, title) for title in titles],
+            )
+            self._touch(start_color, end_color)
+            self._evict()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "pairs": self._count("pairs"),
+            "titles": self._count("titles"),
+        }
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self) -> "TitleCache":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _touch(self, start_color: str, end_color: str):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO pairs VALUES "
+            "(?, ?, (SELECT COALESCE(MAX(last_used), 0) + 1 FROM pairs))",
+            (start_color, end_color),
+        )
+
+    def _evict(self):
+        n_over = self._count("pairs") - self.max_pairs
+        if n_over <= 0:
+            return
+
+        evicted = self.connection.execute(
+            "SELECT start_color, end_color FROM pairs ORDER BY last_used LIMIT ?",
+            (n_over,),
+        ).fetchall()
+        self.connection.executemany(
+            "DELETE FROM titles WHERE start_color = ? AND end_color = ?", evicted
+        )
+        self.connection.executemany(
+            "DELETE FROM pairs WHERE start_color = ? AND end_color = ?", evicted
+        )
+        self.evictions += len(evicted)
+
+    def _count(self, table: str) -> int:
+        return self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+_caches: Dict[str, Tuple[int, TitleCache]] = {}
+
+
+def get_title_cache(path: str) -> TitleCache:
+    """
+    The title cache at path of this process, opened once rather than for every
+    item. A forked process opens its own, since a SQLite connection can't be
+    shared with the parent.
+    """
+    pid, cache = _caches.get(path, (None, None))
+    if pid != os.getpid():
+        cache = TitleCache(path)
+        _caches[path] = (os.getpid(), cache)
+    return cache
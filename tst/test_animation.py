@@ -0,0 +1,55 @@
+from src.animation import (
+    count_animation_frames,
+    iterate_animation_frames,
+    write_animation,
+)
+from src.generate_art import generate_art_from_code, generate_seeded_art_code
+from PIL import Image, ImageSequence
+import numpy as np
+import os
+import pytest
+
+
+def test_animation_frames():
+    code = generate_seeded_art_code(3)
+    final = generate_art_from_code(code, size=128)
+
+    # Every frame is the same as resizing the whole canvas, so the last is the art.
+    n_frames = 0
+    for frame, box in iterate_animation_frames(code, size=128, steps_per_segment=3):
+        n_frames += 1
+    assert n_frames == count_animation_frames(code, size=128, steps_per_segment=3)
+    assert frame.tobytes() == final.tobytes()
+    assert box != (0, 0, 128, 128)
+
+
+@pytest.mark.parametrize("extension", ["png", "gif", "webp"])
+def test_write_animation(tmp_path, extension):
+    code = generate_seeded_art_code(3)
+    path = str(tmp_path / f"animation.{extension}")
+    n_frames = write_animation(code, path, size=64, steps_per_segment=2)
+    assert n_frames == count_animation_frames(code, size=64, steps_per_segment=2)
+
+    final = generate_art_from_code(code, size=64)
+    expected = [
+        frame.tobytes()
+        for frame, _ in iterate_animation_frames(code, size=64, steps_per_segment=2)
+    ]
+    with Image.open(path) as animation:
+        frames = [frame.convert("RGB") for frame in ImageSequence.Iterator(animation)]
+    if extension == "png":
+        assert [frame.tobytes() for frame in frames] == expected
+    elif extension == "gif":
+        # GIF frames are quantized, so they are only close to the art.
+        assert len(frames) == n_frames
+        delta = np.asarray(frames[-1], dtype=int) - np.asarray(final, dtype=int)
+        assert np.abs(delta).mean() < 1
+    else:
+        # WebP is lossless, but merges a frame that didn't change into the last.
+        changed = [f for i, f in enumerate(expected) if i == 0 or f != expected[i - 1]]
+        assert [frame.tobytes() for frame in frames] == changed
+        assert frames[-1].tobytes() == final.tobytes()
+    assert os.listdir(tmp_path) == [f"animation.{extension}"]
+
+    with pytest.raises(ValueError):
+        write_animation(code, str(tmp_path / "animation.bmp"))
@@ -0,0 +1,55 @@
+from src.art_codes import parse_codes
+from src.artwork import Artwork
+import pytest
+
+CODES = [
+    "A:512:2b3323:00ffe1:314.272.12:393.276.16:369.218.20:345.311.24:414.391.28:97.277.32:362.121.36:314.272.12:182.251.40:161.335.36:314.272.12",
+    "A:512:332823:29ff00:392.293.12:341.337.16:208.141.20:294.207.24:392.293.12:196.286.28:119.371.32:139.350.36:137.330.40:392.293.12",
+]
+
+
+def test_compact_code_round_trip():
+    for code in CODES:
+        compact = Artwork.deserialize(code).serialize_compact()
+        assert compact.startswith("B:")
+        assert len(compact) < len(code)
+        assert Artwork.deserialize(compact).serialize() == code
+
+        binary = Artwork.deserialize(code).serialize_binary()
+        assert Artwork.deserialize_binary(binary).serialize() == code
+
+
+def test_parse_codes():
+    compact = Artwork.deserialize(CODES[1]).serialize_compact()
+    table = parse_codes([CODES[0], "", compact])
+
+    assert len(table) == 2
+    assert [table.code(i) for i in range(2)] == CODES
+    assert table.nodes.shape == (21, 3)
+    assert list(table.start_colors[0]) == [0x2B, 0x33, 0x23]
+
+
+def test_parse_codes_without_nodes():
+    codes = ["A:512:000000:ffffff:", CODES[0], "A:256:010203:040506:"]
+    table = parse_codes(codes)
+
+    assert len(table) == 3
+    assert list(table.node_offsets) == [0, 0, 11, 11]
+    assert table.code(1) == CODES[0]
+    assert table.artwork(2).nodes == []
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "A:512:2b3323:00ffe1:314.272.12:393.276",
+        "A:512:2b3323:00ffe1:314.272.12:393.27x.16",
+        "A:512:2b3323:00ffe1:314.272.12::393.276.16",
+        "A:51x:2b3323:00ffe1:314.272.12",
+        "A:512:2b3323:00ffzz:314.272.12",
+        "A:512:2b3323",
+    ],
+)
+def test_parse_codes_malformed(code):
+    with pytest.raises(ValueError, match="on line 3"):
+        parse_codes([CODES[0], "", code, CODES[1]])
@@ -0,0 +1,22 @@
+from src.art_search import search_art_codes
+from src.color_name import ColorNameMapper
+
+
+def test_search_art_codes():
+    criteria = {
+        "node_spread": (0.25, None),
+        "distinct_color_names": (1, 1),
+        "proxy_coverage": (0.02, None),
+    }
+    mapper = ColorNameMapper("src/color_names.json")
+    candidates = search_art_codes(40, criteria, seed=1, color_name_mapper=mapper)
+
+    assert 0 < len(candidates) < 40
+    for candidate in candidates:
+        assert candidate.scores["node_spread"] >= 0.25
+        assert candidate.scores["distinct_color_names"] == 1
+        assert candidate.scores["proxy_coverage"] >= 0.02
+
+    # The same seed finds the same codes.
+    again = search_art_codes(40, criteria, seed=1, color_name_mapper=mapper)
+    assert [c.code for c in again] == [c.code for c in candidates]
@@ -0,0 +1,30 @@
+import time
+
+from src.benchmark import benchmark_stage, compare_results, run_benchmarks
+
+
+def test_run_benchmarks():
+    results = run_benchmarks(n=2, collection_n=2)
+
+    names = [stage["name"] for stage in results["stages"]]
+    assert "generate_art_from_code" in names
+    assert "generate_collection" in names
+    assert all(stage["peak_rss_mb"] > 0 for stage in results["stages"])
+
+    lines = compare_results(results, results)
+    assert not any(line.startswith("REGRESSION") for line in lines)
+
+
+def test_benchmark_stage_peak_rss():
+    size = 256 * 2 ** 20
+
+    def allocate(_):
+        data = b"x" * size
+        time.sleep(0.05)
+        del data
+
+    big = benchmark_stage("big", allocate, 1, 0)
+    small = benchmark_stage("small", lambda _: None, 1, 0)
+
+    # Each stage has its own peak, not the largest of the process so far.
+    assert big["peak_rss_mb"] - small["peak_rss_mb"] > 200
@@ -1,4 +1,15 @@
-from src.color_name import ColorNameMapper
+from src.color import Color
+from src.color_name import (
+    TABLE_MISSING,
+    ColorNameMapper,
+    _fill_table_cell,
+    _rgb_to_hls_array,
+    save_color_table,
+)
+import colorsys
+import json
+import numpy as np
+import os
 
 
 def test_color_name():
@@ -11,3 +22,89 @@ def test_color_name():
     assert color_mapper.get((255, 255, 255)).name == "White"
     assert color_mapper.get((255, 150, 0)).name == "Pizazz"
     assert color_mapper.get((0, 200, 200)).name == "Robin's Egg Blue"
+
+
+def closest_name(color_mapper: ColorNameMapper, rgb) -> str:
+    """The closest named color, by comparing with the palette one by one."""
+    hls = colorsys.rgb_to_hls(*rgb)
+    best_name, best_delta = None, None
+    for name, hex in zip(color_mapper.names, color_mapper.hexes):
+        palette_rgb = Color.hex_to_rgb(hex)
+        palette_hls = colorsys.rgb_to_hls(*palette_rgb)
+        delta = color_mapper.color_dist(rgb, palette_rgb)
+        delta += color_mapper.color_dist(hls, palette_hls) * 2
+        if best_delta is None or delta < best_delta:
+            best_name, best_delta = name, delta
+    return best_name
+
+
+def test_color_name_get_many():
+    color_mapper = ColorNameMapper("src/color_names.json")
+    rng = np.random.default_rng(0)
+    colors = [tuple(c) for c in rng.integers(0, 256, (200, 3)).tolist()]
+    colors += [(0, 0, 0), (255, 255, 255), (255, 0, 0), (0, 200, 200)]
+
+    names = [c.name for c in color_mapper.get_many(colors)]
+    assert names == [closest_name(color_mapper, c) for c in colors]
+    assert color_mapper.get_many([]) == []
+
+
+def test_color_name_get_many_ties(tmp_path):
+    # A tie goes to the first of the closest colors in the palette.
+    palette = [
+        ["#000000", "Black"],
+        ["#ff0000", "Red"],
+        ["#00ff00", "Green"],
+        ["#ff0000", "Second Red"],
+        ["#00ff00", "Second Green"],
+    ]
+    palette_path = tmp_path / "color_names.json"
+    palette_path.write_text(json.dumps(palette))
+    color_mapper = ColorNameMapper(str(palette_path))
+
+    colors = [(255, 0, 0), (250, 10, 5), (0, 255, 0), (10, 240, 20), (5, 5, 5)]
+    names = [c.name for c in color_mapper.get_many(colors)]
+    assert names == [closest_name(color_mapper, c) for c in colors]
+    assert names == ["Red", "Red", "Green", "Green", "Black"]
+
+
+def test_color_name_cache(tmp_path):
+    cache_path = str(tmp_path / "color_names.npz")
+    color_mapper = ColorNameMapper("src/color_names.json", cache_path=cache_path)
+
+    # The cache is written in one go (no temporary file is left behind).
+    assert os.listdir(tmp_path) == ["color_names.npz"]
+    cached_mapper = ColorNameMapper("src/color_names.json", cache_path=cache_path)
+    assert cached_mapper.names == color_mapper.names
+    assert cached_mapper.get((0, 200, 200)).name == "Robin's Egg Blue"
+
+
+def test_color_name_lookup_table(tmp_path):
+    color_mapper = ColorNameMapper("src/color_names.json")
+
+    # Fill in a few cubes of the table (the whole table takes a while).
+    table = np.full(1 << 24, TABLE_MISSING, dtype=np.uint16)
+    for low in [(0, 0, 0), (128, 64, 8), (248, 248, 248)]:
+        _fill_table_cell(table, color_mapper, low, 8)
+    table_path = str(tmp_path / "table.npy")
+    save_color_table(table, table_path)
+
+    table_mapper = ColorNameMapper("src/color_names.json", table_path=table_path)
+    assert isinstance(table_mapper.table, np.memmap)
+
+    # The table gives the same names (and the colors it doesn't have are searched).
+    colors = [(r, g, b) for r in [128, 135] for g in [64, 71, 200] for b in [8, 15]]
+    colors += [(0, 0, 0), (3, 1, 0), (255, 255, 255), (250, 249, 248)]
+    expected = [c.name for c in color_mapper.get_many(colors)]
+    assert [c.name for c in table_mapper.get_many(colors)] == expected
+    assert table_mapper.table[200 << 16 | 64 << 8 | 8] == TABLE_MISSING
+
+    # The colors that colorsys can't convert have no entry.
+    assert table[2 << 16] == TABLE_MISSING
+
+
+def test_rgb_to_hls_array_matches_colorsys():
+    rng = np.random.default_rng(0)
+    rgb = np.concatenate([rng.integers(0, 256, (2000, 3)), [[0, 0, 0], [1, 0, 0]]])
+    for color, hls in zip(rgb.tolist(), _rgb_to_hls_array(rgb)):
+        assert tuple(hls) == colorsys.rgb_to_hls(*color)
@@ -0,0 +1,60 @@
+from src.contact_sheet import SheetLayout, art_file_loader, generate_contact_sheets
+from src.generate_collection import generate_collection
+from src.metadata_store import read_collection_metadata
+from src.png_writer import PngStripWriter
+from PIL import Image
+import os
+import pytest
+
+COLLECTION_PATH = "tst_output"
+
+
+def test_png_strip_writer(tmp_path):
+    image = Image.effect_noise((40, 30), 64).convert("RGB")
+    path = str(tmp_path / "strips.png")
+    with PngStripWriter(path, 40, 30) as writer:
+        for top in range(0, 30, 7):
+            writer.write(image.crop((0, top, 40, min(top + 7, 30))))
+
+    with Image.open(path) as written:
+        assert written.size == (40, 30)
+        assert written.tobytes() == image.tobytes()
+
+    # A sheet that wasn't finished isn't left behind.
+    with pytest.raises(ValueError):
+        with PngStripWriter(str(tmp_path / "short.png"), 40, 30) as writer:
+            writer.write(image.crop((0, 0, 40, 7)))
+    assert os.listdir(tmp_path) == ["strips.png"]
+
+
+def test_contact_sheets():
+    generate_collection(
+        "sheets", COLLECTION_PATH, 5, use_ai=False, seed=4, metadata_mode="stream"
+    )
+    collection_path = f"{COLLECTION_PATH}/sheets"
+    sheet_paths = generate_contact_sheets(
+        read_collection_metadata(collection_path),
+        f"{collection_path}/sheets",
+        "sheets",
+        columns=2,
+        rows=2,
+        tile_size=64,
+        load_art=art_file_loader(f"{collection_path}/art", "sheets"),
+    )
+
+    # 4 items on the first sheet, and only the row it needs for the last one.
+    layout = SheetLayout(2, 64)
+    assert [os.path.basename(path) for path in sheet_paths] == [
+        "sheets_sheet_001.png",
+        "sheets_sheet_002.png",
+    ]
+    with Image.open(sheet_paths[0]) as sheet:
+        assert sheet.size == (layout.width, layout.sheet_height(2))
+    with Image.open(sheet_paths[1]) as sheet:
+        assert sheet.size == (layout.width, layout.sheet_height(1))
+
+        # The last item's art is in the first tile.
+        tile = sheet.crop((16, 16, 16 + 64, 16 + 64))
+        with Image.open(f"{collection_path}/art/sheets_005.png") as art:
+            expected = art.convert("RGB").resize((64, 64), resample=Image.ANTIALIAS)
+        assert tile.tobytes() == expected.tobytes()
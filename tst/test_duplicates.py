@@ -0,0 +1,76 @@
+from src.duplicates import (
+    ImageHashIndex,
+    find_near_duplicates,
+    group_duplicates,
+    hamming_distance,
+    image_hash,
+    normalize_title,
+)
+import src.duplicates as duplicates
+from src.generate_collection import generate_collection
+from PIL import Image, ImageDraw
+import itertools
+import os
+import random
+import shutil
+
+
+def test_normalize_title():
+    assert normalize_title("Let's burn the  crows!") == "lets burn the crows"
+    assert group_duplicates(
+        {"001": "FROZEN OCEAN", "002": "Frozen ocean.", "003": "Lullaby"}
+    ) == {"frozen ocean": ["001", "002"]}
+
+
+def test_find_near_duplicates():
+    hashes = {"a": 0b1111, "b": 0b1011, "c": 0xFF << 40, "d": 0xF8 << 40}
+    assert find_near_duplicates(hashes, 1) == [("a", "b", 1)]
+    assert find_near_duplicates(hashes, 3) == [("a", "b", 1), ("c", "d", 3)]
+
+
+def test_find_near_duplicates_dark_images(monkeypatch):
+    # Mostly black art, a lot of it plain black: many hashes share most chunks.
+    rng = random.Random(0)
+    hashes = {}
+    for i in range(400):
+        image = Image.new("RGB", (64, 64), (rng.randrange(8),) * 3)
+        draw = ImageDraw.Draw(image)
+        for _ in range(rng.randrange(3)):
+            line = [rng.randrange(64) for _ in range(4)]
+            draw.line(line, fill=(rng.randrange(256),) * 3, width=rng.randrange(1, 6))
+        hashes[f"{i:03}"] = image_hash(image)
+
+    expected = [
+        (a, b, hamming_distance(hashes[a], hashes[b]))
+        for a, b in itertools.combinations(sorted(hashes), 2)
+        if hamming_distance(hashes[a], hashes[b]) <= 4
+    ]
+    n_compared = 0
+
+    def counting_hamming_distance(a: int, b: int) -> int:
+        nonlocal n_compared
+        n_compared += 1
+        return hamming_distance(a, b)
+
+    monkeypatch.setattr(duplicates, "hamming_distance", counting_hamming_distance)
+    assert find_near_duplicates(hashes, 4) == expected
+    # Far fewer comparisons than every pair (400 * 399 / 2 = 79800).
+    assert n_compared < 8000
+
+
+def test_image_hash_index():
+    collection_path = "tst_output/dupes"
+    shutil.rmtree(collection_path, ignore_errors=True)
+    generate_collection("dupes", "tst_output", 3, use_ai=False, seed=2)
+    art_folder = f"{collection_path}/art"
+    shutil.copy(f"{art_folder}/dupes_001.png", f"{art_folder}/dupes_004.png")
+    art_files = [os.path.join(art_folder, f) for f in sorted(os.listdir(art_folder))]
+
+    assert ImageHashIndex(collection_path).update(art_files) == 4
+
+    # The index is kept on disk, and only new files are hashed.
+    index = ImageHashIndex(collection_path)
+    assert index.update(art_files) == 0
+
+    near_duplicates = find_near_duplicates(index.hashes(), 4)
+    assert ("dupes_001.png", "dupes_004.png", 0) in near_duplicates
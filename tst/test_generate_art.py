@@ -1,5 +1,16 @@
-from src.generate_art import generate_art
+from src.generate_art import (
+    RenderBuffers,
+    encode_images,
+    generate_art,
+    generate_art_code,
+    generate_art_from_code,
+    generate_art_images,
+    generate_end_color,
+    generate_seeded_art_code,
+    generate_starting_color,
+)
 import os
+import random
 
 OUTPUT_FOLDER = "tst_output"
 OUTPUT_PATH = f"{OUTPUT_FOLDER}/test_image.png"
@@ -11,3 +22,55 @@ def test_generate_art():
     # If this runs without errors, I consider this a success.
     generate_art(OUTPUT_PATH)
     assert os.path.exists(OUTPUT_PATH)
+
+
+def test_composite_renderer_matches_reference():
+    code = "A:512:2b3323:00ffe1:314.272.12:393.276.16:369.218.20:345.311.24:414.391.28:97.277.32:362.121.36:314.272.12:182.251.40:161.335.36:314.272.12"
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+
+    reference = generate_art_from_code(
+        code, f"{OUTPUT_FOLDER}/test_reference.png", renderer="reference"
+    )
+    composite = generate_art_from_code(
+        code, f"{OUTPUT_FOLDER}/test_composite.png", renderer="composite"
+    )
+    assert reference.tobytes() == composite.tobytes()
+
+
+def test_generate_art_images():
+    code = "A:512:2b3323:00ffe1:314.272.12:393.276.16:369.218.20:345.311.24:414.391.28:97.277.32:362.121.36:314.272.12:182.251.40:161.335.36:314.272.12"
+
+    images = generate_art_images(code, [512, 256, 128])
+    for size in [512, 256, 128]:
+        assert images[size].size == (size, size)
+    assert images[512].tobytes() == generate_art_from_code(code).tobytes()
+
+    encoded = encode_images(images, ["PNG", "JPEG"])
+    assert len(encoded) == 6
+    assert encoded[(128, "PNG")].startswith(b"\x89PNG")
+
+
+def test_render_buffers_are_reused():
+    buffers = RenderBuffers()
+    for seed in [1, 2]:
+        code = generate_seeded_art_code(seed)
+        images = generate_art_images(code, [128, 64], buffers=buffers)
+        if seed == 1:
+            canvas = buffers.canvas
+        expected = generate_art_images(code, [128, 64])
+        assert all(images[s].tobytes() == expected[s].tobytes() for s in [128, 64])
+    assert buffers.canvas is canvas
+
+
+def test_seeded_art_code():
+    state = random.getstate()
+    code = generate_seeded_art_code(42)
+
+    assert generate_seeded_art_code(42) == code
+    assert generate_seeded_art_code(43) != code
+    assert random.getstate() == state
+
+    rng = random.Random(42)
+    start_color = generate_starting_color(rng)
+    end_color = generate_end_color(start_color, rng)
+    assert generate_art_code(start_color, end_color, rng) == code
@@ -1,5 +1,16 @@
-from src.generate_collection import generate_collection
-import uuid
+from src.generate_collection import (
+    generate_collection,
+    get_best_font_size,
+    get_font,
+    get_item_seed,
+)
+import src.generate_collection as generate_collection_module
+from src.art_name_generator import StubCompletionBackend
+from src.generate_art import generate_seeded_art_code
+import json
+import os
+import pytest
+import shutil
 
 
 def test_generate_collection():
@@ -12,3 +23,241 @@ def test_generate_collection_skip_ai():
     collection_id = "test"
     collection_path = f"tst_output"
     generate_collection(collection_id, collection_path, 32, use_ai=False)
+
+
+def test_generate_collection_workers_match_serial():
+    collection_path = f"tst_output"
+    generate_collection("serial", collection_path, 4, use_ai=False, seed=7)
+    failed_ids = generate_collection(
+        "parallel", collection_path, 4, use_ai=False, workers=2, seed=7
+    )
+    assert failed_ids == []
+
+    for item_id in ["001", "002", "003", "004"]:
+        with open(f"{collection_path}/serial/meta/{item_id}.json") as f:
+            serial_meta = json.load(f)
+        with open(f"{collection_path}/parallel/meta/{item_id}.json") as f:
+            parallel_meta = json.load(f)
+        assert serial_meta == parallel_meta
+
+
+def test_generate_collection_resume(monkeypatch):
+    collection_path = f"tst_output"
+    shutil.rmtree(f"{collection_path}/resume", ignore_errors=True)
+    generate_collection("resume", collection_path, 3, use_ai=False, seed=3)
+
+    art_1 = f"{collection_path}/resume/art/resume_001.png"
+    art_2 = f"{collection_path}/resume/art/resume_002.png"
+    preview_3 = f"{collection_path}/resume/preview/resume_003_preview.png"
+    art_1_mtime = os.path.getmtime(art_1)
+    with open(art_2, "rb") as f:
+        art_2_bytes = f.read()
+
+    # Only the missing art is regenerated, and it comes out the same.
+    os.remove(art_2)
+    assert generate_collection("resume", collection_path, 3, use_ai=False) == []
+    assert os.path.getmtime(art_1) == art_1_mtime
+    with open(art_2, "rb") as f:
+        assert f.read() == art_2_bytes
+
+    # A new preview layout only redoes the previews.
+    os.remove(preview_3)
+    monkeypatch.setattr(generate_collection_module, "PREVIEW_VERSION", 2)
+    assert generate_collection("resume", collection_path, 3, use_ai=False) == []
+    assert os.path.getmtime(art_1) == art_1_mtime
+    assert os.path.exists(preview_3)
+
+
+_generate_item = generate_collection_module._generate_item
+
+
+def _interrupted_item(options, item_id, *args):
+    # Stands in for the run being killed while item 4 is being generated.
+    if item_id == 4:
+        raise KeyboardInterrupt
+    return _generate_item(options, item_id, *args)
+
+
+def test_generate_collection_workers_resume_after_interrupt(monkeypatch):
+    collection_path = f"tst_output"
+    shutil.rmtree(f"{collection_path}/interrupted", ignore_errors=True)
+    monkeypatch.setattr(generate_collection_module, "_generate_item", _interrupted_item)
+    with pytest.raises(KeyboardInterrupt):
+        generate_collection(
+            "interrupted", collection_path, 6, use_ai=False, workers=2, seed=4
+        )
+
+    # The items done before the interruption are in the manifest...
+    with open(f"{collection_path}/interrupted/manifest.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    item_ids = [record["item_id"] for record in records if "item_id" in record]
+    assert item_ids == [1, 2, 3]
+
+    # ...so a rerun only generates the rest.
+    monkeypatch.undo()
+    art_1 = f"{collection_path}/interrupted/art/interrupted_001.png"
+    art_1_mtime = os.path.getmtime(art_1)
+    assert generate_collection("interrupted", collection_path, 6, use_ai=False) == []
+    assert os.path.getmtime(art_1) == art_1_mtime
+    assert os.path.exists(f"{collection_path}/interrupted/art/interrupted_006.png")
+
+
+def test_preview_fonts_are_cached():
+    font_name = "font/RobotoMono-Regular.ttf"
+    assert get_font(font_name, 24) is get_font(font_name, 24)
+    assert get_best_font_size(font_name, "VANISHED DREAMS", 512, 24) == 23
+
+
+def test_generate_collection_item_codes_come_from_item_seeds():
+    collection_path = f"tst_output"
+    generate_collection("seeded", collection_path, 2, use_ai=False, seed=9)
+
+    for item_id in [1, 2]:
+        with open(f"{collection_path}/seeded/meta/00{item_id}.json") as f:
+            code = json.load(f)["code"]
+        assert code == generate_seeded_art_code(get_item_seed(9, item_id))
+
+
+def test_generate_collection_pipeline_matches_serial():
+    collection_path = f"tst_output"
+    for collection_id in ["serial_pipeline", "pipeline"]:
+        shutil.rmtree(f"{collection_path}/{collection_id}", ignore_errors=True)
+    generate_collection("serial_pipeline", collection_path, 4, use_ai=False, seed=5)
+    failed_ids = generate_collection(
+        "pipeline",
+        collection_path,
+        4,
+        use_ai=False,
+        seed=5,
+        pipeline=True,
+        render_threads=2,
+        memory_budget=16 * 2 ** 20,
+    )
+    assert failed_ids == []
+
+    def file_hashes(collection_id):
+        with open(f"{collection_path}/{collection_id}/manifest.jsonl") as f:
+            records = [json.loads(line) for line in f]
+        return [record["files"] for record in records if "files" in record]
+
+    assert file_hashes("pipeline") == file_hashes("serial_pipeline")
+
+
+def test_generate_collection_names_in_batches(monkeypatch):
+    collection_path = f"tst_output"
+    backend = StubCompletionBackend(latency=0.01)
+    monkeypatch.setattr(
+        generate_collection_module, "get_default_backend", lambda: backend
+    )
+    monkeypatch.setattr(generate_collection_module, "NAME_BATCH_SIZE", 3)
+    shutil.rmtree(f"{collection_path}/batched", ignore_errors=True)
+    generate_collection("batched", collection_path, 5, seed=2, pipeline=True)
+
+    # Every item is named by the (stub) API, several requests at a time.
+    assert backend.n_requests == 5
+    assert backend.max_in_flight == 3
+    for item_id in range(1, 6):
+        with open(f"{collection_path}/batched/meta/00{item_id}.json") as f:
+            metadata = json.load(f)
+        colors = f"{metadata['start_color_name']}, {metadata['end_color_name']}"
+        assert metadata["title"] == colors.upper()
+
+
+def test_generate_collection_title_cache_stats(monkeypatch, capsys):
+    collection_path = f"tst_output"
+    title_cache_path = f"{collection_path}/stats_titles.sqlite"
+    shutil.rmtree(f"{collection_path}/stats", ignore_errors=True)
+    if os.path.exists(title_cache_path):
+        os.remove(title_cache_path)
+    monkeypatch.setattr(
+        generate_collection_module,
+        "get_default_backend",
+        lambda: StubCompletionBackend(latency=0.0),
+    )
+
+    # The stub gives two titles per request, so the second run is all hits.
+    for resume, expected in [(True, "0 hits, 2 misses"), (False, "2 hits, 0 misses")]:
+        generate_collection(
+            "stats",
+            collection_path,
+            2,
+            seed=6,
+            title_cache_path=title_cache_path,
+            resume=resume,
+        )
+        assert f"Title cache: {expected}" in capsys.readouterr().out
+
+
+def test_generate_collection_pipeline_jobs_raise(monkeypatch):
+    collection_path = f"tst_output"
+    name_jobs = generate_collection_module._name_jobs
+
+    def failing_name_jobs(options, jobs):
+        for count, job in enumerate(name_jobs(options, jobs)):
+            if count == 2:
+                raise RuntimeError("the jobs ran out")
+            yield job
+
+    monkeypatch.setattr(generate_collection_module, "_name_jobs", failing_name_jobs)
+    shutil.rmtree(f"{collection_path}/jobs_raise", ignore_errors=True)
+
+    # The run fails (rather than reporting success with items missing), after
+    # recording the items that were generated.
+    with pytest.raises(RuntimeError, match="the jobs ran out"):
+        generate_collection(
+            "jobs_raise", collection_path, 6, use_ai=False, seed=3, pipeline=True
+        )
+    with open(f"{collection_path}/jobs_raise/manifest.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    assert len([record for record in records if "files" in record]) == 2
+
+
+class FailingCompletionBackend(StubCompletionBackend):
+    """Fails the 3rd request, and gives every item the same first title."""
+
+    async def complete(self, prompt: str):
+        request_number = self.n_requests + 1
+        titles = await super().complete(prompt)
+        if request_number == 3:
+            raise RuntimeError("title request failed")
+        return ["Twin", titles[1]]
+
+
+@pytest.mark.parametrize("mode", ["serial", "workers", "pipeline"])
+def test_generate_collection_naming_fails(monkeypatch, mode):
+    collection_path = f"tst_output"
+    collection_id = f"naming_fails_{mode}"
+    monkeypatch.setattr(
+        generate_collection_module,
+        "get_default_backend",
+        lambda: FailingCompletionBackend(latency=0.0),
+    )
+    shutil.rmtree(f"{collection_path}/{collection_id}", ignore_errors=True)
+    failed_ids = generate_collection(
+        collection_id,
+        collection_path,
+        5,
+        seed=4,
+        workers=2 if mode == "workers" else 1,
+        pipeline=mode == "pipeline",
+    )
+
+    # Only the item whose title failed is lost, and no two items share a title.
+    assert failed_ids == [3]
+    titles = []
+    for item_id in [1, 2, 4, 5]:
+        with open(f"{collection_path}/{collection_id}/meta/00{item_id}.json") as f:
+            titles.append(json.load(f)["title"])
+    assert "TWIN" in titles
+    assert len(set(titles)) == 4
+
+
+def test_generate_collection_keeps_new_renders_out_of_memory():
+    collection_path = f"tst_output"
+    shutil.rmtree(f"{collection_path}/not_cached", ignore_errors=True)
+    render_cache = generate_collection_module.get_render_cache()
+    n_entries = render_cache.stats()["entries"]
+
+    # Each new code is rendered once, so its renders aren't kept around.
+    generate_collection("not_cached", collection_path, 3, use_ai=False, seed=8)
+    assert render_cache.stats()["entries"] == n_entries
@@ -0,0 +1,26 @@
+from src.art_name_generator import StubCompletionBackend, generate_names
+
+
+def test_generate_names_concurrency_limit():
+    backend = StubCompletionBackend(latency=0.01)
+    color_pairs = [("Red", "Blue")] * 4 + [("Gold", "Picton Blue")] * 4
+
+    name_set = set()
+    names = generate_names(
+        color_pairs, backend=backend, name_set=name_set, max_concurrency=3
+    )
+
+    assert len(names) == len(color_pairs)
+    assert len(set(names)) == len(names)
+    assert name_set == set(names)
+    assert backend.max_in_flight <= 3
+
+
+def test_generate_names_rate_limit_backoff():
+    backend = StubCompletionBackend(latency=0.0, rate_limit_every=3)
+    color_pairs = [("Black", f"Color {i}") for i in range(10)]
+
+    names = generate_names(color_pairs, backend=backend, backoff=0.001)
+
+    assert names == [f"Black, Color {i}" for i in range(10)]
+    assert backend.n_requests > len(color_pairs)
@@ -0,0 +1,63 @@
+from src.golden_corpus import (
+    REPO_PATH,
+    check_corpus,
+    hash_image,
+    load_corpus,
+    update_corpus,
+)
+from src.generate_art import generate_art_from_code
+from PIL import Image
+import json
+import os
+
+
+def test_golden_corpus(tmp_path):
+    n_checked, mismatches = check_corpus(output_path=str(tmp_path))
+    assert [str(mismatch) for mismatch in mismatches] == []
+    assert n_checked == sum(len(entry["outputs"]) for entry in load_corpus())
+
+    # The reference images are the same renders as the hashes.
+    for entry in load_corpus():
+        for output in entry["outputs"].values():
+            with Image.open(os.path.join(REPO_PATH, output["image"])) as image:
+                assert hash_image(image) == output["sha256"]
+
+
+def test_golden_mismatch(tmp_path):
+    code = load_corpus()[0]["code"]
+    reference = generate_art_from_code(code, size=256)
+    reference.paste((255, 0, 0), (10, 10, 12, 12))
+    reference.save(tmp_path / "reference.png")
+
+    corpus_path = tmp_path / "corpus.json"
+    output = {"sha256": hash_image(reference), "image": str(tmp_path / "reference.png")}
+    entry = {"name": "changed", "code": code, "outputs": {"256": output}}
+    corpus_path.write_text(json.dumps({"entries": [entry]}))
+
+    n_checked, mismatches = check_corpus(str(corpus_path), str(tmp_path / "diff"))
+    assert n_checked == 1
+    assert len(mismatches) == 1
+    assert mismatches[0].n_pixels == 4
+    assert mismatches[0].max_error[0] > 200
+    assert os.path.exists(mismatches[0].diff_path)
+
+
+def test_update_corpus(tmp_path):
+    code = load_corpus()[0]["code"]
+    outside_path = tmp_path / "readme_image.png"
+    Image.new("RGB", (64, 64)).save(outside_path)
+    outside_bytes = outside_path.read_bytes()
+
+    golden_path = tmp_path / "golden"
+    golden_path.mkdir()
+    corpus_path = golden_path / "corpus.json"
+    output = {"sha256": "old", "image": str(outside_path)}
+    entry = {"name": "changed", "code": code, "outputs": {"64": output}}
+    corpus_path.write_text(json.dumps({"entries": [entry]}))
+
+    assert update_corpus(str(corpus_path)) == ["changed at 64px"]
+
+    # The new reference is next to the corpus, and the old image is untouched.
+    assert outside_path.read_bytes() == outside_bytes
+    assert sorted(os.listdir(golden_path)) == ["changed_64.png", "corpus.json"]
+    assert check_corpus(str(corpus_path), str(tmp_path / "diff")) == (1, [])
@@ -0,0 +1,28 @@
+from src.generate_collection import generate_collection, instrumentation
+
+
+def test_collection_events():
+    events = []
+    summary = instrumentation.SummarySink()
+    instrumentation.add_sink(events.append)
+    instrumentation.add_sink(summary)
+    try:
+        collection_path = f"tst_output"
+        generate_collection(
+            "events", collection_path, 2, use_ai=False, workers=2, resume=False
+        )
+    finally:
+        instrumentation.remove_sink(events.append)
+        instrumentation.remove_sink(summary)
+
+    stages = [e for e in events if e["event"] == "stage"]
+    assert {e["item_id"] for e in stages} == {1, 2}
+    assert {e["stage"] for e in stages} >= {"render", "title", "write_art"}
+    assert all(e["bytes"] > 0 for e in stages if e["stage"] == "write_art")
+    assert all(e["rss_growth"] >= 0 for e in stages if e["stage"] == "render")
+
+    # Events come in item order.
+    item_ids = [e["item_id"] for e in events if "item_id" in e]
+    assert item_ids == sorted(item_ids)
+    assert "2 items (0 failed)" in summary.summary()
+    assert "Peak RSS of the process" in summary.summary()
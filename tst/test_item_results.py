@@ -0,0 +1,39 @@
+from src.item_results import future_result, look_ahead, report_items
+from concurrent.futures import Future
+
+
+def test_look_ahead():
+    generated = []
+
+    def results():
+        for i in range(5):
+            generated.append(i)
+            yield i
+
+    # Each result only comes out once the 2 after it have been generated.
+    for result in look_ahead(results(), 2):
+        assert generated[-1] == min(result + 2, 4)
+    assert generated == [0, 1, 2, 3, 4]
+
+
+def test_future_result():
+    done, died = Future(), Future()
+    done.set_result(("001", None))
+    died.set_exception(RuntimeError("worker died"))
+
+    def on_error(e):
+        return "002", repr(e)
+
+    assert future_result(done, on_error) == ("001", None)
+    assert future_result(died, on_error) == ("002", "RuntimeError('worker died')")
+
+
+def test_report_items(capsys):
+    results = [("001", None), ("002", "Traceback"), ("003", None)]
+    assert report_items(results, "Rendered", total=3) == ["002"]
+    assert capsys.readouterr().out.splitlines() == [
+        "[1/3] Rendered item 001",
+        "[2/3] Failed item 002:",
+        "Traceback",
+        "[3/3] Rendered item 003",
+    ]
@@ -0,0 +1,37 @@
+from src.generate_collection import generate_collection
+from src.metadata_store import MetadataStore, export_erc721
+import json
+import os
+
+COLLECTION_PATH = "tst_output"
+
+
+def test_stream_metadata():
+    generate_collection("files", COLLECTION_PATH, 3, use_ai=False, seed=9)
+    generate_collection(
+        "stream", COLLECTION_PATH, 3, use_ai=False, seed=9, metadata_mode="stream"
+    )
+
+    # The stream has the same meta-data as the files, but no meta/ folder.
+    store = MetadataStore(f"{COLLECTION_PATH}/stream")
+    assert len(store) == 3
+    assert not os.path.exists(f"{COLLECTION_PATH}/stream/meta")
+    for metadata in store:
+        with open(f"{COLLECTION_PATH}/files/meta/{metadata.item_id}.json") as f:
+            assert metadata.serialize() == json.load(f)
+
+    # A resumed run skips everything, and the index survives being lost.
+    os.remove(f"{COLLECTION_PATH}/stream/metadata.index")
+    generate_collection(
+        "stream", COLLECTION_PATH, 3, use_ai=False, seed=9, metadata_mode="stream"
+    )
+    store = MetadataStore(f"{COLLECTION_PATH}/stream")
+    assert len(store) == 3
+    assert store.get("002").item_id == "002"
+
+    export_path = f"{COLLECTION_PATH}/stream/erc721"
+    assert export_erc721(store, "stream", export_path, "https://example.com") == 3
+    with open(f"{export_path}/2.json") as f:
+        token = json.load(f)
+    assert token["name"] == store.get("002").title
+    assert token["image"] == "https://example.com/stream_002.png"
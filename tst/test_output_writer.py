@@ -0,0 +1,37 @@
+from src.output_writer import OutputWriter
+from src.collection_manifest import hash_file
+from src.generate_art import generate_art_from_code, generate_seeded_art_code
+from PIL import Image
+import os
+import pytest
+
+
+def test_output_writer(tmp_path):
+    image = generate_art_from_code(generate_seeded_art_code(1))
+    fast_path = str(tmp_path / "art" / "fast.png")
+    default_path = str(tmp_path / "art" / "default.png")
+
+    with OutputWriter(threads=2, max_queue=1) as writer:
+        writer.write_image(image, default_path)
+        OutputWriter(png_compress_level=1).write_image(image, fast_path).result()
+        writer.write_bytes(b"{}", str(tmp_path / "meta" / "001.json"))
+
+        # The result is the hash of the file that was written.
+        file_hash, n_bytes, _ = writer.take(default_path).result()
+        assert file_hash == hash_file(default_path)
+        assert n_bytes == os.path.getsize(default_path)
+        assert writer.take(default_path) is None
+
+    # Faster compression, but the same pixels, and no temporary files left.
+    with Image.open(fast_path) as fast, Image.open(default_path) as default:
+        assert fast.tobytes() == default.tobytes()
+    assert os.path.getsize(fast_path) != os.path.getsize(default_path)
+    assert sorted(os.listdir(tmp_path / "art")) == ["default.png", "fast.png"]
+
+
+def test_output_writer_errors(tmp_path):
+    (tmp_path / "file").write_text("")
+    with OutputWriter() as writer:
+        future = writer.write_bytes(b"", str(tmp_path / "file" / "out.json"))
+        with pytest.raises(OSError):
+            future.result()
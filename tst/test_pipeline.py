@@ -0,0 +1,69 @@
+from src.pipeline import MemoryBudget, Pipeline, Stage
+import pytest
+import threading
+import time
+
+
+def test_pipeline_keeps_order_and_errors():
+    def slow_square(x):
+        # The later items finish first.
+        time.sleep(0.01 * (5 - x))
+        return x * x
+
+    def check(x):
+        if x == 9:
+            raise ValueError("bad item")
+        return x
+
+    exits = []
+    pipeline = Pipeline(
+        [Stage("square", slow_square, threads=3), Stage("check", check)],
+        on_exit=exits.append,
+    )
+    results = list(pipeline.run(range(5)))
+
+    assert [value for value, _ in results] == [0, 1, 4, 9, 16]
+    assert [error is None for _, error in results] == [True] * 3 + [False, True]
+    assert "bad item" in results[3][1]
+    assert sorted(exits) == [0, 1, 4, 9, 16]
+    assert [stage.count for stage in pipeline.stages] == [5, 5]
+    assert all(stage.peak_rss > 0 for stage in pipeline.stages)
+    assert "RSS grew by up to" in pipeline.report()
+
+
+def test_pipeline_empty():
+    assert list(Pipeline([Stage("noop", lambda x: x)]).run([])) == []
+
+
+def test_memory_budget():
+    budget = MemoryBudget(10)
+    lock = threading.Lock()
+    in_flight = []
+
+    def hold(n_bytes):
+        budget.acquire(n_bytes)
+        with lock:
+            in_flight.append(budget.used)
+        time.sleep(0.01)
+        budget.release(n_bytes)
+        return n_bytes
+
+    # An item bigger than the whole budget still gets through, alone.
+    pipeline = Pipeline([Stage("hold", hold, threads=4)])
+    assert [value for value, _ in pipeline.run([4, 4, 4, 20, 4])] == [4, 4, 4, 20, 4]
+    assert max(used for used in in_flight if used != 20) <= 10
+    assert budget.used == 0
+    assert budget.peak == 20
+
+
+def test_pipeline_items_raise():
+    def items():
+        yield from range(3)
+        raise RuntimeError("no more items")
+
+    # The items before the error still come out, then the error is raised.
+    results = []
+    with pytest.raises(RuntimeError, match="no more items"):
+        for value, error in Pipeline([Stage("noop", lambda x: x)]).run(items()):
+            results.append(value)
+    assert results == [0, 1, 2]
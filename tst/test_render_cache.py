@@ -0,0 +1,70 @@
+from src.render_cache import RAW, RenderCache, decode
+from src.generate_art import generate_art_images, generate_seeded_art_code
+from src.generate_collection import generate_preview_image
+from src.artwork_metadata import ArtworkMetadata
+from PIL import Image
+import os
+
+
+def test_render_cache():
+    code = generate_seeded_art_code(1)
+    cache = RenderCache()
+
+    # A cached render is the same as an uncached one.
+    outputs = [(512, "PNG"), (256, RAW)]
+    rendered = cache.render(code, outputs)
+    assert cache.render(code, outputs) == rendered
+    assert cache.stats()["hits"] == 2
+    images = generate_art_images(code, [512, 256])
+    for size, image_format in outputs:
+        image = decode(rendered[(size, image_format)], size, image_format)
+        assert image.tobytes() == images[size].tobytes()
+
+    # The preview of a full size image takes the preview size render from cache.
+    metadata = ArtworkMetadata()
+    metadata.code = code
+    black = Image.new("RGB", (512, 512))
+    cached_preview = generate_preview_image(black, metadata, cache)
+    preview = generate_preview_image(images[256], metadata)
+    assert cached_preview.tobytes() == preview.tobytes()
+
+
+def test_render_cache_eviction_and_disk(tmp_path):
+    cache = RenderCache(max_bytes=10, disk_path=str(tmp_path))
+    cache.put("a", 1, "PNG", b"123456")
+    cache.put("b", 1, "PNG", b"123456")
+    assert cache.stats()["evictions"] == 1
+
+    # The evicted entry is still on disk.
+    assert cache.get("a", 1, "PNG") == b"123456"
+    assert cache.stats()["disk_hits"] == 1
+    assert RenderCache(disk_path=str(tmp_path)).get("b", 1, "PNG") == b"123456"
+    assert cache.get("c", 1, "PNG") is None
+
+
+def test_render_cache_not_kept_in_memory(tmp_path):
+    code = generate_seeded_art_code(2)
+    cache = RenderCache(disk_path=str(tmp_path))
+    rendered = cache.render(code, [(64, "PNG")], keep_in_memory=False)
+    assert cache.stats()["entries"] == 0
+
+    # It still goes to the disk tier.
+    assert cache.render(code, [(64, "PNG")], keep_in_memory=False) == rendered
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_render_cache_keys_by_source_size(tmp_path):
+    code = generate_seeded_art_code(3)
+    cache = RenderCache(disk_path=str(tmp_path))
+
+    # A size rendered alone isn't the same as one cascaded from a larger size.
+    alone = cache.render(code, [(256, RAW)])[(256, RAW)]
+    cascaded = cache.render(code, [(512, RAW), (256, RAW)])[(256, RAW)]
+    assert alone != cascaded
+    assert cache.render(code, [(256, RAW)])[(256, RAW)] == alone
+    assert cache.get(code, 256, RAW, 512) == cascaded
+    assert alone == generate_art_images(code, [256])[256].tobytes()
+
+    # RAW renders aren't written to the disk tier.
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,36 @@
+from src.generate_collection import generate_collection
+from src.render_collection import render_collection
+from PIL import Image
+import os
+
+COLLECTION_PATH = "tst_output"
+
+
+def test_render_collection():
+    generate_collection("render", COLLECTION_PATH, 3, use_ai=False, seed=5)
+    output_path = f"{COLLECTION_PATH}/render/render_test"
+
+    # Re-rendering at the original size gives the same art.
+    assert render_collection("render", COLLECTION_PATH, output_path, workers=2) == []
+    for item_id in ["001", "002", "003"]:
+        with Image.open(f"{COLLECTION_PATH}/render/art/render_{item_id}.png") as a:
+            with Image.open(f"{output_path}/art/render_{item_id}.png") as b:
+                assert a.tobytes() == b.tobytes()
+
+    # And it can render print masters at another size.
+    failed = render_collection(
+        "render", COLLECTION_PATH, output_path, size=1024, preview=False
+    )
+    assert failed == []
+    with Image.open(f"{output_path}/art/render_001.png") as image:
+        assert image.size == (1024, 1024)
+    assert os.path.exists(f"{output_path}/preview/render_001_preview.png")
+
+
+def test_render_stream_collection():
+    generate_collection(
+        "render_stream", COLLECTION_PATH, 2, use_ai=False, metadata_mode="stream"
+    )
+    output_path = f"{COLLECTION_PATH}/render_stream/render_test"
+    assert render_collection("render_stream", COLLECTION_PATH, output_path) == []
+    assert os.path.exists(f"{output_path}/art/render_stream_002.png")
@@ -0,0 +1,101 @@
+from src.render_service import RenderService
+from src.generate_art import (
+    generate_art_from_code,
+    generate_art_images,
+    generate_seeded_art_code,
+)
+from PIL import Image
+import base64
+import io
+import json
+import socket
+import threading
+
+
+def decode_image(result: dict) -> Image.Image:
+    return Image.open(io.BytesIO(base64.b64decode(result["data"])))
+
+
+def test_render_service_stream():
+    code = generate_seeded_art_code(1)
+    jobs = [
+        json.dumps({"id": 1, "code": code, "size": 128}),
+        json.dumps({"id": 2, "type": "preview", "seed": 2, "title": "A Title"}),
+        json.dumps({"id": 3, "type": "nope", "seed": 3}),
+        "not json",
+    ]
+
+    output = []
+    with RenderService(workers=2) as service:
+        service.serve(jobs, output.append)
+    results = {r["id"]: r for r in map(json.loads, output)}
+
+    assert len(output) == 4
+    with decode_image(results[1]) as image:
+        expected = generate_art_from_code(code, size=128)
+        assert image.tobytes() == expected.tobytes()
+    with decode_image(results[2]) as image:
+        assert results[2]["code"] == generate_seeded_art_code(2)
+        assert image.size[1] == 256 + 2 * 64
+        # The art in it is the same as in a collection's preview.
+        art = image.convert("RGB").crop((64, 64, 64 + 256, 64 + 256))
+        expected = generate_art_images(results[2]["code"], [512, 256])[256]
+        assert art.tobytes() == expected.tobytes()
+    assert "Unknown job type" in results[3]["error"]
+    assert "Invalid job" in results[None]["error"]
+
+
+def test_render_service_socket(tmp_path):
+    socket_path = str(tmp_path / "render.sock")
+    with RenderService() as service:
+        with service.serve_socket(socket_path) as server:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                with socket.socket(socket.AF_UNIX) as client:
+                    client.connect(socket_path)
+                    client.sendall(b'{"id": "a", "seed": 5, "size": 64}\n')
+                    client.shutdown(socket.SHUT_WR)
+                    result = json.loads(client.makefile().readline())
+            finally:
+                server.shutdown()
+                thread.join()
+
+    assert result["id"] == "a"
+    with decode_image(result) as image:
+        assert image.size == (64, 64)
+
+
+def test_render_service_write_fails():
+    def write(text: str):
+        raise BrokenPipeError()
+
+    # The results that can't be written don't leave it waiting for ever.
+    jobs = [json.dumps({"id": i, "seed": i, "size": 32}) for i in range(3)]
+    with RenderService() as service:
+        service.serve(jobs, write)
+
+
+def test_render_service_limits():
+    code = generate_seeded_art_code(1)
+    many_nodes = code + ":1.1.1" * 20
+    jobs = [
+        json.dumps({"id": 1, "code": code, "size": 100000}),
+        json.dumps({"id": 2, "code": code, "size": -5}),
+        json.dumps({"id": 3, "type": "preview", "code": "A:4096" + code[5:]}),
+        json.dumps({"id": 4, "code": many_nodes, "size": 64}),
+        json.dumps({"id": 5, "code": code, "size": 64}),
+    ]
+
+    # The jobs over the limits fail (without rendering), the others still work.
+    output = []
+    with RenderService(max_size=1024, max_nodes=20) as service:
+        service.serve(jobs, output.append)
+    results = {r["id"]: r for r in map(json.loads, output)}
+
+    assert "Size 100000 is not between 1 and 1024" in results[1]["error"]
+    assert "Size -5 is not between 1 and 1024" in results[2]["error"]
+    assert "Size 4096 is not between 1 and 1024" in results[3]["error"]
+    assert "nodes, over 20" in results[4]["error"]
+    with decode_image(results[5]) as image:
+        assert image.size == (64, 64)
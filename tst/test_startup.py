@@ -0,0 +1,45 @@
+from src.benchmark import STARTUP_COMMANDS, benchmark_startup
+import os
+import subprocess
+import sys
+
+
+def test_no_heavy_imports_at_startup():
+    # Neither --help nor importing the generator loads openai, numpy or the table.
+    code = (
+        "import sys, generate_collection; "
+        "print(' '.join(m for m in ['openai', 'numpy', 'color_name'] "
+        "if m in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        env={"PYTHONPATH": "src"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert output.stdout.strip() == ""
+
+
+def test_runs_from_another_directory(tmp_path):
+    # The color table and fonts don't depend on the working directory.
+    code = (
+        "import generate_collection as g; "
+        "print(g.get_color_name_mapper().get((0, 0, 0)).name); "
+        "g.get_font(g.FONT_PATH + '/RobotoMono-Regular.ttf', 12)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        env={"PYTHONPATH": os.path.abspath("src")},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert output.stdout.strip() == "Black"
+
+
+def test_benchmark_startup():
+    name = "startup_cmd_generate_help"
+    stage = benchmark_startup(name, STARTUP_COMMANDS[name], repeats=1)
+    assert stage["seconds"] > 0
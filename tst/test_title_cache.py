@@ -0,0 +1,46 @@
+import os
+from src.title_cache import TitleCache, get_title_cache
+
+OUTPUT_FOLDER = "tst_output"
+CACHE_PATH = f"{OUTPUT_FOLDER}/test_title_cache.sqlite"
+
+
+def _new_cache(max_pairs: int = 10000) -> TitleCache:
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    if os.path.exists(CACHE_PATH):
+        os.remove(CACHE_PATH)
+    return TitleCache(CACHE_PATH, max_pairs=max_pairs)
+
+
+def test_title_cache_take():
+    with _new_cache() as cache:
+        cache.add("Red", "Blue", ["Ocean of fire", "Dusk"])
+        name_set = {"Dusk"}
+
+        assert cache.take("Red", "Blue", name_set) == "Ocean of fire"
+        assert cache.take("Red", "Blue", name_set) is None
+        assert cache.take("Blue", "Red") is None
+        assert "Ocean of fire" in name_set
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+
+    # It persists.
+    with TitleCache(CACHE_PATH) as cache:
+        assert cache.take("Red", "Blue") == "Dusk"
+
+
+def test_title_cache_lru_eviction():
+    with _new_cache(max_pairs=2) as cache:
+        cache.add("Red", "Blue", ["A", "B"])
+        cache.add("Gold", "Zest", ["C", "D"])
+        assert cache.take("Red", "Blue") == "A"
+        cache.add("Black", "White", ["E"])
+
+        assert cache.stats()["evictions"] == 1
+        assert cache.take("Gold", "Zest") is None
+        assert cache.take("Red", "Blue") == "B"
+
+
+def test_get_title_cache_is_opened_once():
+    _new_cache().close()
+    assert get_title_cache(CACHE_PATH) is get_title_cache(CACHE_PATH)